@@ -0,0 +1,268 @@
+# ============================================
+# Actualización incremental de modelos
+# Cuando la CNSF publica un año nuevo (ingesta.py), en lugar de reentrenar
+# todos los modelos desde cero:
+#   - los segmentos (categoría, entidad) sin filas nuevas conservan su
+#     ajuste (solo se registran bajo la nueva huella de datos);
+#   - los que recibieron al menos MIN_FILAS_CONTINUACION filas continúan el
+#     boosting desde su booster (xgb_model) con unos pocos árboles ajustados
+#     solo a las filas nuevas;
+#   - los que recibieron menos (p. ej. un giro: una fila por año, que solo
+#     desplazaría el modelo completo) o cuyos hiperparámetros cambiaron
+#     (otro tramo de CAPACIDAD_POR_TAMANO o parametros_sector.json
+#     reajustado) se reentrenan completos;
+#   - la tabla precalculada solo se recalcula para los pares afectados.
+# Cada ajuste se registra con la misma clave con la que lo busca una
+# predicción (modelo.clave_modelo), para que la app lo encuentre.
+#
+# Uso (después de ingesta.py y antes de reiniciar la app, que purga los
+# modelos de la versión anterior):
+#   python actualizacion.py [--años 2025] [--huella-anterior H] [--arboles 100]
+# ============================================
+import argparse
+import os
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from almacen_features import AlmacenFeatures
+from datos import DatosCNSF, cargar_df_proc, ruta_fuente
+from modelo import (
+    ajustar_modelo, base_pronostico, clave_modelo, features_segmento, parametros_de_segmento
+)
+from precomputo import (
+    RUTA_PRONOSTICOS, TablaPronosticos, a_frame, filas_pronostico, guardar_tabla, pares_validos
+)
+from registro_modelos import RegistroModelos, huella_archivo
+
+ARBOLES_INCREMENTALES = 100
+MIN_FILAS_CONTINUACION = 10   # filas nuevas mínimas para continuar en vez de reentrenar
+MIN_FILAS_REAJUSTE = 3        # igual que min_obs de prediccion_siniestralidad
+
+
+# ==========================
+# DETECCIÓN DE CAMBIOS
+# ==========================
+
+def segmentos_con_datos_nuevos(df_proc, años):
+    """{(nivel, categoría, entidad)} de los segmentos con filas en años."""
+    nuevas = df_proc[df_proc["año"].isin(años)]
+    return (
+        {("giro", g, e) for g, e in zip(nuevas["giro"], nuevas["entidad"])}
+        | {("sector", s, e) for s, e in zip(nuevas["sector"], nuevas["entidad"])}
+    )
+
+
+def _misma_base(ajuste, segmento):
+    """True si la última observación del segmento es la misma con la que se ajustó."""
+    con_target = np.flatnonzero(~np.isnan(segmento.target))
+    if len(con_target) == 0:
+        return False
+    idx_base = con_target[-1]
+    return (
+        int(segmento.años[idx_base]) == ajuste["last_year"]
+        and np.allclose(segmento.lags[idx_base], ajuste["base_lags"], equal_nan=True)
+    )
+
+
+def _sin_arboles(params):
+    """Parámetros sin n_estimators (la parada temprana y la continuación lo cambian)."""
+    return {k: v for k, v in params.items() if k != "n_estimators"}
+
+
+def _clave_nueva(clave, ajuste, segmento, datos, huella):
+    """
+    Parámetros y clave con los que una predicción buscaría hoy el ajuste:
+    dependen de las filas actuales del segmento y del sector del giro.
+    """
+    sector = clave.categoria if clave.nivel == "sector" else datos.sector_de_giro(clave.categoria)
+    params = parametros_de_segmento(segmento, sector)
+    modo = ajuste.get("modo", "recursivo")
+    extra = {}
+    if "metodo" in ajuste:
+        extra["intervalos"] = ajuste["metodo"]
+        if ajuste["metodo"] == "bootstrap":
+            extra["miembros"] = len(ajuste["modelos"])
+    nueva = clave_modelo(
+        clave.nivel, clave.categoria, clave.entidad, huella, params, modo, ajuste.get("horizonte"), **extra
+    )
+    return params, nueva
+
+
+# ==========================
+# CONTINUACIÓN DEL BOOSTING
+# ==========================
+
+def _recursivo_puntual(ajuste):
+    return "model" in ajuste and ajuste.get("modo", "recursivo") == "recursivo"
+
+
+def continuar_ajuste(ajuste, segmento, arboles=ARBOLES_INCREMENTALES, n_jobs=None):
+    """
+    Agrega `arboles` árboles al modelo de un ajuste, entrenados solo con las
+    filas del segmento posteriores a su último año. Devuelve el ajuste
+    actualizado, o None si no aplica (modelo directo, bandas o menos de
+    MIN_FILAS_CONTINUACION filas nuevas válidas).
+    """
+    from xgboost import XGBRegressor
+
+    if not _recursivo_puntual(ajuste):
+        return None
+    nuevas = segmento.valido & (segmento.años > ajuste["last_year"])
+    if nuevas.sum() < MIN_FILAS_CONTINUACION:
+        return None
+
+    # Misma capacidad (profundidad, learning rate...) con la que se ajustó
+    params = dict(ajuste["parametros"], n_estimators=arboles)
+    model = XGBRegressor(**params, n_jobs=n_jobs)
+    model.fit(
+        features_segmento(segmento.lags[nuevas]), segmento.target[nuevas],
+        xgb_model=ajuste["model"].get_booster()
+    )
+
+    return dict(
+        ajuste,
+        **base_pronostico(segmento),
+        model=model,
+        parametros=dict(params, n_estimators=ajuste["model"].n_estimators + arboles),
+        arboles_incrementales=ajuste.get("arboles_incrementales", 0) + arboles,
+    )
+
+
+def reajustar(segmento, params, n_jobs=None):
+    """
+    Ajuste recursivo completo del segmento con params (mismo flujo que una
+    predicción en vivo). None si no tiene filas suficientes.
+    """
+    valido = segmento.valido
+    if valido.sum() < MIN_FILAS_REAJUSTE:
+        return None
+    model = ajustar_modelo(
+        features_segmento(segmento.lags[valido]), segmento.target[valido],
+        segmento.años[valido], params, n_jobs=n_jobs
+    )
+    return dict(
+        base_pronostico(segmento), model=model,
+        parametros=dict(params, n_estimators=model.n_estimators),
+    )
+
+
+# ==========================
+# ACTUALIZACIÓN COMPLETA
+# ==========================
+
+def actualizar_incremental(ruta_datos=None, años=None, huella_anterior=None,
+                           arboles=ARBOLES_INCREMENTALES, registro=None,
+                           ruta_pronosticos=RUTA_PRONOSTICOS, n_jobs=None):
+    """
+    Lleva los modelos de la versión anterior de los datos (huella_anterior,
+    por defecto la más reciente en el registro) a la versión actual.
+    años: años recién agregados (por defecto el último año de los datos).
+    Devuelve un Counter con conservados / continuados / reajustados /
+    descartados (directos y bandas: se reentrenan bajo demanda).
+    """
+    ruta_datos = ruta_datos or ruta_fuente()
+    huella = huella_archivo(ruta_datos)
+    registro = registro or RegistroModelos()
+
+    if huella_anterior is None:
+        huella_anterior = next((h for h in registro.versiones() if h != huella), None)
+    if huella_anterior is None:
+        print("No hay modelos de una versión anterior; no hay nada que actualizar.")
+        return Counter()
+
+    datos = DatosCNSF(cargar_df_proc(ruta_datos))
+    almacen = AlmacenFeatures(datos.df)
+    if años is None:
+        años = [int(datos.df["año"].max())]
+    cambiados = segmentos_con_datos_nuevos(datos.df, años)
+
+    conteo = Counter()
+    for clave, ajuste in registro.entradas(huella_anterior):
+        segmento = almacen.segmento(clave.nivel, clave.categoria, clave.entidad)
+        if segmento is None or "parametros" not in ajuste:
+            conteo["descartados"] += 1
+            continue
+
+        params, nueva = _clave_nueva(clave, ajuste, segmento, datos, huella)
+        mismos_parametros = _sin_arboles(ajuste["parametros"]) == _sin_arboles(params)
+        cambiado = (
+            (clave.nivel, clave.categoria, clave.entidad) in cambiados
+            or not _misma_base(ajuste, segmento)
+        )
+
+        if not cambiado and mismos_parametros:
+            registro.guardar(nueva, ajuste)
+            conteo["conservados"] += 1
+            continue
+        actualizado = continuar_ajuste(ajuste, segmento, arboles, n_jobs) if mismos_parametros else None
+        if actualizado is not None:
+            conteo["continuados"] += 1
+        elif _recursivo_puntual(ajuste):
+            actualizado = reajustar(segmento, params, n_jobs)
+            conteo["reajustados" if actualizado is not None else "descartados"] += 1
+        else:
+            conteo["descartados"] += 1
+        if actualizado is not None:
+            registro.guardar(nueva, actualizado)
+
+    print(
+        f"Modelos {huella_anterior} -> {huella}: {conteo['conservados']} conservados, "
+        f"{conteo['continuados']} continuados, {conteo['reajustados']} reajustados, "
+        f"{conteo['descartados']} descartados"
+    )
+
+    _actualizar_pronosticos(
+        datos, almacen, registro, huella, huella_anterior, cambiados, ruta_pronosticos, n_jobs
+    )
+    return conteo
+
+
+def _actualizar_pronosticos(datos, almacen, registro, huella, huella_anterior, cambiados,
+                            ruta_pronosticos, n_jobs):
+    """Recalcula en la tabla precalculada solo los pares cuyos segmentos cambiaron."""
+    if not os.path.exists(ruta_pronosticos):
+        return
+    if not TablaPronosticos.vigente(ruta_pronosticos, huella_anterior):
+        print("La tabla de pronósticos no corresponde a la versión anterior; correr precomputo.py.")
+        return
+
+    anterior = pd.read_parquet(ruta_pronosticos)
+    for col in ["giro", "entidad", "nivel"]:
+        anterior[col] = anterior[col].astype("object")
+    pares = pares_validos(datos.df)
+    previos = set(zip(anterior["giro"], anterior["entidad"]))
+
+    afectados = [
+        (giro, entidad) for giro, entidad in pares
+        if (giro, entidad) not in previos
+        or ("giro", giro, entidad) in cambiados
+        or ("sector", datos.sector_de_giro(giro), entidad) in cambiados
+    ]
+    conservar = set(pares) - set(afectados)
+
+    nuevas = a_frame(filas_pronostico(
+        afectados, datos, almacen, registro=registro, huella_datos=huella, n_jobs=n_jobs
+    ))
+    anterior = anterior[[par in conservar for par in zip(anterior["giro"], anterior["entidad"])]]
+    guardar_tabla(pd.concat([anterior, nuevas], ignore_index=True), ruta_pronosticos, huella)
+    print(f"Pronósticos: {len(afectados)} pares recalculados, {len(conservar)} conservados")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Actualización incremental de modelos tras un año nuevo.")
+    parser.add_argument("--datos", default=None,
+                        help="parquet o dataset particionado (por defecto el que usa la app)")
+    parser.add_argument("--años", type=int, nargs="+", default=None,
+                        help="años recién agregados (por defecto el último de los datos)")
+    parser.add_argument("--huella-anterior", default=None,
+                        help="versión de datos de la que se parte (por defecto la más reciente en model_cache)")
+    parser.add_argument("--arboles", type=int, default=ARBOLES_INCREMENTALES,
+                        help="árboles que se agregan a cada modelo con datos nuevos")
+    parser.add_argument("--salida", default=RUTA_PRONOSTICOS)
+    args = parser.parse_args()
+
+    actualizar_incremental(
+        ruta_datos=args.datos, años=args.años, huella_anterior=args.huella_anterior,
+        arboles=args.arboles, ruta_pronosticos=args.salida
+    )
@@ -0,0 +1,137 @@
+# ============================================
+# Almacén de features (lags) precalculados
+# Construye todas las columnas *_lag1 para los niveles giro y sector en una
+# sola pasada vectorizada al cargar el parquet. El entrenamiento solo toma
+# rebanadas (vistas) de arreglos float32 ya construidos.
+# ============================================
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+LAG_FEATURES = [
+    'prima_emitida_neta', 'prima_retenida', 'prima_devengada',
+    'monto_de_siniestro', 'gasto_de_ajuste', 'salvamento',
+    'monto_pagado', 'monto_de_deducible', 'monto_coaseguro',
+    'n_mero_de_siniestros', 'recuperacion_de_terceros',
+    'recuperacion_de_reaseguro', 'suma_asegurada', 'cuota_millar',
+    'sin_index', 'siniestro_neto', 'net_sin_index'
+]
+
+LAG1_COLS = [f"{c}_lag1" for c in LAG_FEATURES]
+NIVELES = ("giro", "sector")
+
+# Rebanada de un segmento (cat, entidad); todos los arreglos son vistas
+Segmento = namedtuple("Segmento", ["lags", "target", "años", "valido"])
+
+
+def construir_lags(df_proc, cat_col):
+    """
+    Ordena df_proc por (cat_col, entidad, año) de forma estable y agrega las
+    columnas *_lag1 por serie cat_col+entidad. Numéricos en float32.
+    """
+    df = df_proc.sort_values([cat_col, "entidad", "año"], kind="stable")
+    df = df.reset_index(drop=True)
+
+    num = (
+        df[LAG_FEATURES]
+        .apply(pd.to_numeric, errors="coerce")
+        .astype(np.float32)
+        .replace([np.inf, -np.inf], np.nan)
+    )
+    lags = num.groupby([df[cat_col], df["entidad"]], observed=True, sort=False).shift(1)
+    lags.columns = LAG1_COLS
+
+    base = df.drop(columns=LAG_FEATURES)
+    return pd.concat([base, num, lags], axis=1)
+
+
+class _Nivel:
+    """Arreglos contiguos de un nivel (giro o sector) + límites por segmento."""
+
+    def __init__(self, df_proc, cat_col):
+        df = construir_lags(df_proc, cat_col)
+
+        self.frame = df.set_index([cat_col, "entidad", "año"])[LAG1_COLS + ["net_sin_index"]]
+        self.lags = np.ascontiguousarray(df[LAG1_COLS].to_numpy(np.float32))
+        self.target = df["net_sin_index"].to_numpy(np.float32)
+        self.años = df["año"].to_numpy(np.int32)
+        self.valido = np.isfinite(self.target) & np.isfinite(self.lags).all(axis=1)
+
+        # (cat, entidad) -> (inicio, fin) en los arreglos ordenados
+        claves = pd.MultiIndex.from_frame(df[[cat_col, "entidad"]])
+        cambios = np.flatnonzero(~claves.duplicated()).tolist() + [len(df)]
+        self.limites = {
+            claves[ini]: (ini, fin) for ini, fin in zip(cambios[:-1], cambios[1:])
+        }
+
+
+class AlmacenFeatures:
+    """
+    Lags precalculados para los niveles giro y sector, indexados por
+    (cat, entidad, año). Se construye una vez por proceso y es de solo lectura.
+    """
+
+    def __init__(self, df_proc):
+        self._niveles = {cat_col: _Nivel(df_proc, cat_col) for cat_col in NIVELES}
+
+    def frame(self, cat_col):
+        """DataFrame float32 de lags + target indexado por (cat, entidad, año)."""
+        return self._niveles[cat_col].frame
+
+    def segmento(self, cat_col, valor_cat, entidad):
+        """Devuelve el Segmento (vistas) de (valor_cat, entidad) o None si no hay filas."""
+        nivel = self._niveles[cat_col]
+        limites = nivel.limites.get((valor_cat, entidad))
+        if limites is None:
+            return None
+        sl = slice(*limites)
+        return Segmento(nivel.lags[sl], nivel.target[sl], nivel.años[sl], nivel.valido[sl])
+
+
+class AlmacenParticionado:
+    """
+    Misma interfaz que AlmacenFeatures, pero sobre un dataset parquet
+    particionado (ver datos.particionar_dataset): cada segmento se lee bajo
+    demanda con filtro y proyección empujados a pyarrow (solo las columnas
+    de LAG_FEATURES y los row groups del segmento) y se guarda en un LRU.
+    """
+
+    def __init__(self, dataset, sector_por_giro=None, max_segmentos=256):
+        self.dataset = dataset
+        self.sector_por_giro = sector_por_giro or {}
+        self.max_segmentos = max_segmentos
+        self._segmentos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _leer(self, cat_col, valor_cat, entidad):
+        filtro = (ds.field(cat_col) == valor_cat) & (ds.field("entidad") == entidad)
+        # Con el sector conocido, pyarrow descarta las demás particiones
+        if cat_col == "giro" and valor_cat in self.sector_por_giro:
+            filtro = filtro & (ds.field("sector") == self.sector_por_giro[valor_cat])
+
+        columnas = [cat_col, "entidad", "año"] + LAG_FEATURES
+        df = self.dataset.to_table(columns=columnas, filter=filtro).to_pandas()
+        if df.empty:
+            return None
+
+        nivel = _Nivel(df, cat_col)
+        return Segmento(nivel.lags, nivel.target, nivel.años, nivel.valido)
+
+    def segmento(self, cat_col, valor_cat, entidad):
+        """Devuelve el Segmento de (valor_cat, entidad) o None si no hay filas."""
+        clave = (cat_col, valor_cat, entidad)
+        with self._lock:
+            if clave in self._segmentos:
+                self._segmentos.move_to_end(clave)
+                return self._segmentos[clave]
+
+        segmento = self._leer(cat_col, valor_cat, entidad)
+
+        with self._lock:
+            self._segmentos[clave] = segmento
+            while len(self._segmentos) > self.max_segmentos:
+                self._segmentos.popitem(last=False)
+        return segmento
@@ -1,27 +1,126 @@
+import contextlib
+import os
 import streamlit as st
 import pandas as pd
-import numpy as np
-from openai import OpenAI
-from xgboost import XGBRegressor
-from sklearn.preprocessing import OneHotEncoder
 import textwrap  # para limpiar la indentación de HTML
+import time
 
 from prompts import final_prompt  # <-- tu prompt de rol
+from cache_respuestas import CacheRespuestas, huella_texto
+from historial_chat import PRESUPUESTO_TOKENS, construir_mensajes
+from datos import catalogo_o_construir, mtime_ruta, ruta_fuente
+from hechos import hechos_o_construir
+from metricas import (
+    HOST_METRICAS, PerfiladorMuestreo, configurar_log_json, observar, servir_metricas
+)
+from modelo import HORIZONTE
+from precomputo import RUTA_PRONOSTICOS
+
+# Arranque rápido: xgboost (motor, cartera) y openai (asistente) se importan
+# la primera vez que se usan, no al pintar la página
+_INICIO_SCRIPT = time.perf_counter()
 
 # ==========================
 # CONFIGURACIÓN OPENAI
 # ==========================
-client = OpenAI(api_key=st.secrets["openai_api_key"])
+@st.cache_resource
+def cargar_cliente_llm():
+    # Cliente async compartido por todas las sesiones (pool + límite de concurrencia).
+    # openai_base_url permite apuntar a otro backend compatible (p. ej. stub_llm.py)
+    from asistente import ClienteAsistente
+
+    return ClienteAsistente(
+        api_key=st.secrets["openai_api_key"],
+        base_url=st.secrets.get("openai_base_url"),
+        max_concurrencia=int(st.secrets.get("llm_max_concurrencia", 8)),
+        timeout=float(st.secrets.get("llm_timeout", 30)),
+        max_reintentos=int(st.secrets.get("llm_max_reintentos", 3)),
+    )
+
+@st.cache_resource
+def cargar_cache_respuestas():
+    # Compartida por todas las sesiones; cache_chat_similitud (p. ej. 0.9)
+    # activa el nivel por similitud
+    umbral = st.secrets.get("cache_chat_similitud")
+    return CacheRespuestas(
+        max_entradas=int(st.secrets.get("cache_chat_max_entradas", 1024)),
+        ttl=float(st.secrets.get("cache_chat_ttl", 24 * 3600)),
+        umbral_similitud=float(umbral) if umbral is not None else None,
+    )
+
+cache_respuestas = cargar_cache_respuestas()
+HUELLA_PROMPT = huella_texto(final_prompt)
+
+# ==========================
+# MÉTRICAS
+# ==========================
+@st.cache_resource
+def iniciar_metricas(puerto, host, log_json):
+    # Una vez por proceso: /metrics (Prometheus) en metricas_puerto y, con
+    # metricas_log_json = true, cada tramo como línea JSON en stderr.
+    # /metrics no tiene autenticación: solo escucha fuera de localhost si
+    # metricas_host lo pide explícitamente
+    if log_json:
+        configurar_log_json()
+    return servir_metricas(int(puerto), host) if puerto else None
+
+iniciar_metricas(
+    st.secrets.get("metricas_puerto"),
+    st.secrets.get("metricas_host", HOST_METRICAS),
+    bool(st.secrets.get("metricas_log_json", False))
+)
+
+# ?perfilar=1 en la URL: la siguiente predicción corre bajo el perfilador por muestreo
+perfilar = st.query_params.get("perfilar") == "1"
 
 # ==========================
 # CARGA DE DATOS
 # ==========================
-@st.cache_data
-def cargar_datos():
-    df = pd.read_parquet("data_config/df_proc.parquet")
-    return df
+# Si existe el dataset particionado (python datos.py) se lee por segmento;
+# si no, se usa el parquet único completo en memoria
+RUTA_FUENTE = ruta_fuente()
+
+@st.cache_resource
+def cargar_motor(ruta, mtime_datos, mtime_tabla):
+    # Un solo motor (datos, features, registro de modelos, tabla precalculada y
+    # modelo global) compartido por todas las sesiones. Los mtime solo sirven
+    # para invalidar la caché si cambian los datos o la tabla de pronósticos
+    from motor import MotorPrediccion
+
+    return MotorPrediccion(ruta)
+
+
+def obtener_motor():
+    # Se construye con la primera predicción (o cartera), no al arrancar
+    return cargar_motor(
+        RUTA_FUENTE,
+        mtime_ruta(RUTA_FUENTE),
+        os.path.getmtime(RUTA_PRONOSTICOS) if os.path.exists(RUTA_PRONOSTICOS) else None
+    )
+
+
+@st.cache_resource
+def cargar_catalogo(ruta, mtime_datos):
+    # Listas de los dropdowns desde data_config/catalogo.json (sin leer
+    # df_proc); si falta o está desactualizado se recalcula y se guarda
+    return catalogo_o_construir(ruta)
+
+catalogo = cargar_catalogo(RUTA_FUENTE, mtime_ruta(RUTA_FUENTE))
 
-df_proc = cargar_datos()
+
+@st.cache_resource
+def cargar_hechos(ruta, mtime_datos, mtime_tabla):
+    # Hechos por segmento para el chat (data_config/hechos.*): se cargan con
+    # la primera pregunta y se reconstruyen si cambiaron los datos o la tabla
+    return hechos_o_construir(ruta)
+
+
+def obtener_hechos():
+    return cargar_hechos(
+        RUTA_FUENTE,
+        mtime_ruta(RUTA_FUENTE),
+        os.path.getmtime(RUTA_PRONOSTICOS) if os.path.exists(RUTA_PRONOSTICOS) else None
+    )
 
 # ==========================
 # SESSION STATE
@@ -29,212 +128,205 @@ df_proc = cargar_datos()
 if "chat_mensajes" not in st.session_state:
     st.session_state.chat_mensajes = []
 
+# HTML de cada mensaje, renderizado una vez al agregarlo
+if "chat_burbujas" not in st.session_state:
+    st.session_state.chat_burbujas = []
+
 if "df_resultado" not in st.session_state:
     st.session_state.df_resultado = None
 
 # ==========================
-# MODELO DE PREDICCIÓN
+# CHAT: BURBUJAS HTML
 # ==========================
 
-def prediccion_siniestralidad(df_proc, giro_usuario, entidad_usuario, min_obs=3):
-    """
-    Entrena un modelo XGBoost "al vuelo" para un giro+entidad.
-    Si no hay suficientes datos a ese nivel, hace fallback a sector+entidad.
-    Devuelve: (dict{año: predicción}, nivel_usado: "giro" | "sector")
-    """
-    lag_features = [
-        'prima_emitida_neta', 'prima_retenida', 'prima_devengada',
-        'monto_de_siniestro', 'gasto_de_ajuste', 'salvamento',
-        'monto_pagado', 'monto_de_deducible', 'monto_coaseguro',
-        'n_mero_de_siniestros', 'recuperacion_de_terceros',
-        'recuperacion_de_reaseguro', 'suma_asegurada', 'cuota_millar',
-        'sin_index', 'siniestro_neto', 'net_sin_index'
-    ]
-    
-    def _ajustar_y_predecir(df_base, cat_col, valor_cat, nivel_desc):
-        df = df_base.copy()
-        df = df.sort_values(['entidad', 'año'])
-
-        # Asegurar numérico en columnas base
-        cols_num = [c for c in lag_features if c in df.columns]
-        if cols_num:
-            df[cols_num] = df[cols_num].apply(pd.to_numeric, errors='coerce')
-
-        # Crear lags
-        for col in lag_features:
-            if col in df.columns:
-                df[f'{col}_lag1'] = df.groupby([cat_col, 'entidad'])[col].shift(1)
-
-        # Asegurar numérico en lags
-        lag1_cols = [f'{c}_lag1' for c in lag_features if f'{c}_lag1' in df.columns]
-        if lag1_cols:
-            df[lag1_cols] = df[lag1_cols].apply(pd.to_numeric, errors='coerce')
-
-        # Limpieza de target y lags
-        df = df[df['net_sin_index'].notna()]
-        df = df.replace([np.inf, -np.inf], np.nan)
-        df_model = df.dropna(subset=lag1_cols + ['net_sin_index'])
-
-        if df_model.shape[0] < min_obs:
-            raise ValueError(
-                f"No hay suficientes datos limpios a nivel {nivel_desc} "
-                f"para {cat_col}={valor_cat}, entidad={entidad_usuario}"
-            )
-
-        # One-hot de categoría (giro/sector) + entidad
-        ohe = OneHotEncoder(sparse_output=False, handle_unknown='ignore')
-        encoded = ohe.fit_transform(df_model[[cat_col, 'entidad']])
-        ohe_cols = list(ohe.get_feature_names_out())
-        encoded_df = pd.DataFrame(encoded, columns=ohe_cols, index=df_model.index)
+# Plantillas de burbuja: se limpian (dedent) una sola vez al importar
+_BURBUJA_USUARIO = textwrap.dedent("""
+<div style="display: flex; justify-content: flex-end; margin-bottom: 0.5rem;">
+    <div style="
+        max-width: 80%;
+        background-color: #DCF8C6;
+        color: #000;
+        padding: 0.4rem 0.6rem;
+        border-radius: 0.6rem;
+        border-bottom-right-radius: 0.1rem;
+        font-size: 0.9rem;
+    ">
+        {content_html}
+    </div>
+</div>
+""")
 
-        # Unir lags + OHE
-        df_model_enc = pd.concat([df_model, encoded_df], axis=1)
+_BURBUJA_ASISTENTE = textwrap.dedent("""
+<div style="display: flex; justify-content: flex-start; margin-bottom: 0.5rem;">
+    <div style="
+        max-width: 80%;
+        background-color: #FFFFFF;
+        color: #000;
+        padding: 0.4rem 0.6rem;
+        border-radius: 0.6rem;
+        border-bottom-left-radius: 0.1rem;
+        font-size: 0.9rem;
+        box-shadow: 0 0 2px rgba(0,0,0,0.1);
+    ">
+        {content_html}
+    </div>
+</div>
+""")
 
-        # Features: solo lags + OHE
-        lag1_cols = [c for c in df_model_enc.columns if c.endswith('_lag1')]
-        feature_cols = lag1_cols + ohe_cols
+# Base del contenedor del chat
+_CHAT_INICIO = textwrap.dedent("""
+<div id="chat-box" style="
+    height: 420px;
+    overflow-y: auto;
+    padding: 0.5rem;
+    border-radius: 0.5rem;
+    background-color: #11111111;
+">
+""")
 
-        X = df_model_enc[feature_cols]
-        y = df_model_enc['net_sin_index']
 
-        if y.isna().any():
-            raise ValueError(f"y (net_sin_index) aún tiene NaNs a nivel {nivel_desc}.")
+# Helper para crear burbujas HTML
+def make_bubble(role, content_html):
+    plantilla = _BURBUJA_USUARIO if role == "user" else _BURBUJA_ASISTENTE
+    return plantilla.format(content_html=content_html)
 
-        model = XGBRegressor(
-            n_estimators=600,
-            learning_rate=0.05,
-            max_depth=5,
-            subsample=0.9,
-            colsample_bytree=0.9
-        )
-        model.fit(X, y)
 
-        # Base para predicción: última observación
-        base = df.sort_values('año').iloc[-1].copy()
-        last_year = int(base['año'])
+def agregar_mensaje(role, content):
+    """
+    Añade el mensaje al historial y guarda su burbuja ya renderizada, para
+    no volver a generar el HTML de todo el historial en cada rerun.
+    """
+    st.session_state.chat_mensajes.append({"role": role, "content": content})
+    st.session_state.chat_burbujas.append(make_bubble(role, content.replace("\n", "<br>")))
 
-        predicciones = {}
-        current = base.copy()
 
-        for step in [1, 2]:
-            año_futuro = last_year + step
+# Fragmento: interactuar con el chat solo re-ejecuta este panel
+@st.fragment
+def panel_chat(entidad, sector, giro):
+    with st.container(border=True):
+        st.subheader("💬 Asistente Inteligente de Suscripción")
 
-            # OHE para valor actual + entidad_usuario
-            encoded_row = ohe.transform([[valor_cat, entidad_usuario]])
-            encoded_row_df = pd.DataFrame(encoded_row, columns=ohe_cols)
+        # Input de chat (al final visualmente)
+        user_input = st.chat_input("Haz una pregunta sobre el riesgo, siniestralidad o contexto...")
 
-            # Usar solo lags actuales
-            row_lags = current[lag1_cols].to_frame().T.reset_index(drop=True)
+        # Contenedor del chat; se repinta mientras llega la respuesta
+        chat_box = st.empty()
 
-            # Unir lags + OHE
-            row = pd.concat(
-                [row_lags, encoded_row_df.reset_index(drop=True)],
-                axis=1
+        if user_input:
+            # 1) Añadimos mensaje de usuario a estado (con su burbuja)
+            agregar_mensaje("user", user_input)
+
+            # 2) Construimos contexto (con las cifras del segmento) y llamamos a OpenAI
+            prediccion = st.session_state.get("prediccion_caso")
+            hechos_caso = obtener_hechos().contexto(
+                sector, giro, entidad,
+                prediccion=prediccion[2:] if prediccion and prediccion[:2] == (giro, entidad) else None
             )
+            contexto_dinamico = f"""
+INFORMACIÓN DEL CASO ACTUAL:
+- Entidad: {entidad}
+- Sector: {sector}
+- Giro: {giro}
 
-            # Alinear columnas
-            row = row.reindex(columns=feature_cols, fill_value=0).astype(float)
+{hechos_caso}
+"""
 
-            pred = model.predict(row)[0]
-            predicciones[año_futuro] = float(pred)
+            # Prompt fijo + contexto + historial recortado al presupuesto de tokens
+            mensajes_openai = construir_mensajes(
+                contexto_dinamico,
+                st.session_state.chat_mensajes,
+                presupuesto=int(st.secrets.get("chat_presupuesto_tokens", PRESUPUESTO_TOKENS))
+            )
 
-            # Actualizar lag de net_sin_index para el siguiente paso
-            if 'net_sin_index_lag1' in current.index:
-                current['net_sin_index_lag1'] = pred
+            # Las cifras cambian con los datos o con un pronóstico nuevo
+            contexto_caso = (entidad, sector, giro, huella_texto(hechos_caso))
 
-        return predicciones
+            try:
+                # Misma pregunta (o muy parecida) sobre el mismo caso: sin llamar a la API
+                respuesta_texto = cache_respuestas.obtener(HUELLA_PROMPT, contexto_caso, user_input)
+
+                if respuesta_texto is None:
+                    # Respuesta en streaming: se pinta conforme llegan los tokens
+                    chat_html = _CHAT_INICIO + "".join(st.session_state.chat_burbujas)
+                    respuesta_texto = ""
+                    ultimo_render = 0.0
+                    for fragmento in cargar_cliente_llm().stream(mensajes_openai):
+                        respuesta_texto += fragmento
+                        # Repintar como máximo cada ~50 ms
+                        if time.monotonic() - ultimo_render > 0.05:
+                            parcial = make_bubble("assistant", respuesta_texto.replace("\n", "<br>"))
+                            chat_box.markdown(chat_html + parcial + "</div>", unsafe_allow_html=True)
+                            ultimo_render = time.monotonic()
+
+                    cache_respuestas.guardar(HUELLA_PROMPT, contexto_caso, user_input, respuesta_texto)
+
+                # 3) Añadimos respuesta al estado (con su burbuja)
+                agregar_mensaje("assistant", respuesta_texto)
 
-    # =========================
-    # NIVEL 1: GIRO + ENTIDAD
-    # =========================
-    df_ge = df_proc[(df_proc['giro'] == giro_usuario) &
-                    (df_proc['entidad'] == entidad_usuario)].copy()
+            except Exception as e:
+                st.error(f"Error al comunicarse con el asistente: {e}")
 
-    if df_ge.shape[0] >= min_obs:
-        try:
-            preds_giro = _ajustar_y_predecir(
-                df_ge, cat_col='giro',
-                valor_cat=giro_usuario,
-                nivel_desc='giro'
-            )
-            if not all(abs(v) < 1e-9 for v in preds_giro.values()):
-                return preds_giro, "giro"
-        except ValueError:
-            pass  # Intentaremos sector
-
-    # =========================
-    # NIVEL 2: SECTOR + ENTIDAD
-    # =========================
-    subset_giro = df_proc[df_proc['giro'] == giro_usuario]
-    if subset_giro.empty or subset_giro['sector'].isna().all():
-        raise ValueError(f"No se encontró sector asociado al giro={giro_usuario}")
-
-    sector_usuario = subset_giro['sector'].mode().iloc[0]
-
-    df_se = df_proc[(df_proc['sector'] == sector_usuario) &
-                    (df_proc['entidad'] == entidad_usuario)].copy()
-
-    if df_se.shape[0] < min_obs:
-        raise ValueError(
-            "No hay suficientes datos ni a nivel giro ni a nivel sector para "
-            f"giro={giro_usuario}, entidad={entidad_usuario}, sector={sector_usuario}"
+        # Render del chat: burbujas ya calculadas + cierre del contenedor
+        chat_box.markdown(
+            _CHAT_INICIO + "".join(st.session_state.chat_burbujas) + "</div>",
+            unsafe_allow_html=True
         )
 
-    preds_sector = _ajustar_y_predecir(
-        df_se, cat_col='sector',
-        valor_cat=sector_usuario,
-        nivel_desc='sector'
-    )
+        # Script para hacer scroll al final
+        scroll_script = """
+<script>
+const chatBox = window.parent.document.getElementById('chat-box');
+if (chatBox) {
+    chatBox.scrollTop = chatBox.scrollHeight;
+}
+</script>
+"""
+        st.markdown(scroll_script, unsafe_allow_html=True)
 
-    return preds_sector, "sector"
 
+# Fragmento: la evaluación de cartera no re-ejecuta el resto de la página
+@st.fragment
+def panel_cartera():
+    with st.expander("📂 Evaluación de cartera"):
+        archivo = st.file_uploader(
+            "CSV o parquet con columnas entidad, giro y (opcional) sector",
+            type=["csv", "parquet"]
+        )
 
-# ==========================
-# HISTÓRICO + PREDICCIÓN
-# ==========================
+        if archivo is not None and st.button("📊 Evaluar cartera"):
+            from cartera import evaluar_cartera, leer_cartera
 
-def construir_tabla_hist_y_pred(df_proc, giro, entidad, preds_dict):
-    df_hist_base = df_proc[
-        (df_proc["giro"] == giro) &
-        (df_proc["entidad"] == entidad)
-    ].copy()
-
-    if df_hist_base.empty:
-        df_pred = (
-            pd.DataFrame(
-                [{"Año": año, "Índice siniestralidad neta": val}
-                 for año, val in preds_dict.items()]
-            )
-            .assign(Fuente="Predicción")
-            .sort_values("Año")
-        )
-        return df_pred
-
-    df_hist = (
-        df_hist_base
-        .groupby("año", as_index=False)["net_sin_index"]
-        .mean()
-        .rename(columns={
-            "año": "Año",
-            "net_sin_index": "Índice siniestralidad neta"
-        })
-        .assign(Fuente="Histórico")
-    )
+            try:
+                cartera = leer_cartera(archivo)
+                barra = st.progress(0.0, text="Evaluando cartera...")
 
-    df_pred = (
-        pd.DataFrame(
-            [{"Año": año, "Índice siniestralidad neta": val}
-             for año, val in preds_dict.items()]
-        )
-        .assign(Fuente="Predicción")
-    )
+                def _avance(hechos, total):
+                    barra.progress(hechos / total if total else 1.0, text=f"Segmentos: {hechos}/{total}")
 
-    df_resultado = (
-        pd.concat([df_hist, df_pred], ignore_index=True)
-        .sort_values(["Año", "Fuente"])
-    )
+                st.session_state.cartera_resultado = evaluar_cartera(
+                    cartera, obtener_motor(), al_avanzar=_avance
+                )
+                barra.empty()
+            except Exception as e:
+                st.error(f"Error al evaluar la cartera: {e}")
 
-    return df_resultado
+        resultado = st.session_state.get("cartera_resultado")
+        if resultado is not None:
+            from cartera import a_parquet, errores_cartera
+
+            errores = errores_cartera(resultado)
+            st.success(
+                f"{resultado['fila'].nunique()} filas evaluadas; "
+                f"{len(errores)} segmentos sin pronóstico"
+            )
+            st.dataframe(resultado, hide_index=True)
+            if not errores.empty:
+                st.warning("Segmentos sin pronóstico:")
+                st.dataframe(errores, hide_index=True)
+            st.download_button(
+                "⬇️ Descargar resultado (parquet)", a_parquet(resultado),
+                file_name="cartera_pronosticos.parquet", mime="application/octet-stream"
+            )
 
 
 # ==========================
@@ -251,6 +343,7 @@ Permite:
 - Seleccionar **Entidad, Sector y Giro**.
 - Obtener una **predicción de siniestralidad (net_sin_index)** para los próximos años.
 - Consultar a un **asistente inteligente** especializado en riesgos asegurables.
+- Evaluar una **cartera** completa desde un archivo.
 """)
 
 # Dos columnas; el chat quedará al lado, tipo panel derecho
@@ -260,30 +353,54 @@ with col1:
     st.subheader("📥 Parámetros de entrada")
 
     # Dropdown entidad
-    entidades = sorted(df_proc['entidad'].dropna().unique())
-    entidad = st.selectbox("Entidad", entidades)
+    entidad = st.selectbox("Entidad", catalogo.entidades)
 
     # Dropdown sector
-    sectores = sorted(df_proc['sector'].dropna().unique())
-    sector = st.selectbox("Sector", sectores)
+    sector = st.selectbox("Sector", catalogo.sectores)
 
     # Dropdown giro dependiente del sector
-    giros_filtrados = (
-        df_proc[df_proc['sector'] == sector]['giro']
-        .dropna()
-        .sort_values()
-        .unique()
-        .tolist()
-    )
+    giros_filtrados = catalogo.giros_por_sector.get(sector, [])
     giro = st.selectbox("Giro", giros_filtrados)
 
+    # Motor de predicción: modelos por segmento (giro → sector) o modelo global
+    opciones_motor = {
+        "Segmentado (giro → sector)": "segmentado",
+        "Segmentado directo": "directo",
+        "Global": "global",
+    }
+    motor = st.radio("Motor de predicción", list(opciones_motor), horizontal=True)
+    horizonte = st.number_input(
+        "Horizonte (años)", min_value=1, max_value=5, value=HORIZONTE, step=1
+    )
+
+    # Rango P10–P90 (solo motores segmentados)
+    opciones_rango = {"Sin rango": None, "Cuantiles": "cuantiles", "Bootstrap": "bootstrap"}
+    rango = st.radio(
+        "Rango de incertidumbre", list(opciones_rango), horizontal=True,
+        disabled=opciones_motor[motor] == "global"
+    )
+    metodo_rango = None if opciones_motor[motor] == "global" else opciones_rango[rango]
+
     # Botón de predicción
     if st.button("🔮 Generar predicción de siniestralidad"):
         with st.spinner("Entrenando modelo y generando predicción..."):
             try:
-                preds, nivel = prediccion_siniestralidad(df_proc, giro, entidad)
-                df_resultado = construir_tabla_hist_y_pred(df_proc, giro, entidad, preds)
+                motor_prediccion = obtener_motor()
+                bandas = None
+                with PerfiladorMuestreo() if perfilar else contextlib.nullcontext() as perfil:
+                    if metodo_rango is None:
+                        preds, nivel = motor_prediccion.predecir(
+                            giro, entidad, motor=opciones_motor[motor], horizonte=int(horizonte)
+                        )
+                    else:
+                        preds, bandas, nivel = motor_prediccion.predecir_intervalos(
+                            giro, entidad, motor=opciones_motor[motor],
+                            horizonte=int(horizonte), metodo=metodo_rango
+                        )
+                    df_resultado = motor_prediccion.tabla_hist_y_pred(giro, entidad, preds, bandas)
+                st.session_state.perfil = perfil
                 st.session_state.df_resultado = df_resultado  # persistir
+                st.session_state.prediccion_caso = (giro, entidad, preds, nivel)  # para el chat
                 st.success(f"Predicción generada usando modelo a nivel **{nivel.upper()}**")
             except Exception as e:
                 st.error(f"Error al generar la predicción: {e}")
@@ -292,119 +409,19 @@ with col1:
     if st.session_state.df_resultado is not None:
         st.dataframe(st.session_state.df_resultado, hide_index=True)
 
+    if perfilar and st.session_state.get("perfil") is not None:
+        perfil = st.session_state.perfil
+        with st.expander(f"⏱️ Perfil de la última predicción ({perfil.segundos:.2f} s, {perfil.muestras} muestras)"):
+            st.dataframe(pd.DataFrame(perfil.resumen()), hide_index=True)
+            st.download_button("Descargar pilas colapsadas", perfil.colapsado(), file_name="perfil.txt")
 
-with col2:
-    with st.container(border=True):
-        st.subheader("💬 Asistente Inteligente de Suscripción")
-
-        # Helper para crear burbujas HTML
-        def make_bubble(role, content_html):
-            if role == "user":
-                return textwrap.dedent(f"""
-                <div style="display: flex; justify-content: flex-end; margin-bottom: 0.5rem;">
-                    <div style="
-                        max-width: 80%;
-                        background-color: #DCF8C6;
-                        color: #000;
-                        padding: 0.4rem 0.6rem;
-                        border-radius: 0.6rem;
-                        border-bottom-right-radius: 0.1rem;
-                        font-size: 0.9rem;
-                    ">
-                        {content_html}
-                    </div>
-                </div>
-                """)
-            else:
-                return textwrap.dedent(f"""
-                <div style="display: flex; justify-content: flex-start; margin-bottom: 0.5rem;">
-                    <div style="
-                        max-width: 80%;
-                        background-color: #FFFFFF;
-                        color: #000;
-                        padding: 0.4rem 0.6rem;
-                        border-radius: 0.6rem;
-                        border-bottom-left-radius: 0.1rem;
-                        font-size: 0.9rem;
-                        box-shadow: 0 0 2px rgba(0,0,0,0.1);
-                    ">
-                        {content_html}
-                    </div>
-                </div>
-                """)
-
-        # Base del contenedor del chat
-        chat_html = textwrap.dedent("""
-        <div id="chat-box" style="
-            height: 420px;
-            overflow-y: auto;
-            padding: 0.5rem;
-            border-radius: 0.5rem;
-            background-color: #11111111;
-        ">
-        """)
-
-        # Añadimos historial ya existente
-        for msg in st.session_state.chat_mensajes:
-            content_html = msg["content"].replace("\n", "<br>")
-            chat_html += make_bubble(msg["role"], content_html)
-
-        # Input de chat (al final visualmente)
-        user_input = st.chat_input("Haz una pregunta sobre el riesgo, siniestralidad o contexto...")
 
-        if user_input:
-            # 1) Añadimos mensaje de usuario a estado y al HTML
-            st.session_state.chat_mensajes.append({
-                "role": "user",
-                "content": user_input
-            })
-            chat_html += make_bubble("user", user_input.replace("\n", "<br>"))
-
-            # 2) Construimos contexto y llamamos a OpenAI
-            contexto_dinamico = f"""
-INFORMACIÓN DEL CASO ACTUAL:
-- Entidad: {entidad}
-- Sector: {sector}
-- Giro: {giro}
-"""
-
-            mensajes_openai = [
-                {"role": "system", "content": final_prompt},
-                {"role": "system", "content": contexto_dinamico},
-            ] + st.session_state.chat_mensajes
-
-            try:
-                resp = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=mensajes_openai,
-                    temperature=0.3,
-                    max_tokens=400
-                )
-                respuesta_texto = resp.choices[0].message.content
-
-                # 3) Añadimos respuesta al estado y al HTML
-                st.session_state.chat_mensajes.append({
-                    "role": "assistant",
-                    "content": respuesta_texto
-                })
-                chat_html += make_bubble("assistant", respuesta_texto.replace("\n", "<br>"))
-
-            except Exception as e:
-                st.error(f"Error al comunicarse con el asistente: {e}")
-
-        # Cerrar contenedor del chat
-        chat_html += "</div>"
+with col2:
+    panel_chat(entidad, sector, giro)
 
-        # Render del chat
-        st.markdown(chat_html, unsafe_allow_html=True)
+panel_cartera()
 
-        # Script para hacer scroll al final
-        scroll_script = """
-<script>
-const chatBox = window.parent.document.getElementById('chat-box');
-if (chatBox) {
-    chatBox.scrollTop = chatBox.scrollHeight;
-}
-</script>
-"""
-        st.markdown(scroll_script, unsafe_allow_html=True)
+# Tiempo del script completo en la primera carga de cada sesión
+if "primer_render" not in st.session_state:
+    st.session_state.primer_render = time.perf_counter() - _INICIO_SCRIPT
+    observar("primer_render_segundos", st.session_state.primer_render)
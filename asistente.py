@@ -0,0 +1,155 @@
+# ============================================
+# Cliente del asistente (LLM)
+# Un solo cliente async compartido (pool de conexiones) que corre en su
+# propio event loop en segundo plano, con límite de concurrencia, timeout y
+# reintentos con backoff. La app consume las respuestas como un generador
+# síncrono de tokens para pintarlas conforme llegan.
+#
+# El backend es cualquier servidor compatible con la API de OpenAI: basta con
+# cambiar base_url (p. ej. el stub local de stub_llm.py para pruebas).
+# ============================================
+import asyncio
+import queue
+import random
+import threading
+import time
+
+from openai import (
+    AsyncOpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+)
+
+from historial_chat import contar_tokens
+from metricas import contar, observar, registrar_tramo
+
+MODELO_CHAT = "gpt-3.5-turbo"
+PARAMS_CHAT = dict(temperature=0.3, max_tokens=400)
+
+# Errores transitorios que vale la pena reintentar
+ERRORES_REINTENTABLES = (APIConnectionError, APITimeoutError, InternalServerError, RateLimitError)
+
+_FIN = object()
+
+
+class ClienteAsistente:
+    """
+    Cliente compartido entre sesiones.
+    - max_concurrencia: llamadas simultáneas permitidas al backend.
+    - timeout: segundos por llamada (conexión + lectura).
+    - max_reintentos / backoff_base: reintentos con backoff exponencial y
+      jitter, solo si aún no se ha emitido ningún token.
+    """
+
+    def __init__(self, api_key, base_url=None, modelo=MODELO_CHAT,
+                 max_concurrencia=8, timeout=30.0, max_reintentos=3, backoff_base=0.5):
+        self.modelo = modelo
+        self.max_reintentos = max_reintentos
+        self.backoff_base = backoff_base
+
+        self._loop = asyncio.new_event_loop()
+        self._hilo = threading.Thread(target=self._loop.run_forever, name="cliente-llm", daemon=True)
+        self._hilo.start()
+
+        async def _crear():
+            # El cliente y el semáforo se crean dentro del loop que los usa
+            cliente = AsyncOpenAI(
+                api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0
+            )
+            return cliente, asyncio.Semaphore(max_concurrencia)
+
+        self._cliente, self._semaforo = asyncio.run_coroutine_threadsafe(
+            _crear(), self._loop
+        ).result()
+
+    # --------------------------
+    # Lado async
+    # --------------------------
+    async def _tokens(self, mensajes, params, uso):
+        # uso: se llena con los tokens que reporta el backend (último chunk)
+        async with self._semaforo:
+            for intento in range(self.max_reintentos + 1):
+                emitido = False
+                try:
+                    stream = await self._cliente.chat.completions.create(
+                        model=self.modelo, messages=mensajes, stream=True,
+                        stream_options={"include_usage": True}, **params
+                    )
+                    async for chunk in stream:
+                        if getattr(chunk, "usage", None) is not None:
+                            uso["prompt"] = chunk.usage.prompt_tokens
+                            uso["completion"] = chunk.usage.completion_tokens
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            emitido = True
+                            yield delta
+                    return
+                except ERRORES_REINTENTABLES:
+                    if emitido or intento == self.max_reintentos:
+                        raise
+                    contar("llm_reintentos_total")
+                    espera = self.backoff_base * (2 ** intento) * (1 + random.random())
+                    await asyncio.sleep(espera)
+
+    # --------------------------
+    # Lado síncrono (Streamlit)
+    # --------------------------
+    def stream(self, mensajes, **params):
+        """
+        Generador síncrono de fragmentos de texto de la respuesta.
+        Si el consumidor deja de iterar, la llamada se cancela.
+        Registra el tramo "llm", el tiempo al primer token y los tokens
+        usados (los del backend o, si no los reporta, una estimación local).
+        """
+        params = dict(PARAMS_CHAT, **params)
+        cola = queue.Queue()
+        uso = {}
+
+        async def _bombear():
+            try:
+                async for token in self._tokens(mensajes, params, uso):
+                    cola.put(token)
+            except Exception as e:
+                cola.put(e)
+            finally:
+                cola.put(_FIN)
+
+        futuro = asyncio.run_coroutine_threadsafe(_bombear(), self._loop)
+        t0 = time.perf_counter()
+        fragmentos = []
+        estado = "ok"
+        try:
+            while True:
+                item = cola.get()
+                if item is _FIN:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                if not fragmentos:
+                    observar("llm_primer_token_segundos", time.perf_counter() - t0)
+                fragmentos.append(item)
+                yield item
+        except Exception:
+            estado = "error"
+            raise
+        finally:
+            futuro.cancel()
+            registrar_tramo("llm", time.perf_counter() - t0, estado=estado, modelo=self.modelo)
+            self._contar_uso(mensajes, fragmentos, uso)
+
+    @staticmethod
+    def _contar_uso(mensajes, fragmentos, uso):
+        if "prompt" in uso:
+            origen = "backend"
+        else:
+            origen = "estimado"
+            uso["prompt"] = sum(contar_tokens(m["content"]) + 4 for m in mensajes)
+            uso["completion"] = contar_tokens("".join(fragmentos))
+        contar("llm_tokens_total", uso["prompt"], tipo="prompt", origen=origen)
+        contar("llm_tokens_total", uso["completion"], tipo="completion", origen=origen)
+
+    def completar(self, mensajes, **params):
+        """Respuesta completa (sin streaming) como un solo string."""
+        return "".join(self.stream(mensajes, **params))
+
+    def cerrar(self):
+        asyncio.run_coroutine_threadsafe(self._cliente.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
@@ -0,0 +1,416 @@
+# ============================================
+# Backtesting con origen móvil de los modelos de siniestralidad
+# Para cada año de origen t se reproduce lo que la app habría pronosticado
+# con los datos hasta t: prediccion_siniestralidad (giro → sector) sobre
+# cada par (giro, entidad) que tiene datos reales en t+1 o t+2, y se
+# compara contra esos años.
+# - Features por fold: cada worker construye una sola vez el almacén de
+#   lags de df_proc completo; el fold t es una vista que corta cada
+#   segmento en el año t (los lags solo miran hacia atrás, así que es lo
+#   mismo que recalcularlos con los datos hasta t).
+# - Los lotes (origen, pares) se reparten en un pool de procesos.
+# - Se entrena con los hiperparámetros base: parametros_sector.json se
+#   busca con toda la historia, así que usarlo en un fold filtraría datos
+#   posteriores al origen (--parametros-sector lo activa, sabiendo que el
+#   error reportado sale optimista).
+# - Los pronósticos se cuentan desde el origen: si la serie de un par
+#   termina antes, se pronostica con pasos extra desde su último año
+#   (columna rezago) en lugar de etiquetar esos años como t+1..t+h.
+# - Reporte en parquet: una fila por (origen, par, año pronosticado) con
+#   nivel usado, error absoluto y porcentual y tiempos de ajuste y de
+#   pronóstico; más el resumen por segmento (_segmentos.parquet). Los
+#   resúmenes dan MAE y WAPE (suma de errores / suma de reales); el MAPE
+#   solo cuenta los años con valor real distinto de cero (cerca de un
+#   tercio de net_sin_index es 0).
+#
+# Uso:
+#   python backtest.py [--origenes 2020 2021 2022] [--workers N] [--salida bench_resultados/backtest.parquet]
+#                      [--parametros-sector]
+#   python backtest.py --comparar antes.parquet despues.parquet
+# ============================================
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from almacen_features import AlmacenFeatures, Segmento
+from datos import DatosCNSF, cargar_df_proc, ruta_fuente
+from metricas import METRICAS
+from modelo import HORIZONTE, MODOS, RUTA_PARAMETROS_SECTOR, prediccion_siniestralidad
+
+ORIGENES = 5            # por defecto, los últimos N años con algo que evaluar
+TAMANO_LOTE_BACKTEST = 50
+RUTA_REPORTE = "bench_resultados/backtest.parquet"
+
+# Datos y almacén de df_proc completo, una sola vez por proceso del pool
+_datos_worker = None
+_almacen_worker = None
+_ruta_parametros_worker = None
+
+
+class AlmacenHasta:
+    """
+    Vista de un AlmacenFeatures con los datos hasta un año (fold de
+    backtesting): cada segmento se corta en el último año <= hasta. Los
+    arreglos siguen siendo vistas, sin copiar.
+    """
+
+    def __init__(self, almacen, hasta):
+        self.almacen = almacen
+        self.hasta = hasta
+
+    def segmento(self, cat_col, valor_cat, entidad):
+        segmento = self.almacen.segmento(cat_col, valor_cat, entidad)
+        if segmento is None:
+            return None
+        fin = np.searchsorted(segmento.años, self.hasta, side="right")
+        if fin == 0:
+            return None
+        return Segmento(*(arreglo[:fin] for arreglo in segmento))
+
+
+# ==========================
+# FOLDS Y TAREAS
+# ==========================
+
+def _años_no_cero(df):
+    """Años con algún net_sin_index distinto de cero (en df_proc los recientes son todos 0)."""
+    return set(df.loc[df["net_sin_index"].fillna(0) != 0, "año"].astype(int))
+
+
+def origenes_por_defecto(df, n=ORIGENES):
+    """
+    Últimos n años t con algún net_sin_index distinto de cero en t+1: con
+    reales en cero solo se puede medir el error absoluto.
+    """
+    evaluables = _años_no_cero(df)
+    años = sorted(int(a) for a in df["año"].dropna().unique())
+    return [a for a in años if a + 1 in evaluables][-n:]
+
+
+def muestrear_pares(df, pares, muestra, horizonte=HORIZONTE, semilla=0):
+    """
+    Hasta `muestra` pares por origen, al azar, tomando primero los que
+    tienen algún real distinto de cero en t+1..t+horizonte (para que el
+    MAPE tenga con qué calcularse). Conserva el orden de pares.
+    """
+    rng = np.random.default_rng(semilla)
+    no_cero = df[df["net_sin_index"].fillna(0) != 0]
+    muestreados = {}
+    for t, lista in pares.items():
+        futuros = no_cero[no_cero["año"].between(t + 1, t + horizonte)]
+        con_real = set(zip(futuros["giro"], futuros["entidad"]))
+        orden = sorted(
+            range(len(lista)),
+            key=lambda i, azar=rng.random(len(lista)): (lista[i] not in con_real, azar[i])
+        )
+        muestreados[t] = [lista[i] for i in sorted(orden[:muestra])]
+    return muestreados
+
+
+def pares_por_origen(df, origenes, horizonte=HORIZONTE):
+    """
+    {t: [(giro, entidad)]} con los pares que tienen net_sin_index real en
+    algún año de t+1..t+horizonte y al menos una fila hasta t.
+    """
+    observados = df.dropna(subset=["giro", "entidad", "net_sin_index"])
+    primer_año = observados.groupby(["giro", "entidad"], observed=True)["año"].min()
+    pares = {}
+    for t in origenes:
+        futuros = observados[observados["año"].between(t + 1, t + horizonte)]
+        candidatos = futuros[["giro", "entidad"]].drop_duplicates()
+        con_historia = primer_año.reindex(pd.MultiIndex.from_frame(candidatos)) <= t
+        pares[t] = [tuple(p) for p in candidatos[con_historia.to_numpy()].itertuples(index=False)]
+    return pares
+
+
+def _inicializar_worker(ruta_datos, ruta_parametros=None):
+    global _datos_worker, _almacen_worker, _ruta_parametros_worker
+    _datos_worker = DatosCNSF(cargar_df_proc(ruta_datos))
+    _almacen_worker = AlmacenFeatures(_datos_worker.df)
+    _ruta_parametros_worker = ruta_parametros
+
+
+def _procesar_lote(origen, pares, horizonte, modo):
+    return filas_backtest(
+        origen, pares, _datos_worker, _almacen_worker, horizonte, modo,
+        ruta_parametros=_ruta_parametros_worker
+    )
+
+
+def _segundos(etapas):
+    return sum(METRICAS.suma("etapa_segundos", etapa=etapa) for etapa in etapas)
+
+
+def ultimo_año_observado(fold, giro, entidad, sector):
+    """
+    Último año con net_sin_index del par en el fold (el del giro; si no
+    tiene, el del sector). El modelo pronostica a partir de ese año.
+    """
+    for cat_col, valor_cat in (("giro", giro), ("sector", sector)):
+        segmento = fold.segmento(cat_col, valor_cat, entidad) if valor_cat is not None else None
+        if segmento is not None:
+            con_target = segmento.años[~np.isnan(segmento.target)]
+            if len(con_target):
+                return int(con_target[-1])
+    return fold.hasta
+
+
+def filas_backtest(origen, pares, datos, almacen, horizonte=HORIZONTE, modo="recursivo", n_jobs=1,
+                   ruta_parametros=None):
+    """
+    Pronósticos con los datos hasta origen para cada par, uno por año
+    t+1..t+horizonte (o una fila con el error). Si la serie del par termina
+    antes de origen, se pronostica desde su último año con tantos pasos
+    extra como años faltan (rezago) y solo se conservan t+1..t+horizonte,
+    así el horizonte de cada fila es año - origen. Sin registro de modelos:
+    cada fold entrena con sus propios datos. ruta_parametros=None usa los
+    hiperparámetros base (los ajustados por sector vieron toda la historia).
+    """
+    fold = AlmacenHasta(almacen, origen)
+    filas = []
+    for giro, entidad in pares:
+        sector = datos.sector_de_giro(giro)
+        rezago = origen - ultimo_año_observado(fold, giro, entidad, sector)
+        base = {"origen": origen, "giro": giro, "entidad": entidad, "sector": sector, "rezago": rezago}
+        # Los tramos de modelo.py dan el tiempo de ajuste y de pronóstico
+        ajuste_0, pronostico_0 = _segundos(("preparacion", "ajuste")), _segundos(("pronostico",))
+        t0 = time.perf_counter()
+        try:
+            preds, nivel = prediccion_siniestralidad(
+                datos.df, giro, entidad, n_jobs=n_jobs, almacen=fold, datos=datos,
+                horizonte=horizonte + rezago, modo=modo, ruta_parametros=ruta_parametros
+            )
+        except ValueError as e:
+            filas.append(dict(base, nivel=None, año=None, prediccion=None, error=str(e)))
+            continue
+        tiempos = {
+            "segundos_total": time.perf_counter() - t0,
+            "segundos_ajuste": _segundos(("preparacion", "ajuste")) - ajuste_0,
+            "segundos_pronostico": _segundos(("pronostico",)) - pronostico_0,
+        }
+        ventana = {año: p for año, p in preds.items() if origen < año <= origen + horizonte}
+        if len(ventana) < horizonte:
+            faltantes = sorted(set(range(origen + 1, origen + horizonte + 1)) - set(ventana))
+            filas.append(dict(
+                base, nivel=nivel, año=None, prediccion=None,
+                error=f"Sin pronóstico para {faltantes} (el modelo pronosticó {sorted(preds)})"
+            ))
+        for año, prediccion in ventana.items():
+            filas.append(dict(base, nivel=nivel, año=año, prediccion=prediccion, error=None, **tiempos))
+    return filas
+
+
+# ==========================
+# BACKTEST COMPLETO
+# ==========================
+
+def _reales(df):
+    observados = df.dropna(subset=["giro", "entidad", "net_sin_index"])
+    return observados.groupby(["giro", "entidad", "año"], observed=True)["net_sin_index"].first()
+
+
+def a_reporte(filas, df, modo):
+    """DataFrame del reporte: agrega el valor real y los errores a cada pronóstico."""
+    reporte = pd.DataFrame(filas)
+    for col in ["rezago", "nivel", "año", "prediccion", "error",
+                "segundos_total", "segundos_ajuste", "segundos_pronostico"]:
+        if col not in reporte.columns:
+            reporte[col] = None
+    reporte["año"] = reporte["año"].astype("Int64")
+    reporte["horizonte"] = (reporte["año"] - reporte["origen"]).astype("Int64")
+    reporte["modo"] = modo
+
+    claves = pd.MultiIndex.from_arrays([reporte["giro"], reporte["entidad"], reporte["año"]])
+    reporte["real"] = _reales(df).reindex(claves).to_numpy(dtype="float64")
+    reporte["prediccion"] = reporte["prediccion"].astype("float64")
+    reporte["error_abs"] = (reporte["prediccion"] - reporte["real"]).abs()
+    # Error porcentual solo con valor real distinto de cero (muchos años sin siniestros)
+    reporte["error_pct"] = reporte["error_abs"] / reporte["real"].abs().where(reporte["real"] != 0)
+    return reporte[[
+        "origen", "horizonte", "rezago", "año", "giro", "entidad", "sector", "nivel", "modo",
+        "real", "prediccion", "error_abs", "error_pct",
+        "segundos_ajuste", "segundos_pronostico", "segundos_total", "error"
+    ]].sort_values(["origen", "giro", "entidad", "año"], kind="stable").reset_index(drop=True)
+
+
+def correr_backtest(ruta_datos=None, origenes=None, horizonte=HORIZONTE, modo="recursivo",
+                    workers=None, tamano_lote=TAMANO_LOTE_BACKTEST, muestra=None, semilla=0,
+                    parametros_sector=False):
+    """
+    Backtest completo. muestra limita el número de pares por origen (al
+    azar, para corridas rápidas; ver muestrear_pares). parametros_sector=True entrena con
+    parametros_sector.json (ajustado con toda la historia: el error sale
+    optimista). Devuelve el reporte (ver a_reporte).
+    """
+    if modo not in MODOS:
+        raise ValueError(f"modo debe ser uno de {MODOS}")
+    ruta_datos = ruta_datos or ruta_fuente()
+    ruta_parametros = RUTA_PARAMETROS_SECTOR if parametros_sector else None
+    df = cargar_df_proc(ruta_datos)
+    origenes = origenes or origenes_por_defecto(df)
+    pares = pares_por_origen(df, origenes, horizonte)
+    if muestra is not None:
+        pares = muestrear_pares(df, pares, muestra, horizonte, semilla)
+
+    lotes = [
+        (t, lista[i:i + tamano_lote])
+        for t, lista in pares.items() for i in range(0, len(lista), tamano_lote)
+    ]
+    total = sum(len(lote) for _, lote in lotes)
+    print(f"{len(origenes)} orígenes ({origenes[0]}–{origenes[-1]}), {total} pronósticos, {len(lotes)} lotes")
+
+    filas, hechos = [], 0
+    if workers == 1:
+        datos = DatosCNSF(df)
+        almacen = AlmacenFeatures(df)
+        for t, lote in lotes:
+            filas += filas_backtest(
+                t, lote, datos, almacen, horizonte, modo, n_jobs=None, ruta_parametros=ruta_parametros
+            )
+            hechos += len(lote)
+            print(f"  {hechos}/{total}", end="\r")
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_inicializar_worker,
+            initargs=(ruta_datos, ruta_parametros)
+        ) as pool:
+            futuros = {
+                pool.submit(_procesar_lote, t, lote, horizonte, modo): len(lote)
+                for t, lote in lotes
+            }
+            for futuro in as_completed(futuros):
+                filas += futuro.result()
+                hechos += futuros[futuro]
+                print(f"  {hechos}/{total}", end="\r")
+    print()
+    return a_reporte(filas, df, modo)
+
+
+# ==========================
+# RESÚMENES Y COMPARACIÓN
+# ==========================
+
+def _evaluados(reporte):
+    """Pronósticos con valor real, más |real| para el WAPE."""
+    evaluados = reporte[reporte["real"].notna() & reporte["prediccion"].notna()]
+    return evaluados.assign(real_abs=evaluados["real"].abs())
+
+
+def _wape(tabla):
+    """WAPE = suma de errores absolutos / suma de |real| (sin división por años en cero)."""
+    tabla["wape"] = tabla.pop("suma_error") / tabla.pop("suma_real").where(lambda x: x != 0)
+    return tabla
+
+
+def resumen(reporte, por=("nivel", "horizonte")):
+    """
+    MAE, WAPE, mediana del error, MAPE (solo reales distintos de cero, n_mape
+    pronósticos) y tiempos medios de ajuste y pronóstico por `por`.
+    """
+    return _wape(_evaluados(reporte).groupby(list(por), dropna=False).agg(
+        n=("error_abs", "size"),
+        mae=("error_abs", "mean"),
+        suma_error=("error_abs", "sum"),
+        suma_real=("real_abs", "sum"),
+        mediana_error=("error_abs", "median"),
+        mape=("error_pct", "mean"),
+        n_mape=("error_pct", "count"),
+        segundos_ajuste=("segundos_ajuste", "mean"),
+        segundos_pronostico=("segundos_pronostico", "mean"),
+    ).reset_index())
+
+
+def resumen_segmentos(reporte):
+    """Métricas por segmento (giro, entidad, nivel usado) sobre todos los orígenes."""
+    ajustes = reporte.drop_duplicates(["origen", "giro", "entidad"])
+    tiempos = ajustes.groupby(["giro", "entidad"], observed=True).agg(
+        ajustes=("origen", "size"),
+        errores=("error", lambda s: s.notna().sum()),
+        segundos_ajuste=("segundos_ajuste", "mean"),
+        segundos_pronostico=("segundos_pronostico", "mean"),
+    )
+    errores = _wape(_evaluados(reporte).groupby(["giro", "entidad"], observed=True).agg(
+        sector=("sector", "first"),
+        nivel=("nivel", lambda s: "/".join(sorted(s.dropna().unique()))),
+        n=("error_abs", "size"),
+        mae=("error_abs", "mean"),
+        suma_error=("error_abs", "sum"),
+        suma_real=("real_abs", "sum"),
+        mape=("error_pct", "mean"),
+    ))
+    return errores.join(tiempos, how="outer").reset_index()
+
+
+def comparar(ruta_a, ruta_b):
+    """
+    MAE y WAPE por nivel y horizonte de dos reportes, solo sobre los
+    pronósticos presentes en ambos (mismo origen, par y año).
+    """
+    a, b = pd.read_parquet(ruta_a), pd.read_parquet(ruta_b)
+    claves = ["origen", "giro", "entidad", "año"]
+    unidos = a.merge(b, on=claves, suffixes=("_a", "_b"))
+    unidos = unidos[unidos["error_abs_a"].notna() & unidos["error_abs_b"].notna()]
+    unidos["nivel"] = unidos["nivel_a"]
+    unidos["horizonte"] = unidos["horizonte_a"]
+    unidos["real_abs"] = unidos["real_a"].abs()
+    tabla = unidos.groupby(["nivel", "horizonte"]).agg(
+        n=("error_abs_a", "size"),
+        mae_a=("error_abs_a", "mean"),
+        mae_b=("error_abs_b", "mean"),
+        mediana_a=("error_abs_a", "median"),
+        mediana_b=("error_abs_b", "median"),
+        suma_real=("real_abs", "sum"),
+    ).reset_index()
+    suma_real = tabla.pop("suma_real").where(lambda x: x != 0)
+    tabla["wape_a"] = tabla["mae_a"] * tabla["n"] / suma_real
+    tabla["wape_b"] = tabla["mae_b"] * tabla["n"] / suma_real
+    tabla["delta_mae_pct"] = (tabla["mae_b"] / tabla["mae_a"] - 1) * 100
+    ajustes_a = a.drop_duplicates(["origen", "giro", "entidad"])["segundos_ajuste"].mean()
+    ajustes_b = b.drop_duplicates(["origen", "giro", "entidad"])["segundos_ajuste"].mean()
+    return tabla, ajustes_a, ajustes_b
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtesting con origen móvil de prediccion_siniestralidad.")
+    parser.add_argument("--datos", default=None,
+                        help="parquet o dataset particionado (por defecto el que usa la app)")
+    parser.add_argument("--origenes", type=int, nargs="+", default=None,
+                        help=f"años de origen (por defecto los últimos {ORIGENES} con reales distintos de cero en t+1)")
+    parser.add_argument("--horizonte", type=int, default=HORIZONTE)
+    parser.add_argument("--modo", choices=MODOS, default="recursivo")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--muestra", type=int, default=None,
+                        help="pares al azar por origen (primero los que tienen reales distintos de cero)")
+    parser.add_argument("--salida", default=RUTA_REPORTE)
+    parser.add_argument("--parametros-sector", action="store_true",
+                        help="usa parametros_sector.json (buscado con toda la historia: error optimista)")
+    parser.add_argument("--comparar", nargs=2, metavar=("ANTES", "DESPUES"))
+    args = parser.parse_args()
+
+    with pd.option_context("display.width", 160, "display.max_columns", 20):
+        if args.comparar:
+            tabla, ajuste_a, ajuste_b = comparar(*args.comparar)
+            print(tabla.to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+            print(f"Ajuste medio: {ajuste_a * 1000:.1f} ms → {ajuste_b * 1000:.1f} ms")
+        else:
+            reporte = correr_backtest(
+                args.datos, args.origenes, args.horizonte, args.modo, args.workers,
+                muestra=args.muestra, parametros_sector=args.parametros_sector
+            )
+            os.makedirs(os.path.dirname(args.salida) or ".", exist_ok=True)
+            reporte.to_parquet(args.salida, index=False, compression="zstd")
+            ruta_segmentos = f"{os.path.splitext(args.salida)[0]}_segmentos.parquet"
+            resumen_segmentos(reporte).to_parquet(ruta_segmentos, index=False, compression="zstd")
+            tabla = resumen(reporte)
+            print(tabla.to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+            sin_mape = tabla[tabla["n_mape"] == 0]
+            if len(sin_mape):
+                print(
+                    f"Aviso: {len(sin_mape)} de {len(tabla)} grupos sin reales distintos de cero "
+                    "(MAPE vacío y WAPE sin denominador); usar orígenes anteriores."
+                )
+            print(f"Reporte en {args.salida}; por segmento en {ruta_segmentos}")
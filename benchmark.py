@@ -0,0 +1,426 @@
+# ============================================
+# Benchmarks de las rutas críticas (sin interfaz)
+# Mide, sobre df_proc.parquet y sobre datasets sintéticos escalados:
+#   - carga de datos (parquet -> DatosCNSF) y cómputo de dropdowns
+#   - prediccion_siniestralidad en cada nivel (giro / sector), en frío y
+#     con el modelo ya en el registro
+#   - construir_tabla_hist_y_pred
+#   - tiempo de ajuste de XGBoost según el tamaño del segmento
+#   - armado del chat (historial con presupuesto) y streaming contra el
+#     stub local del LLM (sin red ni costo)
+#   - tiempo hasta el primer render de app.py en un proceso nuevo (contra
+#     OBJETIVO_PRIMER_RENDER_S) y qué módulos pesados se cargaron para ello
+# Reporta percentiles de latencia y memoria pico, y guarda un JSON para
+# comparar entre commits.
+#
+# Uso:
+#   python benchmark.py [--escalas 1 10 100] [--pares 10] [--salida bench_resultados/x.json]
+#   python benchmark.py --comparar base.json nuevo.json
+# ============================================
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import xgboost
+
+from almacen_features import AlmacenFeatures
+from asistente import ClienteAsistente
+from datos import RUTA_DATOS, DatosCNSF, cargar_df_proc
+from historial_chat import construir_mensajes
+from modelo import (
+    ajustar_modelo, construir_tabla_hist_y_pred, features_segmento, parametros_sector,
+    parametros_segmento, prediccion_siniestralidad
+)
+from precomputo import pares_validos
+from registro_modelos import RegistroModelos
+from stub_llm import iniciar_stub
+
+CARPETA_RESULTADOS = "bench_resultados"
+REPETICIONES = 20
+TAMANOS_SEGMENTO = [10, 50, 200, 1000, 5000]
+
+# Primer render de la app (import de streamlit + primera corrida del script)
+OBJETIVO_PRIMER_RENDER_S = 2.0
+MODULOS_PESADOS = ("xgboost", "sklearn", "openai", "motor")
+
+# Se corre en un proceso nuevo para medir los imports en frío
+_SCRIPT_ARRANQUE = """
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+t1 = time.perf_counter()
+app = AppTest.from_file(sys.argv[1], default_timeout=300)
+app.secrets["openai_api_key"] = "benchmark"
+app.run()
+t2 = time.perf_counter()
+print(json.dumps({
+    "importar_streamlit": t1 - t0, "primera_corrida": t2 - t1, "total": t2 - t0,
+    "errores": len(app.exception),
+    "modulos": [m for m in sys.argv[2:] if m in sys.modules],
+}))
+"""
+
+
+# ==========================
+# MEDICIÓN
+# ==========================
+
+def resumir(tiempos, pico_bytes=None):
+    """Percentiles (ms) de una lista de tiempos en segundos."""
+    t = np.asarray(tiempos) * 1000
+    resumen = {
+        "n": len(t),
+        "media_ms": float(t.mean()),
+        "p50_ms": float(np.percentile(t, 50)),
+        "p90_ms": float(np.percentile(t, 90)),
+        "p99_ms": float(np.percentile(t, 99)),
+        "max_ms": float(t.max()),
+    }
+    if pico_bytes is not None:
+        resumen["pico_memoria_mb"] = pico_bytes / 2**20
+    return resumen
+
+
+def _pico_memoria(fn):
+    """Memoria pico (bytes) asignada por Python/NumPy durante una llamada."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def medir(fn, repeticiones=REPETICIONES, calentamiento=1):
+    """
+    Corre fn varias veces y resume su latencia. La memoria pico se mide en
+    una corrida aparte para que tracemalloc no infle los tiempos.
+    """
+    for _ in range(calentamiento):
+        fn()
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - t0)
+    return resumir(tiempos, _pico_memoria(fn))
+
+
+def medir_cada(fn, argumentos):
+    """Latencia de fn(arg) una vez por argumento (p. ej. un par distinto cada vez)."""
+    tiempos = []
+    for arg in argumentos:
+        t0 = time.perf_counter()
+        fn(arg)
+        tiempos.append(time.perf_counter() - t0)
+    return resumir(tiempos) if tiempos else None
+
+
+# ==========================
+# DATOS SINTÉTICOS
+# ==========================
+
+def dataset_sintetico(df_proc, factor, semilla=0):
+    """
+    df_proc escalado `factor` veces: cada copia renombra los giros (más
+    segmentos a nivel giro; segmentos de sector más grandes) y perturba las
+    columnas numéricas con ruido multiplicativo para que los modelos no
+    sean idénticos.
+    """
+    if factor == 1:
+        return df_proc
+    rng = np.random.default_rng(semilla)
+    numericas = df_proc.select_dtypes("number").columns.drop("año")
+    copias = [df_proc]
+    for k in range(1, factor):
+        copia = df_proc.copy()
+        copia["giro"] = copia["giro"].astype(str) + f" [s{k}]"
+        ruido = rng.lognormal(0.0, 0.1, size=(len(copia), len(numericas)))
+        copia[numericas] = copia[numericas].to_numpy(dtype=float) * ruido
+        copias.append(copia)
+    return pd.concat(copias, ignore_index=True)
+
+
+# ==========================
+# ESCENARIOS
+# ==========================
+
+def _pares_por_nivel(datos, almacen, n_por_nivel, semilla=0):
+    """
+    Recorre pares al azar hasta juntar n_por_nivel que resuelven a nivel
+    giro y n_por_nivel a nivel sector (ajuste en frío, sin registro).
+    Devuelve ({nivel: [pares]}, {nivel: [segundos]}).
+    """
+    pares = pares_validos(datos.df)
+    orden = np.random.default_rng(semilla).permutation(len(pares))
+    encontrados = {"giro": [], "sector": []}
+    tiempos = {"giro": [], "sector": []}
+    for i in orden[: 40 * n_por_nivel]:
+        giro, entidad = pares[i]
+        t0 = time.perf_counter()
+        try:
+            _, nivel = prediccion_siniestralidad(
+                datos.df, giro, entidad, almacen=almacen, datos=datos
+            )
+        except ValueError:
+            continue
+        if len(encontrados[nivel]) < n_por_nivel:
+            encontrados[nivel].append((giro, entidad))
+            tiempos[nivel].append(time.perf_counter() - t0)
+        if all(len(v) >= n_por_nivel for v in encontrados.values()):
+            break
+    return encontrados, tiempos
+
+
+def _ajuste_por_tamano(datos, almacen, max_por_tamano=3):
+    """
+    Tiempo de un ajuste (ajustar_modelo: capacidad según tamaño + parada
+    temprana) para segmentos de sector de distintos tamaños.
+    """
+    tamanos = (
+        datos.df.groupby(["sector", "entidad"], observed=True).size()
+        .sort_values().reset_index(name="filas")
+    )
+    resultados = []
+    for limite in TAMANOS_SEGMENTO:
+        candidatos = tamanos[tamanos["filas"] <= limite].tail(max_por_tamano)
+        tiempos, filas = [], []
+        for sector, entidad, _ in candidatos.itertuples(index=False):
+            segmento = almacen.segmento("sector", sector, entidad)
+            if segmento is None or segmento.valido.sum() < 3:
+                continue
+            X = features_segmento(segmento.lags[segmento.valido])
+            y = segmento.target[segmento.valido]
+            params = parametros_segmento(len(y), parametros_sector(sector))
+            t0 = time.perf_counter()
+            ajustar_modelo(X, y, segmento.años[segmento.valido], params)
+            tiempos.append(time.perf_counter() - t0)
+            filas.append(len(y))
+        if tiempos:
+            resultados.append(dict(
+                resumir(tiempos), filas_max=limite, filas_entrenamiento=int(np.median(filas))
+            ))
+    return resultados
+
+
+def benchmark_datos(ruta, n_pares=10, repeticiones=REPETICIONES):
+    """Escenarios de datos y predicción sobre un parquet."""
+    resultado = {"filas": pq.ParquetFile(ruta).metadata.num_rows}
+
+    resultado["carga"] = medir(
+        lambda: DatosCNSF(cargar_df_proc(ruta)), repeticiones=max(3, repeticiones // 4)
+    )
+    datos = DatosCNSF(cargar_df_proc(ruta))
+
+    def _dropdowns():
+        # Índices de la app (entidades, sectores, giros por sector) + consulta de cada sector
+        indices = DatosCNSF(datos.df)
+        return [indices.giros_por_sector.get(s, []) for s in indices.sectores]
+
+    resultado["dropdowns"] = medir(_dropdowns, repeticiones=repeticiones)
+
+    t0 = time.perf_counter()
+    almacen = AlmacenFeatures(datos.df)
+    resultado["almacen_features_s"] = time.perf_counter() - t0
+
+    pares, tiempos = _pares_por_nivel(datos, almacen, n_pares)
+    for nivel in ("giro", "sector"):
+        resultado[f"prediccion_{nivel}_frio"] = resumir(tiempos[nivel]) if tiempos[nivel] else None
+
+    # Con el modelo ya en el registro (en memoria): solo pronóstico
+    registro = RegistroModelos(max_memoria=4096, ruta_disco=None)
+    todos = pares["giro"] + pares["sector"]
+    prediccion = lambda par: prediccion_siniestralidad(
+        datos.df, *par, registro=registro, huella_datos="bench", almacen=almacen, datos=datos
+    )
+    for par in todos:
+        prediccion(par)
+    resultado["prediccion_registro"] = medir_cada(prediccion, todos)
+
+    if todos:
+        giro, entidad = todos[0]
+        preds, _ = prediccion(todos[0])
+        resultado["tabla_hist_y_pred"] = medir(
+            lambda: construir_tabla_hist_y_pred(datos.df, giro, entidad, preds, datos=datos),
+            repeticiones=repeticiones
+        )
+
+    resultado["ajuste_por_tamano"] = _ajuste_por_tamano(datos, almacen)
+    return resultado
+
+
+def benchmark_chat(repeticiones=REPETICIONES, turnos=40):
+    """Armado de mensajes con historial largo + streaming contra el stub local."""
+    historial = []
+    for i in range(turnos):
+        historial.append({"role": "user", "content": f"Pregunta {i} sobre el riesgo de incendio del giro. " * 3})
+        historial.append({"role": "assistant", "content": f"Respuesta {i} con recomendaciones de suscripción. " * 12})
+    contexto = "Entidad: Jalisco\nSector: Manufactura\nGiro: Fabricación de muebles"
+
+    resultado = {"armado_mensajes": medir(
+        lambda: construir_mensajes(contexto, historial), repeticiones=repeticiones * 5
+    )}
+
+    servidor, base_url = iniciar_stub()
+    cliente = ClienteAsistente(api_key="stub", base_url=base_url)
+    try:
+        mensajes = construir_mensajes(contexto, historial)
+        primer_token, total = [], []
+        for _ in range(repeticiones):
+            t0 = time.perf_counter()
+            primero = None
+            for _ in cliente.stream(mensajes):
+                if primero is None:
+                    primero = time.perf_counter() - t0
+            primer_token.append(primero)
+            total.append(time.perf_counter() - t0)
+        resultado["stream_primer_token"] = resumir(primer_token)
+        resultado["stream_total"] = resumir(total)
+    finally:
+        cliente.cerrar()
+        servidor.shutdown()
+    return resultado
+
+
+def benchmark_arranque(repeticiones=5):
+    """
+    Tiempo hasta el primer render de app.py, cada vez en un intérprete
+    nuevo. La primera corrida (descartada) deja el catálogo al día.
+    """
+    raiz = os.path.dirname(os.path.abspath(__file__))
+    comando = [sys.executable, "-c", _SCRIPT_ARRANQUE, os.path.join(raiz, "app.py"), *MODULOS_PESADOS]
+    corridas = []
+    for _ in range(repeticiones + 1):
+        salida = subprocess.run(comando, cwd=raiz, capture_output=True, text=True, check=True).stdout
+        corridas.append(json.loads(salida.strip().splitlines()[-1]))
+    corridas = corridas[1:]
+
+    total = resumir([c["total"] for c in corridas])
+    return {
+        "importar_streamlit": resumir([c["importar_streamlit"] for c in corridas]),
+        "primera_corrida": resumir([c["primera_corrida"] for c in corridas]),
+        "total": total,
+        "objetivo_s": OBJETIVO_PRIMER_RENDER_S,
+        "cumple_objetivo": total["p90_ms"] <= OBJETIVO_PRIMER_RENDER_S * 1000,
+        "errores": sum(c["errores"] for c in corridas),
+        "modulos_pesados_cargados": sorted({m for c in corridas for m in c["modulos"]}),
+    }
+
+
+# ==========================
+# EJECUCIÓN Y COMPARACIÓN
+# ==========================
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def correr(ruta=RUTA_DATOS, escalas=(1, 10), n_pares=10, repeticiones=REPETICIONES):
+    resultados = {
+        "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "entorno": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "xgboost": xgboost.__version__,
+        },
+        "escalas": {},
+    }
+
+    df_base = pd.read_parquet(ruta)
+    with tempfile.TemporaryDirectory() as tmp:
+        for factor in escalas:
+            print(f"Escala x{factor}...")
+            ruta_escala = ruta
+            if factor != 1:
+                ruta_escala = os.path.join(tmp, f"df_proc_x{factor}.parquet")
+                dataset_sintetico(df_base, factor).to_parquet(ruta_escala, index=False)
+            resultados["escalas"][f"x{factor}"] = benchmark_datos(ruta_escala, n_pares, repeticiones)
+
+    print("Chat...")
+    resultados["chat"] = benchmark_chat(repeticiones)
+
+    print("Arranque de la app...")
+    resultados["arranque"] = benchmark_arranque(max(3, repeticiones // 4))
+    arranque = resultados["arranque"]
+    print(
+        f"  primer render p90 {arranque['total']['p90_ms'] / 1000:.2f} s "
+        f"(objetivo {OBJETIVO_PRIMER_RENDER_S} s: {'cumple' if arranque['cumple_objetivo'] else 'NO cumple'}); "
+        f"módulos pesados: {arranque['modulos_pesados_cargados'] or 'ninguno'}"
+    )
+    # Pico de RSS de todo el proceso (incluye memoria nativa de XGBoost/Arrow)
+    resultados["rss_max_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return resultados
+
+
+def _aplanar(d, prefijo=""):
+    """{'escalas.x1.carga': {...resumen...}, ...} con los resúmenes de latencia."""
+    planos = {}
+    for clave, valor in d.items():
+        nombre = f"{prefijo}{clave}"
+        if isinstance(valor, dict) and "p50_ms" in valor:
+            planos[nombre] = valor
+        elif isinstance(valor, dict):
+            planos.update(_aplanar(valor, f"{nombre}."))
+    return planos
+
+
+def comparar(ruta_base, ruta_nuevo):
+    """Imprime p50/p90 de cada métrica en ambos resultados y su razón nuevo/base."""
+    with open(ruta_base) as f:
+        base = _aplanar(json.load(f))
+    with open(ruta_nuevo) as f:
+        nuevo = _aplanar(json.load(f))
+
+    print(f"{'métrica':<45} {'p50 base':>10} {'p50 nuevo':>10} {'razón':>7}")
+    for nombre in sorted(set(base) & set(nuevo)):
+        b, n = base[nombre]["p50_ms"], nuevo[nombre]["p50_ms"]
+        razon = n / b if b else float("nan")
+        marca = "  <-- más lento" if razon > 1.2 else ""
+        print(f"{nombre:<45} {b:>10.2f} {n:>10.2f} {razon:>7.2f}{marca}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de carga, predicción y chat.")
+    parser.add_argument("--datos", default=RUTA_DATOS)
+    parser.add_argument("--escalas", type=int, nargs="+", default=[1, 10, 100],
+                        help="factores de escala del dataset sintético (1 = df_proc real)")
+    parser.add_argument("--pares", type=int, default=10,
+                        help="pares por nivel (giro / sector) para medir predicción")
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    parser.add_argument("--salida", default=None,
+                        help=f"JSON de resultados (por defecto {CARPETA_RESULTADOS}/<commit>.json)")
+    parser.add_argument("--comparar", nargs=2, metavar=("BASE", "NUEVO"),
+                        help="compara dos JSON de resultados en lugar de correr")
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+    else:
+        resultados = correr(args.datos, args.escalas, args.pares, args.repeticiones)
+        salida = args.salida or os.path.join(
+            CARPETA_RESULTADOS, f"{resultados['commit'] or 'sin_commit'}.json"
+        )
+        os.makedirs(os.path.dirname(salida) or ".", exist_ok=True)
+        with open(salida, "w") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"Resultados en {salida}")
@@ -0,0 +1,207 @@
+# ============================================
+# Búsqueda de hiperparámetros por sector (offline)
+# Para cada sector evalúa combinaciones de hiperparámetros con validación
+# temporal: en una muestra de sus segmentos (giro/sector + entidad) se
+# entrena con los años anteriores al último, con el mismo motor que la app
+# (capacidad según tamaño + parada temprana), y se mide el error absoluto
+# al predecir el último año. Las combinaciones se evalúan en paralelo (un
+# proceso por núcleo). Por sector se guarda la mejor solo si mejora a los
+# parámetros base; la app la lee de data_config/parametros_sector.json.
+#
+# Uso:
+#   python busqueda_parametros.py [--workers N] [--combinaciones 12] [--segmentos 40]
+# ============================================
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import numpy as np
+
+from almacen_features import AlmacenFeatures
+from datos import DatosCNSF, cargar_df_proc, ruta_fuente
+from modelo import RUTA_PARAMETROS_SECTOR, ajustar_modelo, features_segmento, parametros_segmento
+from registro_modelos import huella_archivo
+
+ESPACIO = dict(
+    learning_rate=[0.03, 0.05, 0.1, 0.2],
+    max_depth=[2, 3, 4, 5, 6],
+    min_child_weight=[1, 3, 5, 10],
+    subsample=[0.7, 0.8, 0.9, 1.0],
+    colsample_bytree=[0.6, 0.8, 0.9, 1.0],
+    reg_lambda=[1.0, 5.0, 10.0],
+)
+COMBINACIONES = 12
+SEGMENTOS_POR_SECTOR = 40
+MIN_FILAS_SEGMENTO = 6
+
+# Datos y almacén cargados una sola vez por proceso del pool
+_datos_worker = None
+_almacen_worker = None
+
+
+# ==========================
+# CANDIDATOS Y SEGMENTOS
+# ==========================
+
+def candidatos(n, semilla=0):
+    """Parámetros base ({}) + n combinaciones al azar del ESPACIO."""
+    rng = np.random.default_rng(semilla)
+    combinaciones = [{}]
+    while len(combinaciones) < n + 1:
+        combinacion = {k: valores[rng.integers(len(valores))] for k, valores in ESPACIO.items()}
+        combinacion = {k: v.item() if hasattr(v, "item") else v for k, v in combinacion.items()}
+        if combinacion not in combinaciones:
+            combinaciones.append(combinacion)
+    return combinaciones
+
+
+def segmentos_por_sector(datos, almacen, max_segmentos=SEGMENTOS_POR_SECTOR, semilla=0):
+    """
+    {sector: [(nivel, categoría, entidad)]} con una muestra de los
+    segmentos de giro y de sector que tienen filas suficientes y más de
+    un año (para poder validar con el último).
+    """
+    rng = np.random.default_rng(semilla)
+    df = datos.df.dropna(subset=["giro", "sector", "entidad"])
+    claves = {}
+    for sector, grupo in df.groupby("sector", observed=True):
+        candidatas = (
+            [("giro", g, e) for g, e in grupo[["giro", "entidad"]].drop_duplicates().itertuples(index=False)]
+            + [("sector", sector, e) for e in grupo["entidad"].unique()]
+        )
+        utiles = []
+        for nivel, categoria, entidad in candidatas:
+            segmento = almacen.segmento(nivel, categoria, entidad)
+            if segmento is None or segmento.valido.sum() < MIN_FILAS_SEGMENTO:
+                continue
+            if len(np.unique(segmento.años[segmento.valido])) < 2:
+                continue
+            utiles.append((nivel, str(categoria), str(entidad)))
+        if utiles:
+            idx = rng.permutation(len(utiles))[:max_segmentos]
+            claves[str(sector)] = [utiles[i] for i in sorted(idx)]
+    return claves
+
+
+# ==========================
+# EVALUACIÓN (EN EL POOL)
+# ==========================
+
+def _inicializar_worker(ruta_datos):
+    global _datos_worker, _almacen_worker
+    _datos_worker = DatosCNSF(cargar_df_proc(ruta_datos))
+    _almacen_worker = AlmacenFeatures(_datos_worker.df)
+
+
+def evaluar(claves, ajustados, almacen=None):
+    """
+    Error absoluto medio al predecir el último año de cada segmento,
+    entrenando con los anteriores. Devuelve (mae, predicciones, árboles medios).
+    """
+    almacen = almacen or _almacen_worker
+    errores, arboles = [], []
+    for nivel, categoria, entidad in claves:
+        segmento = almacen.segmento(nivel, categoria, entidad)
+        años = segmento.años[segmento.valido]
+        X = features_segmento(segmento.lags[segmento.valido])
+        y = segmento.target[segmento.valido]
+        prueba = años == años.max()
+        if (~prueba).sum() < 3:
+            continue
+        params = parametros_segmento(int((~prueba).sum()), ajustados)
+        model = ajustar_modelo(X[~prueba], y[~prueba], años[~prueba], params, n_jobs=1)
+        errores.append(np.abs(model.predict(X[prueba]) - y[prueba]))
+        arboles.append(model.n_estimators)
+    if not errores:
+        return float("nan"), 0, 0.0
+    errores = np.concatenate(errores)
+    return float(errores.mean()), len(errores), float(np.mean(arboles))
+
+
+def _tarea(sector, indice, claves, ajustados):
+    t0 = time.perf_counter()
+    mae, n, arboles = evaluar(claves, ajustados)
+    return sector, indice, mae, n, arboles, time.perf_counter() - t0
+
+
+# ==========================
+# BÚSQUEDA COMPLETA
+# ==========================
+
+def buscar_parametros(ruta_datos=None, ruta_salida=RUTA_PARAMETROS_SECTOR, workers=None,
+                      n_combinaciones=COMBINACIONES, max_segmentos=SEGMENTOS_POR_SECTOR, semilla=0):
+    """
+    Evalúa n_combinaciones (+ la base) en cada sector en un pool de
+    procesos y escribe ruta_salida con la mejor combinación por sector.
+    """
+    ruta_datos = ruta_datos or ruta_fuente()
+    datos = DatosCNSF(cargar_df_proc(ruta_datos))
+    claves = segmentos_por_sector(datos, AlmacenFeatures(datos.df), max_segmentos, semilla)
+    combinaciones = candidatos(n_combinaciones, semilla)
+    print(f"{len(claves)} sectores x {len(combinaciones)} combinaciones")
+
+    resultados = {sector: {} for sector in claves}
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_inicializar_worker, initargs=(ruta_datos,)
+    ) as pool:
+        futuros = [
+            pool.submit(_tarea, sector, i, claves[sector], combinacion)
+            for sector in claves for i, combinacion in enumerate(combinaciones)
+        ]
+        for hechos, futuro in enumerate(as_completed(futuros), start=1):
+            sector, i, mae, n, arboles, segundos = futuro.result()
+            resultados[sector][i] = (mae, n, arboles, segundos)
+            print(f"  {hechos}/{len(futuros)} {sector} #{i}: MAE {mae:.4f} ({segundos:.1f} s)")
+
+    sectores = {}
+    for sector, por_combinacion in resultados.items():
+        mae_base = por_combinacion[0][0]
+        mejor = min(por_combinacion, key=lambda i: (np.nan_to_num(por_combinacion[i][0], nan=np.inf), i))
+        # Solo se guardan parámetros que mejoran a la base
+        if not por_combinacion[mejor][0] < mae_base:
+            mejor = 0
+        sectores[sector] = {
+            "parametros": combinaciones[mejor],
+            "mae": por_combinacion[mejor][0],
+            "mae_base": mae_base,
+            "predicciones": por_combinacion[mejor][1],
+            "arboles_medios": por_combinacion[mejor][2],
+            "segmentos": len(claves[sector]),
+        }
+
+    contenido = {
+        "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "huella_datos": huella_archivo(ruta_datos),
+        "metrica": "MAE de net_sin_index en el último año de cada segmento",
+        "sectores": sectores,
+    }
+    tmp = f"{ruta_salida}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(contenido, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, ruta_salida)
+
+    mejorados = sum(1 for r in sectores.values() if r["parametros"])
+    print(f"Parámetros guardados en {ruta_salida}: {mejorados}/{len(sectores)} sectores mejoran a la base")
+    return contenido
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Búsqueda de hiperparámetros por sector.")
+    parser.add_argument("--datos", default=None,
+                        help="parquet o dataset particionado (por defecto el que usa la app)")
+    parser.add_argument("--salida", default=RUTA_PARAMETROS_SECTOR)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--combinaciones", type=int, default=COMBINACIONES,
+                        help="combinaciones al azar por sector (además de la base)")
+    parser.add_argument("--segmentos", type=int, default=SEGMENTOS_POR_SECTOR,
+                        help="segmentos por sector usados para evaluar")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    buscar_parametros(
+        ruta_datos=args.datos, ruta_salida=args.salida, workers=args.workers,
+        n_combinaciones=args.combinaciones, max_segmentos=args.segmentos, semilla=args.semilla
+    )
@@ -0,0 +1,133 @@
+# ============================================
+# Caché de respuestas del asistente
+# Evita repetir llamadas pagadas al LLM cuando se hace la misma pregunta
+# sobre el mismo caso. La clave es (versión del prompt, contexto del caso,
+# pregunta normalizada).
+# - Nivel exacto: misma pregunta tras normalizar (acentos, mayúsculas,
+#   puntuación, espacios).
+# - Nivel por similitud (opcional): embedding local por n-gramas de
+#   caracteres con hashing; se reutiliza la respuesta si el coseno con una
+#   pregunta previa del mismo caso supera el umbral.
+# Con TTL, desalojo LRU y contadores de aciertos/fallos.
+# ============================================
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from metricas import contar
+
+
+def normalizar_pregunta(texto):
+    """minúsculas, sin acentos, sin puntuación y con espacios colapsados."""
+    texto = unicodedata.normalize("NFKD", str(texto).strip().lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r"[^\w\s]", " ", texto)
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+def huella_texto(texto):
+    """Hash corto de un texto (p. ej. la versión de final_prompt)."""
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:16]
+
+
+def embedding_local(texto_normalizado, dim=512, n=3):
+    """
+    Vector normalizado de n-gramas de caracteres (feature hashing).
+    Barato y sin dependencias; suficiente para detectar paráfrasis cercanas.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    texto = f" {texto_normalizado} "
+    for i in range(max(len(texto) - n + 1, 1)):
+        ngrama = texto[i:i + n].encode("utf-8")
+        vector[int.from_bytes(hashlib.blake2b(ngrama, digest_size=4).digest(), "little") % dim] += 1.0
+    norma = np.linalg.norm(vector)
+    return vector / norma if norma else vector
+
+
+class CacheRespuestas:
+    """
+    max_entradas: tamaño máximo (LRU).
+    ttl: segundos de vida de cada respuesta.
+    umbral_similitud: None desactiva el nivel por similitud; p. ej. 0.9 lo activa.
+    """
+
+    def __init__(self, max_entradas=1024, ttl=24 * 3600, umbral_similitud=None):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.umbral_similitud = umbral_similitud
+        self._entradas = OrderedDict()   # clave -> (respuesta, expira, embedding)
+        self._lock = threading.Lock()
+        self.aciertos_exactos = 0
+        self.aciertos_similares = 0
+        self.fallos = 0
+
+    @staticmethod
+    def _clave(huella_prompt, contexto, pregunta):
+        return (huella_prompt, tuple(contexto), normalizar_pregunta(pregunta))
+
+    def _vigente(self, clave, ahora):
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            return None
+        if entrada[1] < ahora:
+            del self._entradas[clave]
+            return None
+        return entrada
+
+    def obtener(self, huella_prompt, contexto, pregunta):
+        """Respuesta en caché para la pregunta en ese contexto, o None."""
+        clave = self._clave(huella_prompt, contexto, pregunta)
+        ahora = time.time()
+
+        with self._lock:
+            entrada = self._vigente(clave, ahora)
+            if entrada is not None:
+                self._entradas.move_to_end(clave)
+                self.aciertos_exactos += 1
+                contar("cache_chat_total", resultado="exacto")
+                return entrada[0]
+
+            if self.umbral_similitud is not None:
+                consulta = embedding_local(clave[2])
+                mejor, mejor_sim = None, self.umbral_similitud
+                for otra in list(self._entradas):
+                    if otra[:2] != clave[:2]:
+                        continue
+                    candidata = self._vigente(otra, ahora)
+                    if candidata is None:
+                        continue
+                    sim = float(consulta @ candidata[2])
+                    if sim >= mejor_sim:
+                        mejor, mejor_sim = otra, sim
+                if mejor is not None:
+                    self._entradas.move_to_end(mejor)
+                    self.aciertos_similares += 1
+                    contar("cache_chat_total", resultado="similar")
+                    return self._entradas[mejor][0]
+
+            self.fallos += 1
+            contar("cache_chat_total", resultado="fallo")
+            return None
+
+    def guardar(self, huella_prompt, contexto, pregunta, respuesta):
+        clave = self._clave(huella_prompt, contexto, pregunta)
+        embedding = embedding_local(clave[2]) if self.umbral_similitud is not None else None
+        with self._lock:
+            self._entradas[clave] = (respuesta, time.time() + self.ttl, embedding)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "entradas": len(self._entradas),
+                "aciertos_exactos": self.aciertos_exactos,
+                "aciertos_similares": self.aciertos_similares,
+                "fallos": self.fallos,
+            }
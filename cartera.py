@@ -0,0 +1,254 @@
+# ============================================
+# Evaluación de cartera (scoring masivo)
+# Recibe un CSV/parquet con filas (entidad, giro[, sector]) y devuelve, para
+# cada fila, el histórico y el pronóstico de net_sin_index.
+# - Entidades y giros se emparejan con el catálogo sin importar mayúsculas
+#   ni acentos (mismo criterio que ingesta.py).
+# - Las filas se reducen a pares únicos (giro, entidad) antes de calcular.
+# - Los pares de la tabla precalculada salen de ahí; el resto se calcula en
+#   un pool de procesos por lotes (los workers usan el registro de modelos
+#   en disco, así que una segunda corrida no reentrena). Los workers se
+#   crean con spawn, no fork: la app corre en un proceso con varios hilos.
+# - Los pares sin datos suficientes quedan reportados en la columna error
+#   sin detener el lote.
+#
+# Uso:
+#   python cartera.py cartera.csv [--salida cartera_pronosticos.parquet] [--workers 4]
+# ============================================
+import argparse
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from datos import MAPEO_MANUAL_ENTIDAD, construir_catalogo, normalizar_texto
+from metricas import contar, tramo
+from precomputo import _inicializar_worker, _procesar_lote, filas_pronostico
+
+COLUMNAS_REQUERIDAS = ["entidad", "giro"]
+
+# Con menos pares pendientes no compensa levantar el pool (cada worker
+# carga los datos completos)
+MIN_PARES_POOL = 20
+TAMANO_LOTE_CARTERA = 10
+
+
+# ==========================
+# LECTURA Y EMPAREJAMIENTO
+# ==========================
+
+def leer_cartera(archivo, nombre=None):
+    """
+    Lee la cartera de una ruta o de un archivo abierto (p. ej. el de
+    st.file_uploader). El formato se toma de la extensión de nombre.
+    Devuelve un DataFrame con columnas entidad, giro y sector (opcional).
+    """
+    nombre = nombre or getattr(archivo, "name", archivo)
+    extension = os.path.splitext(str(nombre))[1].lower()
+    if extension == ".csv":
+        df = pd.read_csv(archivo, dtype=str, encoding="utf-8-sig")
+    elif extension in (".parquet", ".pq"):
+        df = pd.read_parquet(archivo)
+    else:
+        raise ValueError(f"Formato no soportado: {extension or nombre} (se espera .csv o .parquet)")
+
+    df.columns = [normalizar_texto(str(c)).replace(" ", "_") for c in df.columns]
+    faltantes = [c for c in COLUMNAS_REQUERIDAS if c not in df.columns]
+    if faltantes:
+        raise ValueError(f"Faltan columnas en la cartera: {', '.join(faltantes)}")
+    if "sector" not in df.columns:
+        df["sector"] = None
+    return df[["entidad", "sector", "giro"]].reset_index(drop=True)
+
+
+def emparejar_catalogo(cartera, datos):
+    """
+    Cambia entidad, giro y sector por sus nombres en el catálogo de la app.
+    Agrega fila (posición en el archivo), error (entidad o giro que no
+    existen) y observacion (sector del archivo distinto al del giro).
+    """
+    entidades = construir_catalogo(existentes=datos.entidades)
+    giros = construir_catalogo(existentes=list(datos.sector_por_giro))
+
+    filas = []
+    for fila, (entidad, sector, giro) in enumerate(cartera[["entidad", "sector", "giro"]].itertuples(index=False)):
+        entidad_cat = None
+        if pd.notna(entidad):
+            entidad = str(entidad).strip()
+            entidad_cat = entidades.get(normalizar_texto(MAPEO_MANUAL_ENTIDAD.get(entidad.upper(), entidad)))
+        giro_cat = giros.get(normalizar_texto(giro)) if pd.notna(giro) else None
+
+        error = None
+        if entidad_cat is None:
+            error = f"Entidad no encontrada en el catálogo: {entidad}"
+        elif giro_cat is None:
+            error = f"Giro no encontrado en el catálogo: {giro}"
+
+        sector_cat = datos.sector_de_giro(giro_cat) if giro_cat is not None else None
+        observacion = None
+        if pd.notna(sector) and sector_cat is not None and normalizar_texto(sector) != normalizar_texto(sector_cat):
+            observacion = f"El sector del archivo ({sector}) no coincide con el del giro; se usa {sector_cat}"
+
+        filas.append({
+            "fila": fila,
+            "entidad": entidad_cat or entidad,
+            "sector": sector_cat or (sector if pd.notna(sector) else None),
+            "giro": giro_cat or giro,
+            "error": error,
+            "observacion": observacion,
+        })
+    return pd.DataFrame(filas)
+
+
+# ==========================
+# CÁLCULO POR PARES
+# ==========================
+
+def _resultados(filas, resultados):
+    """Agrega filas de filas_pronostico a {(giro, entidad): (preds, nivel, error)}."""
+    for fila in filas:
+        par = (fila["giro"], fila["entidad"])
+        if fila["error"] is not None:
+            resultados[par] = (None, None, fila["error"])
+            continue
+        preds, nivel, _ = resultados.get(par) or ({}, fila["nivel"], None)
+        preds[int(fila["año"])] = fila["prediccion"]
+        resultados[par] = (preds, nivel, None)
+
+
+def puntuar_pares(pares, motor, workers=None, tamano_lote=TAMANO_LOTE_CARTERA, al_avanzar=None):
+    """
+    Pronóstico (motor segmentado, horizonte por defecto) de pares únicos.
+    al_avanzar(hechos, total) se llama al completar cada lote.
+    Devuelve {(giro, entidad): (dict{año: predicción} | None, nivel | None, error | None)}.
+    """
+    total = len(pares)
+    resultados = {}
+    pendientes = []
+    for par in pares:
+        try:
+            encontrado = motor.tabla_pronosticos.buscar(*par) if motor.tabla_pronosticos is not None else None
+        except ValueError as e:
+            # El par falló al precalcular: se reporta el mismo motivo
+            resultados[par] = (None, None, str(e))
+            continue
+        if encontrado is None:
+            pendientes.append(par)
+        else:
+            resultados[par] = (*encontrado, None)
+    contar("cartera_pares_total", total - len(pendientes), origen="tabla")
+    contar("cartera_pares_total", len(pendientes), origen="calculado")
+
+    if al_avanzar is not None:
+        al_avanzar(total - len(pendientes), total)
+    lotes = [pendientes[i:i + tamano_lote] for i in range(0, len(pendientes), tamano_lote)]
+    hechos = total - len(pendientes)
+
+    if len(pendientes) < MIN_PARES_POOL or workers == 1:
+        # En el proceso, con el registro del motor (memoria + disco)
+        for lote in lotes:
+            _resultados(filas_pronostico(
+                lote, motor.datos, motor.almacen, registro=motor.registro,
+                huella_datos=motor.huella_datos, n_jobs=None
+            ), resultados)
+            hechos += len(lote)
+            if al_avanzar is not None:
+                al_avanzar(hechos, total)
+        return resultados
+
+    # fork desde el proceso multihilo de Streamlit puede heredar locks tomados
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_inicializar_worker,
+        initargs=(motor.ruta, motor.huella_datos)
+    ) as pool:
+        futuros = {pool.submit(_procesar_lote, lote): len(lote) for lote in lotes}
+        for futuro in as_completed(futuros):
+            _resultados(futuro.result(), resultados)
+            hechos += futuros[futuro]
+            if al_avanzar is not None:
+                al_avanzar(hechos, total)
+    return resultados
+
+
+# ==========================
+# EVALUACIÓN COMPLETA
+# ==========================
+
+@tramo("cartera")
+def evaluar_cartera(cartera, motor, workers=None, al_avanzar=None):
+    """
+    Histórico + pronóstico por fila de la cartera (formato largo: una fila
+    por año). Las filas con error (catálogo o datos insuficientes) quedan
+    con una sola fila, sin año, y el motivo en la columna error.
+    """
+    base = emparejar_catalogo(cartera, motor.datos)
+    validas = base[base["error"].isna()]
+    pares = list(dict.fromkeys(zip(validas["giro"], validas["entidad"])))
+    resultados = puntuar_pares(pares, motor, workers=workers, al_avanzar=al_avanzar)
+
+    tablas = []
+    for (giro, entidad), (preds, nivel, error) in resultados.items():
+        if error is not None:
+            tablas.append(pd.DataFrame([{"giro": giro, "entidad": entidad, "error_par": error}]))
+            continue
+        tablas.append(
+            motor.tabla_hist_y_pred(giro, entidad, preds)
+            .assign(giro=giro, entidad=entidad, nivel=nivel)
+        )
+    por_par = pd.concat(tablas, ignore_index=True) if tablas else pd.DataFrame(columns=["giro", "entidad"])
+    for col in ["Año", "Índice siniestralidad neta", "Fuente", "nivel", "error_par"]:
+        if col not in por_par.columns:
+            por_par[col] = None
+
+    resultado = base.merge(por_par, on=["giro", "entidad"], how="left")
+    resultado["error"] = resultado["error"].fillna(resultado.pop("error_par"))
+    resultado["Año"] = resultado["Año"].astype("Int64")
+    return resultado[[
+        "fila", "entidad", "sector", "giro", "Año", "Índice siniestralidad neta",
+        "Fuente", "nivel", "error", "observacion"
+    ]].sort_values(["fila", "Año"], kind="stable").reset_index(drop=True)
+
+
+def errores_cartera(resultado):
+    """Pares (entidad, giro) sin pronóstico y su motivo, con el número de filas afectadas."""
+    errores = resultado[resultado["error"].notna()]
+    return (
+        errores.groupby(["entidad", "giro", "error"], dropna=False)["fila"].nunique()
+        .rename("filas").reset_index()
+    )
+
+
+def a_parquet(resultado):
+    """Bytes del resultado en parquet (zstd), para descargar."""
+    buffer = io.BytesIO()
+    df = resultado.copy()
+    for col in ["entidad", "sector", "giro", "Fuente", "nivel"]:
+        df[col] = df[col].astype("category")
+    df.to_parquet(buffer, index=False, compression="zstd")
+    return buffer.getvalue()
+
+
+if __name__ == "__main__":
+    from motor import MotorPrediccion
+
+    parser = argparse.ArgumentParser(description="Histórico + pronóstico para una cartera de riesgos.")
+    parser.add_argument("cartera", help="CSV o parquet con columnas entidad, giro y (opcional) sector")
+    parser.add_argument("--salida", default="cartera_pronosticos.parquet")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--datos", default=None,
+                        help="parquet o dataset particionado (por defecto el que usa la app)")
+    args = parser.parse_args()
+
+    resultado = evaluar_cartera(
+        leer_cartera(args.cartera), MotorPrediccion(args.datos), workers=args.workers,
+        al_avanzar=lambda hechos, total: print(f"  {hechos}/{total} segmentos", end="\r")
+    )
+    with open(args.salida, "wb") as f:
+        f.write(a_parquet(resultado))
+    errores = errores_cartera(resultado)
+    print(f"\n{resultado['fila'].nunique()} filas evaluadas; {len(errores)} segmentos sin pronóstico")
+    print(f"Resultado guardado en {args.salida}")
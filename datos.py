@@ -0,0 +1,324 @@
+# ============================================
+# Capa de acceso a datos (df_proc)
+# Carga el parquet una vez, convierte giro/sector/entidad a categóricas y
+# precalcula índices de grupo para consultas O(1) desde la app y el modelo.
+#
+# También permite reescribir df_proc como dataset parquet particionado
+# (hive, por sector) para leer solo los row groups y columnas necesarios,
+# y guarda el catálogo de los dropdowns (catalogo.json) para el arranque.
+# El dataset no se versiona (solo df_proc.parquet); se genera con:
+#   python datos.py [--origen data_config/df_proc.parquet] [--destino data_config/df_proc_dataset]
+# ============================================
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import unicodedata
+from collections import Counter, defaultdict
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from registro_modelos import huella_archivo
+
+RUTA_DATOS = "data_config/df_proc.parquet"
+RUTA_DATASET = "data_config/df_proc_dataset"
+RUTA_CATALOGO = "data_config/catalogo.json"
+CATEGORICAS = ["giro", "sector", "entidad"]
+
+# Columnas suficientes para dropdowns, catálogos y tabla histórica
+COLUMNAS_CATALOGO = CATEGORICAS + ["año", "net_sin_index"]
+FILAS_POR_GRUPO = 1024
+
+
+# ==========================
+# DATASET PARTICIONADO
+# ==========================
+
+def particionar_dataset(ruta_origen=RUTA_DATOS, ruta_destino=RUTA_DATASET,
+                        filas_por_grupo=FILAS_POR_GRUPO):
+    """
+    Reescribe df_proc como dataset hive particionado por sector. Dentro de cada
+    partición las filas se ordenan por (entidad, giro, año) y se escriben en
+    row groups pequeños, así un filtro por entidad/giro descarta row groups
+    por estadísticas.
+
+    Se escribe en un directorio temporal junto al destino y luego se cambia
+    por el anterior: no quedan particiones sector= de sectores que ya no
+    existen ni archivos a medio escribir si la escritura falla.
+    """
+    tabla = pq.read_table(ruta_origen).sort_by(
+        [("sector", "ascending"), ("entidad", "ascending"),
+         ("giro", "ascending"), ("año", "ascending")]
+    )
+    ruta_destino = os.path.abspath(ruta_destino)
+    padre = os.path.dirname(ruta_destino)
+    os.makedirs(padre, exist_ok=True)
+    temporal = tempfile.mkdtemp(prefix=".df_proc_dataset-", dir=padre)
+    try:
+        ds.write_dataset(
+            tabla,
+            temporal,
+            format="parquet",
+            partitioning=ds.partitioning(pa.schema([("sector", pa.string())]), flavor="hive"),
+            max_rows_per_group=filas_por_grupo,
+            min_rows_per_group=min(filas_por_grupo, 256),
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        _reemplazar_directorio(temporal, ruta_destino)
+    except BaseException:
+        shutil.rmtree(temporal, ignore_errors=True)
+        raise
+
+
+def _reemplazar_directorio(nuevo, destino):
+    # os.replace no sustituye un directorio no vacío: primero se aparta el
+    # anterior y se borra cuando el nuevo ya está en su lugar
+    anterior = None
+    if os.path.exists(destino):
+        anterior = tempfile.mkdtemp(prefix=".df_proc_dataset-anterior-", dir=os.path.dirname(destino))
+        os.replace(destino, os.path.join(anterior, "dataset"))
+    os.replace(nuevo, destino)
+    if anterior is not None:
+        shutil.rmtree(anterior, ignore_errors=True)
+
+
+def abrir_dataset(ruta=RUTA_DATASET):
+    """Dataset pyarrow (sin leer datos) con lectura memory-mapped."""
+    return ds.dataset(
+        ruta,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("sector", pa.string())]), flavor="hive"),
+        filesystem=pafs.LocalFileSystem(use_mmap=True),
+    )
+
+
+def leer_dataset(dataset, columnas=None, filtro=None):
+    """
+    Lee del dataset solo las columnas y filas pedidas (proyección y filtro
+    se empujan a pyarrow). Devuelve pandas con categóricas.
+    """
+    df = dataset.to_table(columns=columnas, filter=filtro).to_pandas()
+    for col in CATEGORICAS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def mtime_ruta(ruta):
+    """Última modificación de un archivo o de cualquier archivo de un directorio."""
+    if not os.path.isdir(ruta):
+        return os.path.getmtime(ruta)
+    return max(
+        (os.path.getmtime(os.path.join(raiz, f)) for raiz, _, archivos in os.walk(ruta) for f in archivos),
+        default=os.path.getmtime(ruta)
+    )
+
+
+def ruta_fuente():
+    """Dataset particionado si existe; si no, el parquet único."""
+    return RUTA_DATASET if os.path.isdir(RUTA_DATASET) else RUTA_DATOS
+
+
+def cargar_df_proc(ruta=RUTA_DATOS, columnas=None):
+    """
+    Lee df_proc (parquet único o dataset particionado) con giro/sector/entidad
+    como categóricas. columnas limita la lectura a esas columnas.
+    """
+    if os.path.isdir(ruta):
+        return leer_dataset(abrir_dataset(ruta), columnas=columnas)
+    df = pd.read_parquet(ruta, columns=columnas)
+    for col in CATEGORICAS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+
+class DatosCNSF:
+    """
+    df_proc + índices precalculados:
+    - entidades, sectores: listas ordenadas para los dropdowns.
+    - giros_por_sector: {sector: [giros ordenados]}.
+    - sector_por_giro: {giro: sector más frecuente}.
+    - filas(cat_col, valor, entidad): filas de (giro|sector, entidad) sin
+      recorrer la tabla completa.
+    """
+
+    def __init__(self, df_proc):
+        self.df = df_proc
+
+        self.entidades = sorted(df_proc["entidad"].dropna().unique())
+        self.sectores = sorted(df_proc["sector"].dropna().unique())
+
+        con_sector = df_proc.dropna(subset=["giro", "sector"])
+        self.giros_por_sector = {
+            sector: sorted(grupo.unique())
+            for sector, grupo in con_sector.groupby("sector", observed=True)["giro"]
+        }
+        self.sector_por_giro = (
+            con_sector.groupby("giro", observed=True)["sector"]
+            .agg(lambda s: s.mode().iloc[0])
+            .to_dict()
+        )
+
+        # (valor, entidad) -> posiciones de fila, por nivel
+        self._indices = {
+            cat_col: df_proc.groupby([cat_col, "entidad"], observed=True, sort=False).indices
+            for cat_col in ("giro", "sector")
+        }
+
+    def filas(self, cat_col, valor, entidad):
+        """Filas de df_proc para (valor de cat_col, entidad); vacío si no hay."""
+        posiciones = self._indices[cat_col].get((valor, entidad))
+        if posiciones is None:
+            return self.df.iloc[0:0]
+        return self.df.iloc[posiciones]
+
+    def sector_de_giro(self, giro):
+        """Sector más frecuente del giro o None si no tiene sector."""
+        return self.sector_por_giro.get(giro)
+
+
+# ==========================
+# NOMBRES DE ENTIDADES Y GIROS
+# ==========================
+# Los usan la ingesta (unificar variantes entre libros) y la evaluación de
+# cartera (emparejar archivos con el catálogo); viven aquí para que la
+# cartera no importe la cadena de ingesta y actualización de modelos.
+
+# Entidades que el catálogo no unifica por sí solo
+MAPEO_MANUAL_ENTIDAD = {
+    "MEXICO": "Estado de México",
+    "DISTRITO FEDERAL": "Ciudad de México",
+    "NUEVO LEON": "Nuevo Leon",
+    "EN EL EXTRANJERO": "Extranjero",
+}
+
+
+def normalizar_texto(s):
+    """minúsculas y sin acentos (NaN se conserva)."""
+    if pd.isna(s):
+        return s
+    s = str(s).strip().lower()
+    return "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
+
+
+def construir_catalogo(*series, existentes=()):
+    """
+    {texto normalizado: nombre canónico}. El canónico es la variante más
+    frecuente (la más corta en empate); si una variante ya está en el
+    parquet (existentes) se conserva esa, para que los años agregados no
+    renombren los ya cargados.
+    """
+    originales_por_norm = defaultdict(Counter)
+    for serie in series:
+        for valor in serie.dropna():
+            originales_por_norm[normalizar_texto(valor)][valor] += 1
+
+    catalogo = {normalizar_texto(v): v for v in existentes}
+    for norm, conteo in originales_por_norm.items():
+        if norm in catalogo:
+            continue
+        mas_comunes = conteo.most_common()
+        candidatos = [s for s, c in mas_comunes if c == mas_comunes[0][1]]
+        catalogo[norm] = min(candidatos, key=len)
+    return catalogo
+
+
+# ==========================
+# CATÁLOGO (ARRANQUE RÁPIDO)
+# ==========================
+
+class CatalogoCNSF:
+    """
+    Solo las listas de los dropdowns (mismos atributos que DatosCNSF), sin
+    df_proc. Se guarda como JSON para que la app pinte la primera página
+    sin leer el parquet.
+    """
+
+    def __init__(self, entidades, sectores, giros_por_sector, sector_por_giro):
+        self.entidades = entidades
+        self.sectores = sectores
+        self.giros_por_sector = giros_por_sector
+        self.sector_por_giro = sector_por_giro
+
+    @classmethod
+    def de_datos(cls, datos):
+        return cls(
+            [str(e) for e in datos.entidades],
+            [str(s) for s in datos.sectores],
+            {str(s): [str(g) for g in giros] for s, giros in datos.giros_por_sector.items()},
+            {str(g): str(s) for g, s in datos.sector_por_giro.items()},
+        )
+
+    def sector_de_giro(self, giro):
+        return self.sector_por_giro.get(giro)
+
+
+def guardar_catalogo(catalogo, ruta_datos, ruta=RUTA_CATALOGO, equivalentes=()):
+    """
+    Escribe el catálogo con la huella de los datos de los que salió
+    (escritura atómica). equivalentes: otras rutas con los mismos datos
+    (p. ej. df_proc.parquet del que se generó el dataset particionado), para
+    que el catálogo siga vigente en un clon sin el dataset.
+    """
+    huellas = list(dict.fromkeys(
+        huella_archivo(r) for r in [ruta_datos, *equivalentes] if os.path.exists(r)
+    ))
+    contenido = dict(vars(catalogo), huellas_datos=huellas)
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(contenido, f, ensure_ascii=False)
+    os.replace(tmp, ruta)
+
+
+def cargar_catalogo(ruta_datos, ruta=RUTA_CATALOGO):
+    """
+    Catálogo guardado, o None si no existe o si los datos cambiaron desde
+    que se guardó (la huella es por contenido: sobrevive a copias y clones).
+    """
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            contenido = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if huella_archivo(ruta_datos) not in contenido.get("huellas_datos", []):
+        return None
+    return CatalogoCNSF(
+        contenido["entidades"], contenido["sectores"],
+        contenido["giros_por_sector"], contenido["sector_por_giro"]
+    )
+
+
+def catalogo_o_construir(ruta_datos, ruta=RUTA_CATALOGO, equivalentes=()):
+    """
+    Catálogo guardado si está vigente; si no, lo calcula de df_proc y lo
+    guarda (ver guardar_catalogo para equivalentes).
+    """
+    catalogo = cargar_catalogo(ruta_datos, ruta)
+    if catalogo is None:
+        catalogo = CatalogoCNSF.de_datos(DatosCNSF(cargar_df_proc(ruta_datos, columnas=CATEGORICAS)))
+        try:
+            guardar_catalogo(catalogo, ruta_datos, ruta, equivalentes)
+        except OSError:
+            pass  # solo es una caché del arranque
+    return catalogo
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reescribe df_proc como dataset particionado.")
+    parser.add_argument("--origen", default=RUTA_DATOS)
+    parser.add_argument("--destino", default=RUTA_DATASET)
+    parser.add_argument("--filas-por-grupo", type=int, default=FILAS_POR_GRUPO)
+    args = parser.parse_args()
+
+    particionar_dataset(args.origen, args.destino, args.filas_por_grupo)
+    print(f"Dataset particionado escrito en {args.destino}")
+
+    catalogo = CatalogoCNSF.de_datos(DatosCNSF(cargar_df_proc(args.destino, columnas=CATEGORICAS)))
+    guardar_catalogo(catalogo, args.destino, equivalentes=[args.origen])
+    print(f"Catálogo escrito en {RUTA_CATALOGO}")
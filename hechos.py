@@ -0,0 +1,259 @@
+# ============================================
+# Índice local de hechos por segmento (contexto del asistente)
+# Precalcula, para cada (giro, entidad) y (sector, entidad) de df_proc, un
+# resumen corto en texto: índice de siniestralidad neta por año, número de
+# siniestros, primas y, si existe la tabla precalculada, el pronóstico.
+# El chat inyecta el resumen del caso en el prompt para que las respuestas
+# citen cifras reales en una sola llamada al LLM (sin herramientas ni
+# llamadas extra).
+#
+# Formato en disco (data_config/hechos.*):
+# - hechos.bin: los resúmenes en UTF-8, uno tras otro; se abre con mmap.
+# - hechos.json: {clave: [inicio, longitud]} + la huella de los datos.
+# Consultar un segmento es un lookup en el dict y una rebanada del mmap.
+#
+# Uso:
+#   python hechos.py [--datos ruta] [--salida data_config/hechos]
+# ============================================
+import argparse
+import json
+import mmap
+import os
+
+import numpy as np
+
+from datos import cargar_df_proc, ruta_fuente
+from metricas import contar
+from precomputo import RUTA_PRONOSTICOS, TablaPronosticos
+from registro_modelos import huella_archivo
+
+RUTA_HECHOS = "data_config/hechos"
+COLUMNAS_HECHOS = [
+    "giro", "sector", "entidad", "año", "net_sin_index", "siniestro_neto",
+    "prima_emitida_neta", "prima_devengada", "n_mero_de_siniestros"
+]
+AÑOS_DETALLE = 6      # años recientes que se listan uno por uno
+SEPARADOR = "\x1f"
+
+ENCABEZADO_HECHOS = (
+    "DATOS HISTÓRICOS CNSF DEL CASO (úsalos como fuente de cifras; "
+    "no inventes cifras que no estén aquí):"
+)
+
+
+def clave_hechos(nivel, categoria, entidad):
+    return f"{nivel}{SEPARADOR}{categoria}{SEPARADOR}{entidad}"
+
+
+# ==========================
+# FORMATO DE LOS RESÚMENES
+# ==========================
+
+def _indice(valor):
+    return "s/d" if valor is None or not np.isfinite(valor) else f"{valor:.3f}"
+
+
+def _monto(valor):
+    if not np.isfinite(valor):
+        return "s/d"
+    for divisor, sufijo in ((1e9, " mil M"), (1e6, " M"), (1e3, " mil")):
+        if abs(valor) >= divisor:
+            return f"${valor / divisor:,.1f}{sufijo}"
+    return f"${valor:,.0f}"
+
+
+def texto_pronostico(preds, nivel):
+    """Línea con el pronóstico {año: valor} y el nivel del modelo que lo generó."""
+    valores = " · ".join(f"{año} {_indice(v)}" for año, v in sorted(preds.items()))
+    return f"- Pronóstico del índice (modelo nivel {nivel}): {valores}"
+
+
+def resumir_segmento(nivel, categoria, entidad, años, indice, siniestros, prima_emitida,
+                     prima_devengada, pronostico=None):
+    """
+    Resumen de un segmento. Los arreglos van ordenados por año; indice es
+    el índice de siniestralidad neta de cada año.
+    """
+    recientes = slice(-AÑOS_DETALLE, None)
+    validos = indice[np.isfinite(indice)]
+    total_devengada = np.nansum(prima_devengada)
+    lineas = [
+        f"[{nivel} «{categoria}» en {entidad}, {años[0]}–{años[-1]}, "
+        f"{len(años)} año{'s' if len(años) != 1 else ''} con datos]",
+        "- Índice de siniestralidad neta: "
+        + (f"promedio {_indice(validos.mean())}, mediana {_indice(np.median(validos))}; " if len(validos) else "")
+        + "por año: " + " · ".join(f"{a} {_indice(v)}" for a, v in zip(años[recientes], indice[recientes])),
+        f"- Siniestros: {np.nansum(siniestros):,.0f} en total; por año: "
+        + " · ".join(f"{a} {n:,.0f}" for a, n in zip(años[recientes], np.nan_to_num(siniestros[recientes]))),
+        f"- Prima devengada: {_monto(total_devengada)} en total, {_monto(prima_devengada[-1])} en {años[-1]}; "
+        f"prima emitida neta {años[-1]}: {_monto(prima_emitida[-1])}",
+    ]
+    if pronostico is not None:
+        lineas.append(texto_pronostico(*pronostico))
+    return "\n".join(lineas)
+
+
+def resumenes(df, tabla_pronosticos=None):
+    """
+    Genera (clave, texto) para todos los segmentos (giro, entidad) y
+    (sector, entidad) de df. En giro el índice por año es el de df_proc; en
+    sector es siniestro neto / prima devengada de todos sus giros.
+    """
+    for nivel in ("giro", "sector"):
+        anual = (
+            df.groupby([nivel, "entidad", "año"], observed=True)
+            .agg(
+                net_sin_index=("net_sin_index", "first"),
+                siniestro_neto=("siniestro_neto", "sum"),
+                prima_emitida_neta=("prima_emitida_neta", "sum"),
+                prima_devengada=("prima_devengada", "sum"),
+                n_mero_de_siniestros=("n_mero_de_siniestros", "sum"),
+            )
+            .reset_index()
+            .sort_values([nivel, "entidad", "año"], kind="stable")
+        )
+        if nivel == "sector":
+            prima = anual["prima_devengada"].to_numpy()
+            with np.errstate(divide="ignore", invalid="ignore"):
+                anual["net_sin_index"] = np.where(prima > 0, anual["siniestro_neto"].to_numpy() / prima, np.nan)
+
+        columnas = {c: anual[c].to_numpy() for c in anual.columns}
+        claves = list(zip(columnas[nivel], columnas["entidad"]))
+        inicios = np.flatnonzero([True] + [a != b for a, b in zip(claves[1:], claves[:-1])])
+        for inicio, fin in zip(inicios, list(inicios[1:]) + [len(claves)]):
+            categoria, entidad = claves[inicio]
+            pronostico = None
+            if nivel == "giro" and tabla_pronosticos is not None:
+                try:
+                    pronostico = tabla_pronosticos.buscar(categoria, entidad)
+                except ValueError:
+                    pass  # el par falló al precalcular: sin pronóstico
+            s = slice(inicio, fin)
+            yield clave_hechos(nivel, categoria, entidad), resumir_segmento(
+                nivel, categoria, entidad,
+                columnas["año"][s], columnas["net_sin_index"][s].astype(float),
+                columnas["n_mero_de_siniestros"][s].astype(float),
+                columnas["prima_emitida_neta"][s].astype(float),
+                columnas["prima_devengada"][s].astype(float),
+                pronostico,
+            )
+
+
+# ==========================
+# CONSTRUCCIÓN Y CARGA
+# ==========================
+
+def _huella_pronosticos(ruta_pronosticos):
+    return huella_archivo(ruta_pronosticos) if os.path.exists(ruta_pronosticos) else None
+
+
+def construir_hechos(ruta_datos=None, ruta=RUTA_HECHOS, ruta_pronosticos=RUTA_PRONOSTICOS):
+    """
+    Calcula los resúmenes de df_proc (+ pronósticos de la tabla
+    precalculada si está vigente) y escribe ruta.bin / ruta.json.
+    Devuelve el número de segmentos.
+    """
+    ruta_datos = ruta_datos or ruta_fuente()
+    huella_datos = huella_archivo(ruta_datos)
+    df = cargar_df_proc(ruta_datos, columnas=COLUMNAS_HECHOS)
+    tabla = TablaPronosticos.cargar(ruta_pronosticos, huella_datos=huella_datos)
+
+    claves, posicion = {}, 0
+    tmp_bin, tmp_json = f"{ruta}.bin.{os.getpid()}.tmp", f"{ruta}.json.{os.getpid()}.tmp"
+    with open(tmp_bin, "wb") as f:
+        for clave, texto in resumenes(df, tabla):
+            datos = texto.encode("utf-8")
+            f.write(datos)
+            claves[clave] = [posicion, len(datos)]
+            posicion += len(datos)
+    with open(tmp_json, "w", encoding="utf-8") as f:
+        json.dump({
+            "huella_datos": huella_datos,
+            "huella_pronosticos": _huella_pronosticos(ruta_pronosticos),
+            "claves": claves,
+        }, f, ensure_ascii=False)
+    os.replace(tmp_bin, f"{ruta}.bin")
+    os.replace(tmp_json, f"{ruta}.json")
+    return len(claves)
+
+
+class IndiceHechos:
+    """
+    Resúmenes por segmento: {clave: (inicio, longitud)} en memoria y los
+    textos en un mmap de solo lectura (el sistema operativo pagina lo que
+    se consulta).
+    """
+
+    def __init__(self, ruta=RUTA_HECHOS):
+        with open(f"{ruta}.json", encoding="utf-8") as f:
+            contenido = json.load(f)
+        self.huella_datos = contenido["huella_datos"]
+        self.huella_pronosticos = contenido["huella_pronosticos"]
+        self._claves = contenido["claves"]
+        with open(f"{ruta}.bin", "rb") as f:
+            # mmap no admite archivos vacíos
+            self._textos = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self._claves else b""
+
+    def __len__(self):
+        return len(self._claves)
+
+    @classmethod
+    def cargar(cls, ruta_datos, ruta=RUTA_HECHOS, ruta_pronosticos=RUTA_PRONOSTICOS):
+        """
+        Índice guardado, o None si no existe o si los datos o la tabla de
+        pronósticos cambiaron desde que se construyó.
+        """
+        try:
+            indice = cls(ruta)
+        except (OSError, ValueError, KeyError):
+            return None
+        if (indice.huella_datos != huella_archivo(ruta_datos)
+                or indice.huella_pronosticos != _huella_pronosticos(ruta_pronosticos)):
+            return None
+        return indice
+
+    def buscar(self, nivel, categoria, entidad):
+        """Resumen del segmento o None si no hay datos."""
+        posicion = self._claves.get(clave_hechos(nivel, categoria, entidad))
+        contar("hechos_consultas_total", resultado="encontrado" if posicion else "sin_datos", nivel=nivel)
+        if posicion is None:
+            return None
+        inicio, longitud = posicion
+        return self._textos[inicio:inicio + longitud].decode("utf-8")
+
+    def contexto(self, sector, giro, entidad, prediccion=None):
+        """
+        Bloque para el prompt con los hechos del giro y del sector en la
+        entidad. prediccion=(preds, nivel) agrega el pronóstico que el
+        usuario acaba de generar. Cadena vacía si no hay nada que agregar.
+        """
+        bloques = [
+            texto for texto in (self.buscar("giro", giro, entidad), self.buscar("sector", sector, entidad))
+            if texto is not None
+        ]
+        if prediccion is not None:
+            bloques.append("Pronóstico generado en esta sesión:\n" + texto_pronostico(*prediccion))
+        if not bloques:
+            return ""
+        return "\n".join([ENCABEZADO_HECHOS] + bloques)
+
+
+def hechos_o_construir(ruta_datos, ruta=RUTA_HECHOS, ruta_pronosticos=RUTA_PRONOSTICOS):
+    """Índice guardado si está vigente; si no, lo reconstruye y lo carga."""
+    indice = IndiceHechos.cargar(ruta_datos, ruta, ruta_pronosticos)
+    if indice is None:
+        construir_hechos(ruta_datos, ruta, ruta_pronosticos)
+        indice = IndiceHechos(ruta)
+    return indice
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Índice de hechos por segmento para el asistente.")
+    parser.add_argument("--datos", default=None,
+                        help="parquet o dataset particionado (por defecto el que usa la app)")
+    parser.add_argument("--salida", default=RUTA_HECHOS, help="prefijo de los archivos .bin y .json")
+    parser.add_argument("--pronosticos", default=RUTA_PRONOSTICOS)
+    args = parser.parse_args()
+
+    n = construir_hechos(args.datos, args.salida, args.pronosticos)
+    print(f"{n} segmentos escritos en {args.salida}.bin / {args.salida}.json")
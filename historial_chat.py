@@ -0,0 +1,101 @@
+# ============================================
+# Historial del chat con presupuesto de tokens
+# Arma los mensajes que se envían al LLM en cada turno:
+#   [prompt de sistema fijo] + [contexto del caso] + [resumen de turnos viejos]
+#   + [turnos recientes que caben en el presupuesto]
+# así el tamaño de cada llamada se mantiene acotado sin importar lo larga
+# que sea la conversación.
+# ============================================
+import re
+from functools import lru_cache
+
+from prompts import final_prompt
+
+PRESUPUESTO_TOKENS = 1500        # tokens para el historial (sin prefijo ni contexto)
+MAX_TOKENS_RESUMEN = 200         # tokens para el resumen de turnos descartados
+MAX_CARACTERES_PREGUNTA = 160    # recorte de cada pregunta dentro del resumen
+
+_PIEZAS = re.compile(r"\w+|[^\w\s]")
+
+
+@lru_cache(maxsize=4096)
+def contar_tokens(texto):
+    """
+    Conteo local aproximado de tokens (sin llamar a la API): cada palabra
+    cuenta ~1 token por cada 4 caracteres y cada signo cuenta 1.
+    """
+    return sum(
+        max(1, -(-len(pieza) // 4)) if pieza[0].isalnum() or pieza[0] == "_" else 1
+        for pieza in _PIEZAS.findall(texto)
+    )
+
+
+# Prefijo estático (rol, seguridad, objetivo, estilo...): se arma una sola vez
+MENSAJE_SISTEMA = {"role": "system", "content": final_prompt}
+TOKENS_SISTEMA = contar_tokens(final_prompt)
+
+
+def _tokens_mensaje(mensaje):
+    # ~4 tokens de overhead por mensaje en el formato de chat
+    return contar_tokens(mensaje["content"]) + 4
+
+
+def _resumir(descartados, max_tokens=MAX_TOKENS_RESUMEN):
+    """
+    Resumen local (sin LLM) de los turnos que ya no caben: las preguntas
+    previas del usuario, de la más reciente a la más antigua, hasta llenar
+    max_tokens.
+    """
+    preguntas = [m["content"] for m in descartados if m["role"] == "user"]
+    if not preguntas:
+        return None
+
+    encabezado = "RESUMEN DE LA CONVERSACIÓN PREVIA (preguntas anteriores del suscriptor):"
+    lineas, usados = [], contar_tokens(encabezado)
+    for pregunta in reversed(preguntas):
+        pregunta = " ".join(pregunta.split())
+        if len(pregunta) > MAX_CARACTERES_PREGUNTA:
+            pregunta = pregunta[:MAX_CARACTERES_PREGUNTA].rstrip() + "…"
+        linea = f"- {pregunta}"
+        costo = contar_tokens(linea)
+        if usados + costo > max_tokens:
+            break
+        lineas.append(linea)
+        usados += costo
+
+    if not lineas:
+        return None
+    return {"role": "system", "content": "\n".join([encabezado] + lineas[::-1])}
+
+
+def construir_mensajes(contexto_dinamico, historial, presupuesto=PRESUPUESTO_TOKENS):
+    """
+    Devuelve la lista de mensajes para el LLM. Conserva los turnos más
+    recientes que caben en el presupuesto (el último mensaje siempre va) y
+    condensa los anteriores en un resumen.
+    """
+    recientes, usados = [], 0
+    for mensaje in reversed(historial):
+        costo = _tokens_mensaje(mensaje)
+        if recientes and usados + costo > presupuesto:
+            break
+        recientes.append(mensaje)
+        usados += costo
+    recientes.reverse()
+
+    mensajes = [MENSAJE_SISTEMA, {"role": "system", "content": contexto_dinamico}]
+
+    descartados = historial[:len(historial) - len(recientes)]
+    resumen = _resumir(descartados) if descartados else None
+    if resumen is not None:
+        mensajes.append(resumen)
+
+    return mensajes + recientes
+
+
+def tokens_mensajes(mensajes):
+    """Tamaño aproximado (tokens) de una lista de mensajes."""
+    return sum(
+        TOKENS_SISTEMA + 4 if m is MENSAJE_SISTEMA else _tokens_mensaje(m)
+        for m in mensajes
+    )
@@ -0,0 +1,444 @@
+# ============================================
+# Ingesta de los libros de la CNSF (ramo Incendio) -> df_proc.parquet
+# Reemplaza las celdas de descarga y limpieza de notebooks/UW_360_V2.ipynb:
+#   1. (opcional) descarga los .xlsx publicados por la CNSF
+#   2. lee las hojas Emisión, Suma Asegurada y Siniestros de cada libro
+#      (una sola apertura por libro, libros en paralelo con un pool de procesos)
+#   3. unifica catálogos de giros y entidades, asigna sector y agrega
+#   4. calcula indicadores (cuota al millar, siniestralidad) y agrega los
+#      años nuevos al parquet existente
+#
+# Cada libro se procesa una sola vez: su lectura limpia se guarda en caché
+# por hash de contenido, y el parquet registra qué libros (y con qué hash)
+# ya están incorporados. Solo se recalculan los años nuevos o modificados.
+#
+# Uso:
+#   python ingesta.py [--carpeta data_cnsf] [--descargar] [--workers N] [--reconstruir]
+#                     [--actualizar-modelos]
+# Sin --descargar trabaja sin red sobre los libros que haya en --carpeta.
+# ============================================
+import argparse
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from actualizacion import actualizar_incremental
+from datos import (
+    MAPEO_MANUAL_ENTIDAD, RUTA_DATASET, RUTA_DATOS, catalogo_o_construir, construir_catalogo,
+    normalizar_texto, particionar_dataset, ruta_fuente
+)
+from hechos import hechos_o_construir
+from registro_modelos import huella_archivo
+
+URL_CNSF = (
+    "https://www.cnsf.gob.mx/EntidadesSupervisadas/"
+    "InstitucionesSociedadesMutualistas/Paginas/Incendio.aspx"
+)
+CARPETA_DESCARGA = "data_cnsf"
+CARPETA_CACHE = os.path.join(CARPETA_DESCARGA, ".cache_ingesta")
+
+# Versión de la lectura limpia guardada en caché (cambiarla invalida la caché)
+FORMATO_INGESTA = 1
+CLAVE_MANIFIESTO = b"ingesta_libros"
+
+# Hoja -> nombres posibles (se comparan sin acentos ni mayúsculas)
+HOJAS = {
+    "EMI": ["Emision", "Emisión"],
+    "SA": ["Suma Asegurada"],
+    "SIN": ["Siniestros"],
+}
+
+COLUMNAS_SUMA = {
+    "EMI": ["prima_emitida_neta", "prima_retenida", "prima_devengada"],
+    "SA": ["suma_asegurada"],
+    "SIN": [
+        "monto_de_siniestro", "gasto_de_ajuste", "salvamento", "monto_pagado",
+        "monto_de_deducible", "monto_coaseguro", "n_mero_de_siniestros",
+        "recuperacion_de_terceros", "recuperacion_de_reaseguro",
+    ],
+}
+
+# El nombre de algunas columnas cambia entre años: se toma la primera con dato
+ALIAS_COLUMNAS = {
+    "giro": ["giro_de_la_ubicaci_n", "giro_la_ubicaci_n", "giro"],
+    "n_mero_de_siniestros": ["n_mero_de_siniestros", "numero_de_siniestros"],
+}
+
+COLUMNAS_AGRUPAR = ["giro", "sector", "entidad", "año"]
+
+# ==========================
+# DESCARGA
+# ==========================
+
+def descargar_libros(url=URL_CNSF, carpeta=CARPETA_DESCARGA):
+    """Descarga los .xlsx/.xls enlazados en la página de la CNSF que aún no existan."""
+    # Solo la descarga necesita red; la ingesta funciona sin estas librerías
+    import requests
+    from bs4 import BeautifulSoup
+
+    os.makedirs(carpeta, exist_ok=True)
+    respuesta = requests.get(url, timeout=60)
+    respuesta.raise_for_status()
+    soup = BeautifulSoup(respuesta.content, "html.parser")
+
+    nuevos = []
+    for enlace in soup.find_all("a", href=lambda h: h and h.endswith((".xlsx", ".xls"))):
+        href = enlace["href"]
+        url_libro = href if href.startswith("http") else "https://www.cnsf.gob.mx" + href
+        ruta = os.path.join(carpeta, url_libro.split("/")[-1])
+        if os.path.exists(ruta):
+            continue
+        libro = requests.get(url_libro, timeout=120)
+        libro.raise_for_status()
+        tmp = f"{ruta}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(libro.content)
+        os.replace(tmp, ruta)
+        nuevos.append(ruta)
+    return nuevos
+
+
+# ==========================
+# LECTURA DE UN LIBRO
+# ==========================
+
+def estandarizar_columnas(df):
+    """Limpia y estandariza los nombres de las columnas de un DataFrame."""
+    mapeo = {}
+    for col in df.columns:
+        nueva = str(col).lower().replace("\n", " ").strip()
+        nueva = re.sub(r"[^a-z0-9]+", "_", nueva).strip("_")
+
+        if "institucion" in nueva:
+            nueva = "nombre_institucion"
+        elif "prima" in nueva and "emitida" in nueva:
+            nueva = "prima_emitida_neta"
+        elif "siniestralidad" in nueva:
+            nueva = "tasa_siniestralidad"
+        mapeo[col] = nueva
+    return df.rename(columns=mapeo)
+
+
+def año_de_libro(nombre_archivo):
+    """Año del libro a partir de su nombre (p. ej. 'Incendio_2019.xlsx'), o None."""
+    match = re.search(r"(\d{4})", os.path.basename(nombre_archivo))
+    return int(match.group(1)) if match else None
+
+
+def _limpiar_hoja(df, clave, año):
+    df = estandarizar_columnas(df)
+    df = df.loc[:, ~df.columns.str.startswith("unnamed")]
+    df = df.loc[:, ~df.columns.duplicated()]
+    df = df.dropna(how="all")
+
+    # Filas de totales
+    if "nombre_institucion" in df.columns:
+        df = df[~df["nombre_institucion"].astype(str).str.contains("total", case=False, na=False)]
+
+    limpio = pd.DataFrame(index=df.index)
+    for destino in ["giro", "entidad"] + COLUMNAS_SUMA[clave]:
+        valor = pd.Series(np.nan, index=df.index, dtype=object)
+        for origen in ALIAS_COLUMNAS.get(destino, [destino]):
+            if origen in df.columns:
+                valor = valor.fillna(df[origen])
+        limpio[destino] = valor
+
+    for col in ["giro", "entidad"]:
+        limpio[col] = limpio[col].where(limpio[col].isna(), limpio[col].astype(str).str.strip())
+    limpio[COLUMNAS_SUMA[clave]] = limpio[COLUMNAS_SUMA[clave]].apply(pd.to_numeric, errors="coerce")
+    limpio["año"] = año
+    return limpio.reset_index(drop=True)
+
+
+def leer_libro(ruta):
+    """
+    Lee las tres hojas de un libro con una sola apertura del archivo.
+    Devuelve {"EMI" | "SA" | "SIN": DataFrame limpio}; las hojas que no
+    existan en el libro se omiten.
+    """
+    año = año_de_libro(ruta)
+    hojas = {}
+    with pd.ExcelFile(ruta) as libro:
+        disponibles = {normalizar_texto(h): h for h in libro.sheet_names}
+        for clave, nombres in HOJAS.items():
+            hoja = next((disponibles[normalizar_texto(n)] for n in nombres
+                         if normalizar_texto(n) in disponibles), None)
+            if hoja is not None:
+                hojas[clave] = _limpiar_hoja(libro.parse(hoja, header=1), clave, año)
+    return hojas
+
+
+def _ruta_cache(huella, clave, carpeta_cache):
+    return os.path.join(carpeta_cache, f"{huella}_v{FORMATO_INGESTA}_{clave}.parquet")
+
+
+def _procesar_libro(ruta, huella, carpeta_cache):
+    """Trabajo del pool: lee un libro y deja sus hojas limpias en la caché."""
+    hojas = leer_libro(ruta)
+    for clave in HOJAS:
+        df = hojas.get(clave, pd.DataFrame(columns=["giro", "entidad", "año"] + COLUMNAS_SUMA[clave]))
+        destino = _ruta_cache(huella, clave, carpeta_cache)
+        tmp = f"{destino}.{os.getpid()}.tmp"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, destino)
+    return ruta
+
+
+def leer_libros(rutas, workers=None, carpeta_cache=CARPETA_CACHE):
+    """
+    Hojas limpias de muchos libros. Los libros cuyo contenido ya se leyó
+    antes salen de la caché; el resto se lee en paralelo.
+    Devuelve ({"EMI" | "SA" | "SIN": DataFrame concatenado}, {ruta: huella}).
+    """
+    os.makedirs(carpeta_cache, exist_ok=True)
+    huellas = {ruta: huella_archivo(ruta) for ruta in rutas}
+    pendientes = [
+        ruta for ruta, huella in huellas.items()
+        if not all(os.path.exists(_ruta_cache(huella, c, carpeta_cache)) for c in HOJAS)
+    ]
+
+    if pendientes:
+        print(f"Leyendo {len(pendientes)} libros ({len(rutas) - len(pendientes)} en caché)...")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(
+                _procesar_libro, pendientes,
+                [huellas[r] for r in pendientes], [carpeta_cache] * len(pendientes)
+            ))
+
+    hojas = {
+        clave: pd.concat(
+            [pd.read_parquet(_ruta_cache(huellas[r], clave, carpeta_cache)) for r in rutas],
+            ignore_index=True
+        )
+        for clave in HOJAS
+    }
+    return hojas, huellas
+
+
+# ==========================
+# SECTOR
+# ==========================
+
+_SECTOR_AGROPECUARIO = {
+    "acuicultura animal", "caza y captura", "cultivo de frutales y nueces",
+    "cultivo de granos y semillas oleaginosas", "cultivo de hortalizas",
+    "cultivo en invernaderos y viveros y floricultura",
+    "explotacion avicola", "explotacion de bovinos", "explotacion de porcinos",
+    "explotacion de ovinos y caprinos", "mineria de carbon mineral",
+    "mineria de minerales metalicos", "mineria de minerales no metalicos",
+    "extraccion de petroleo y gas", "pesca", "silvicultura", "tala de arboles",
+    "servicios relacionados con la ganaderia",
+    "servicios relacionados con la agricultura",
+    "servicios relacionados con la mineria",
+}
+
+# Reglas en el orden del notebook: si varias aplican, gana la última
+_REGLAS_SECTOR = [
+    ("Agropecuario y minería", lambda g: g in _SECTOR_AGROPECUARIO),
+    ("Energía y agua", lambda g: "energia electrica" in g or "agua" in g or "gas por ductos" in g),
+    ("Construcción", lambda g: "construccion" in g or "cimentaciones" in g or "edificacion" in g),
+    ("Manufactura", lambda g: g.startswith("fabricacion") or "industria" in g),
+    ("Comercio al por mayor", lambda g: "comercio al por mayor" in g),
+    ("Comercio al por menor", lambda g: "comercio al por menor" in g),
+    ("Transporte y logística", lambda g: "transporte" in g or "mensajeria" in g or "almacenamiento" in g),
+    ("Servicios financieros e inmobiliarios", lambda g: "banca" in g or "seguros" in g or "inmobili" in g),
+    ("Servicios profesionales y educación", lambda g: "consultoria" in g or "escuela" in g or "consultorios" in g),
+    ("Gobierno", lambda g: "administracion publica" in g or "justicia" in g or "seguridad nacional" in g),
+    ("Vivienda", lambda g: g in ("casa habitacion", "departamento")),
+]
+
+
+def sector_de_giro(giro_norm):
+    """Sector de un giro normalizado según las reglas del notebook ("Otros" si ninguna aplica)."""
+    sector = "Otros"
+    for nombre, regla in _REGLAS_SECTOR:
+        if regla(giro_norm):
+            sector = nombre
+    return sector
+
+
+# ==========================
+# CONSOLIDACIÓN
+# ==========================
+
+def consolidar(hojas, giros_existentes=(), entidades_existentes=()):
+    """
+    Hojas limpias (EMI, SA, SIN) -> filas de df_proc: giros y entidades
+    unificados, sector, agregación por (giro, sector, entidad, año), cruce
+    de las tres hojas e indicadores.
+    """
+    catalogo_giros = construir_catalogo(
+        *(hojas[c]["giro"] for c in HOJAS), existentes=giros_existentes
+    )
+    catalogo_entidades = construir_catalogo(
+        *(hojas[c]["entidad"] for c in HOJAS), existentes=entidades_existentes
+    )
+
+    agregadas = []
+    for clave in HOJAS:
+        df = hojas[clave]
+        giro_norm = df["giro"].map(normalizar_texto)
+        df = df.assign(
+            giro=giro_norm.map(catalogo_giros),
+            sector=giro_norm.map(lambda g: sector_de_giro(g) if isinstance(g, str) else "Otros"),
+            entidad=(
+                df["entidad"].map(normalizar_texto).map(catalogo_entidades)
+                .replace(MAPEO_MANUAL_ENTIDAD)
+            ),
+        )
+        agregadas.append(
+            df[COLUMNAS_AGRUPAR + COLUMNAS_SUMA[clave]]
+            .groupby(COLUMNAS_AGRUPAR, as_index=False)
+            .sum()
+        )
+
+    emi, sa, sin = agregadas
+    df = emi.merge(sin, on=COLUMNAS_AGRUPAR, how="inner").merge(sa, on=COLUMNAS_AGRUPAR, how="inner")
+    return calcular_indicadores(df)
+
+
+def calcular_indicadores(df):
+    num_cols = [c for clave in HOJAS for c in COLUMNAS_SUMA[clave]]
+    df[num_cols] = df[num_cols].fillna(0)
+
+    df["cuota_millar"] = np.where(
+        df["suma_asegurada"] != 0, df["prima_emitida_neta"] * 1000 / df["suma_asegurada"], 0
+    )
+    df["sin_index"] = np.where(
+        df["prima_devengada"] != 0, df["monto_de_siniestro"] / df["prima_devengada"], 0
+    )
+    df["siniestro_neto"] = (
+        df["monto_de_siniestro"] + df["gasto_de_ajuste"] - df["salvamento"]
+        - df["recuperacion_de_terceros"] - df["recuperacion_de_reaseguro"]
+    )
+    df["net_sin_index"] = np.where(
+        df["prima_devengada"] != 0, df["siniestro_neto"] / df["prima_devengada"], 0
+    )
+
+    df = df[(df["sin_index"] >= 0) & (df["net_sin_index"] >= 0)]
+    df["año"] = df["año"].astype(int)
+    return df.reset_index(drop=True)
+
+
+# ==========================
+# ESCRITURA INCREMENTAL
+# ==========================
+
+def _leer_manifiesto(ruta):
+    """{nombre de libro: {"huella", "año"}} guardado en el parquet (o {})."""
+    if not os.path.exists(ruta):
+        return {}
+    metadata = pq.read_schema(ruta).metadata or {}
+    return json.loads(metadata.get(CLAVE_MANIFIESTO, b"{}"))
+
+
+def actualizar_df_proc(carpeta=CARPETA_DESCARGA, ruta_salida=RUTA_DATOS, workers=None,
+                       reconstruir=False, carpeta_cache=None):
+    """
+    Incorpora a ruta_salida los años de los libros de `carpeta` que aún no
+    están (o cuyo contenido cambió). Los años ya cargados no se vuelven a
+    leer ni a agregar. Con reconstruir=True rehace todo desde los libros.
+    Devuelve la lista de años agregados o reemplazados.
+    """
+    carpeta_cache = carpeta_cache or os.path.join(carpeta, ".cache_ingesta")
+    libros = {}
+    for nombre in sorted(os.listdir(carpeta)):
+        if not nombre.endswith((".xlsx", ".xls")) or nombre.startswith("~$"):
+            continue
+        año = año_de_libro(nombre)
+        if año is None:
+            print(f"Omitido: {nombre} (sin año en el nombre)")
+            continue
+        libros[nombre] = año
+
+    existente = None
+    if os.path.exists(ruta_salida) and not reconstruir:
+        existente = pd.read_parquet(ruta_salida)
+    manifiesto = _leer_manifiesto(ruta_salida) if existente is not None else {}
+    años_cargados = set(existente["año"].unique()) if existente is not None else set()
+
+    # Un año se (re)procesa si ninguno de sus libros está en el manifiesto con
+    # el mismo hash; los años cargados antes de existir el manifiesto se respetan
+    huellas = {n: huella_archivo(os.path.join(carpeta, n)) for n in libros}
+    años_nuevos = sorted({
+        año for nombre, año in libros.items()
+        if (nombre in manifiesto and manifiesto[nombre]["huella"] != huellas[nombre])
+        or (nombre not in manifiesto and año not in años_cargados)
+    })
+    if not años_nuevos:
+        print("df_proc ya está al día.")
+        return []
+
+    rutas = [os.path.join(carpeta, n) for n, año in libros.items() if año in años_nuevos]
+    hojas, _ = leer_libros(rutas, workers=workers, carpeta_cache=carpeta_cache)
+
+    if existente is None:
+        nuevo = consolidar(hojas)
+        df = nuevo
+    else:
+        nuevo = consolidar(
+            hojas,
+            giros_existentes=existente["giro"].dropna().unique(),
+            entidades_existentes=existente["entidad"].dropna().unique(),
+        )
+        nuevo = nuevo[existente.columns].astype(existente.dtypes.to_dict())
+        df = pd.concat(
+            [existente[~existente["año"].isin(años_nuevos)], nuevo], ignore_index=True
+        ).sort_values(["giro", "entidad", "año"], kind="stable", ignore_index=True)
+
+    manifiesto.update({
+        nombre: {"huella": huellas[nombre], "año": año}
+        for nombre, año in libros.items() if año in años_nuevos
+    })
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    tabla = tabla.replace_schema_metadata({
+        **(tabla.schema.metadata or {}),
+        CLAVE_MANIFIESTO: json.dumps(manifiesto, ensure_ascii=False).encode("utf-8"),
+    })
+    os.makedirs(os.path.dirname(ruta_salida) or ".", exist_ok=True)
+    tmp = f"{ruta_salida}.{os.getpid()}.tmp"
+    pq.write_table(tabla, tmp)
+    os.replace(tmp, ruta_salida)
+
+    print(f"Años incorporados: {años_nuevos} ({len(nuevo)} filas); total {len(df)} filas en {ruta_salida}")
+    return años_nuevos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingesta de los libros de Incendio de la CNSF.")
+    parser.add_argument("--carpeta", default=CARPETA_DESCARGA,
+                        help="carpeta con los .xlsx (p. ej. libros de prueba para correr sin red)")
+    parser.add_argument("--salida", default=RUTA_DATOS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--descargar", action="store_true",
+                        help="descarga antes los libros nuevos publicados por la CNSF")
+    parser.add_argument("--reconstruir", action="store_true",
+                        help="ignora el parquet existente y rehace todo desde los libros")
+    parser.add_argument("--actualizar-modelos", action="store_true",
+                        help="continúa los modelos ya entrenados con los años nuevos (ver actualizacion.py)")
+    args = parser.parse_args()
+
+    if args.descargar:
+        nuevos = descargar_libros(carpeta=args.carpeta)
+        print(f"Libros descargados: {len(nuevos)}")
+
+    actualizados = actualizar_df_proc(args.carpeta, args.salida, args.workers, args.reconstruir)
+
+    # El dataset particionado que usa la app se regenera a partir del parquet
+    if actualizados and args.salida == RUTA_DATOS and os.path.isdir(RUTA_DATASET):
+        particionar_dataset(args.salida, RUTA_DATASET)
+        print(f"Dataset particionado actualizado en {RUTA_DATASET}")
+
+    # Catálogo de los dropdowns para el arranque de la app y hechos del chat
+    if actualizados and args.salida == RUTA_DATOS:
+        catalogo_o_construir(ruta_fuente(), equivalentes=[RUTA_DATOS])
+        hechos_o_construir(ruta_fuente())
+
+    if actualizados and args.actualizar_modelos and args.salida == RUTA_DATOS:
+        actualizar_incremental(ruta_fuente(), años=actualizados)
@@ -0,0 +1,302 @@
+# ============================================
+# Instrumentación: tramos de tiempo, contadores y perfilador
+# - tramo(etapa): mide una etapa (filtrado/lags, ajuste de XGBoost,
+#   pronóstico, tabla, llamada al LLM...) en un histograma por etapa.
+#   Los tramos anidados forman una ruta ("prediccion/ajuste") que solo se
+#   escribe en el log JSON, para no multiplicar las series.
+# - contar(nombre): contadores con etiquetas (nivel usado, aciertos de
+#   caché, filas de entrenamiento, tokens...).
+# - Exportación en texto de Prometheus o como dict/JSON, y un servidor
+#   mínimo de /metrics para la app de Streamlit.
+# - PerfiladorMuestreo: perfilador por muestreo (solo stdlib) para una
+#   sola petición.
+# Las métricas viven en memoria del proceso (con workers, una por worker).
+# ============================================
+import contextvars
+import json
+import logging
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOGGER = logging.getLogger("uw360.metricas")
+
+PREFIJO = "uw360"
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+INTERVALO_MUESTREO = 0.005
+# /metrics no tiene autenticación: solo localhost salvo que se pida otro host
+HOST_METRICAS = "127.0.0.1"
+
+_ruta_tramo = contextvars.ContextVar("ruta_tramo", default=None)
+
+
+def _etiquetas(etiquetas):
+    return tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+
+def _escapar(valor):
+    return valor.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formato_etiquetas(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+
+# ==========================
+# REGISTRO DE MÉTRICAS
+# ==========================
+
+class Metricas:
+    """
+    Contadores y histogramas de duración, seguros entre hilos.
+    Los nombres se exportan con el prefijo PREFIJO (uw360_...).
+    """
+
+    def __init__(self, buckets=BUCKETS_SEGUNDOS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._contadores = Counter()
+        # (nombre, etiquetas) -> [conteo por bucket..., suma, n]
+        self._histogramas = {}
+
+    def contar(self, nombre, valor=1, **etiquetas):
+        with self._lock:
+            self._contadores[(nombre, _etiquetas(etiquetas))] += valor
+
+    def observar(self, nombre, segundos, **etiquetas):
+        clave = (nombre, _etiquetas(etiquetas))
+        with self._lock:
+            h = self._histogramas.get(clave)
+            if h is None:
+                h = self._histogramas[clave] = [0] * len(self.buckets) + [0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if segundos <= limite:
+                    h[i] += 1
+            h[-2] += segundos
+            h[-1] += 1
+
+    @contextmanager
+    def tramo(self, etapa, **etiquetas):
+        """
+        Mide la duración de un bloque como etapa del histograma
+        etapa_segundos. Se puede usar como `with` o como decorador.
+        """
+        padre = _ruta_tramo.get()
+        ruta = f"{padre}/{etapa}" if padre else etapa
+        token = _ruta_tramo.set(ruta)
+        estado = "ok"
+        t0 = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            estado = "error"
+            raise
+        finally:
+            _ruta_tramo.reset(token)
+            self.registrar_tramo(etapa, time.perf_counter() - t0, ruta_tramo=ruta, estado=estado, **etiquetas)
+
+    def registrar_tramo(self, etapa, segundos, ruta_tramo=None, estado="ok", **etiquetas):
+        """Registra un tramo ya medido (p. ej. uno que abarca los yields de un generador)."""
+        self.observar("etapa_segundos", segundos, etapa=etapa, **etiquetas)
+        if LOGGER.isEnabledFor(logging.INFO):
+            LOGGER.info(json.dumps(dict(
+                etiquetas, tramo=ruta_tramo or etapa, segundos=round(segundos, 6), estado=estado
+            ), ensure_ascii=False, default=str))
+
+    def suma(self, nombre, **etiquetas):
+        """Total observado de un histograma en las series con esas etiquetas."""
+        filtro = set(_etiquetas(etiquetas))
+        with self._lock:
+            return sum(
+                h[-2] for (n, etq), h in self._histogramas.items()
+                if n == nombre and filtro <= set(etq)
+            )
+
+    def reiniciar(self):
+        with self._lock:
+            self._contadores.clear()
+            self._histogramas.clear()
+
+    # --------------------------
+    # Exportación
+    # --------------------------
+    def a_dict(self):
+        """Contadores e histogramas (conteo, suma y buckets) serializables."""
+        with self._lock:
+            contadores = [
+                {"nombre": nombre, "etiquetas": dict(etq), "valor": valor}
+                for (nombre, etq), valor in sorted(self._contadores.items())
+            ]
+            histogramas = [
+                {
+                    "nombre": nombre, "etiquetas": dict(etq),
+                    "n": h[-1], "suma": h[-2],
+                    "buckets": dict(zip(map(str, self.buckets), h[:-2])),
+                }
+                for (nombre, etq), h in sorted(self._histogramas.items())
+            ]
+        return {"contadores": contadores, "histogramas": histogramas}
+
+    def a_prometheus(self):
+        """Formato de texto de exposición de Prometheus (0.0.4)."""
+        with self._lock:
+            contadores = sorted(self._contadores.items())
+            histogramas = sorted((k, list(h)) for k, h in self._histogramas.items())
+
+        lineas = []
+        por_nombre = defaultdict(list)
+        for (nombre, etq), valor in contadores:
+            por_nombre[nombre].append((etq, valor))
+        for nombre, series in por_nombre.items():
+            completo = f"{PREFIJO}_{nombre}"
+            lineas.append(f"# TYPE {completo} counter")
+            lineas += [f"{completo}{_formato_etiquetas(etq)} {valor}" for etq, valor in series]
+
+        por_nombre = defaultdict(list)
+        for (nombre, etq), h in histogramas:
+            por_nombre[nombre].append((etq, h))
+        for nombre, series in por_nombre.items():
+            completo = f"{PREFIJO}_{nombre}"
+            lineas.append(f"# TYPE {completo} histogram")
+            for etq, h in series:
+                for limite, conteo in zip(self.buckets, h[:-2]):
+                    lineas.append(
+                        f"{completo}_bucket{_formato_etiquetas(etq, [('le', str(limite))])} {conteo}"
+                    )
+                lineas.append(f"{completo}_bucket{_formato_etiquetas(etq, [('le', '+Inf')])} {h[-1]}")
+                lineas.append(f"{completo}_sum{_formato_etiquetas(etq)} {h[-2]}")
+                lineas.append(f"{completo}_count{_formato_etiquetas(etq)} {h[-1]}")
+        return "\n".join(lineas) + "\n"
+
+
+# Registro del proceso: lo usan modelo, motor, asistente, la app y el servicio
+METRICAS = Metricas()
+tramo = METRICAS.tramo
+contar = METRICAS.contar
+observar = METRICAS.observar
+registrar_tramo = METRICAS.registrar_tramo
+
+
+def configurar_log_json(destino=None):
+    """Escribe cada tramo como una línea JSON (en stderr por defecto)."""
+    manejador = logging.StreamHandler(destino or sys.stderr)
+    manejador.setFormatter(logging.Formatter("%(message)s"))
+    LOGGER.addHandler(manejador)
+    LOGGER.setLevel(logging.INFO)
+    LOGGER.propagate = False
+
+
+# ==========================
+# /metrics PARA LA APP
+# ==========================
+
+class _HandlerMetricas(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0].rstrip("/") not in ("/metrics", "/metricas"):
+            self.send_error(404)
+            return
+        payload = self.server.metricas.a_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def servir_metricas(puerto, host=HOST_METRICAS, metricas=METRICAS):
+    """
+    Sirve GET /metrics en un hilo de fondo. Devuelve el servidor.
+    Sin autenticación: por defecto solo escucha en localhost; para que lo
+    lea un Prometheus externo hay que pasar host="0.0.0.0" a propósito.
+    """
+    servidor = ThreadingHTTPServer((host, puerto), _HandlerMetricas)
+    servidor.daemon_threads = True
+    servidor.metricas = metricas
+    threading.Thread(target=servidor.serve_forever, name="metricas", daemon=True).start()
+    return servidor
+
+
+# ==========================
+# PERFILADOR POR MUESTREO
+# ==========================
+
+class PerfiladorMuestreo:
+    """
+    Toma la pila del hilo que lo activa cada `intervalo` segundos desde un
+    hilo aparte, sin instrumentar cada llamada (el costo no depende de
+    cuántas funciones se ejecuten). El tiempo dentro de XGBoost aparece en
+    el último marco de Python (p. ej. xgboost/core.py:update).
+
+        with PerfiladorMuestreo() as perfil:
+            motor.predecir(giro, entidad)
+        perfil.resumen()      # funciones con más muestras
+        perfil.colapsado()    # pilas colapsadas (flamegraph / speedscope)
+    """
+
+    def __init__(self, intervalo=INTERVALO_MUESTREO):
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        self.muestras = 0
+        self.segundos = 0.0
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def __enter__(self):
+        objetivo = threading.get_ident()
+        self._t0 = time.perf_counter()
+        self._hilo = threading.Thread(
+            target=self._muestrear, args=(objetivo,), name="perfilador", daemon=True
+        )
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._detener.set()
+        self._hilo.join()
+        self.segundos = time.perf_counter() - self._t0
+        return False
+
+    def _muestrear(self, objetivo):
+        while not self._detener.wait(self.intervalo):
+            marco = sys._current_frames().get(objetivo)
+            pila = []
+            while marco is not None:
+                codigo = marco.f_code
+                pila.append(f"{codigo.co_filename.rsplit('/', 1)[-1]}:{codigo.co_name}")
+                marco = marco.f_back
+            if pila:
+                self.pilas[";".join(reversed(pila))] += 1
+                self.muestras += 1
+
+    def colapsado(self):
+        """Una línea 'f1;f2;...;fn muestras' por pila."""
+        return "\n".join(f"{pila} {n}" for pila, n in self.pilas.most_common())
+
+    def resumen(self, n=15):
+        """Funciones con más muestras: propias (en la cima) y totales (en la pila)."""
+        propias, totales = Counter(), Counter()
+        for pila, conteo in self.pilas.items():
+            marcos = pila.split(";")
+            propias[marcos[-1]] += conteo
+            for marco in set(marcos):
+                totales[marco] += conteo
+        return [
+            {
+                "funcion": funcion,
+                "muestras_propias": propias[funcion],
+                "muestras_totales": total,
+                "fraccion": total / self.muestras if self.muestras else 0.0,
+            }
+            for funcion, total in sorted(
+                totales.items(), key=lambda x: (propias[x[0]], x[1]), reverse=True
+            )[:n]
+        ]
@@ -0,0 +1,559 @@
+# ============================================
+# Motor de predicción de siniestralidad
+# Funciones sin dependencia de Streamlit para poder usarse desde la app,
+# procesos por lotes o scripts.
+# ============================================
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import numpy as np
+
+from almacen_features import LAG1_COLS, AlmacenFeatures
+from metricas import contar, tramo
+from registro_modelos import ClaveModelo, huella_archivo, huella_parametros
+
+
+# ==========================
+# MODELO DE PREDICCIÓN
+# ==========================
+
+XGB_PARAMS = dict(
+    n_estimators=600,
+    learning_rate=0.05,
+    max_depth=5,
+    subsample=0.9,
+    colsample_bytree=0.9,
+    tree_method="hist"
+)
+
+# Capacidad según filas de entrenamiento: (hasta n filas, max_depth, n_estimators).
+# Con pocas filas 600 árboles de profundidad 5 solo memorizan y tardan.
+CAPACIDAD_POR_TAMANO = [
+    (30, 4, 250),
+    (200, 5, 400),
+]
+
+# Parada temprana: se valida con los últimos años del segmento (orden
+# temporal), tantos como hagan falta para juntar MIN_FILAS_VALIDACION filas
+# y FRACCION_VALIDACION de la serie (en giro hay una fila por año). La
+# validación es ruidosa y tiende a parar demasiado pronto, por eso el
+# reajuste usa al menos MIN_ARBOLES_PARADA árboles.
+RONDAS_PARADA = 30
+MIN_FILAS_PARADA = 8
+MIN_FILAS_VALIDACION = 2
+FRACCION_VALIDACION = 0.2
+MIN_ARBOLES_PARADA = 100
+
+# Hiperparámetros ajustados por sector (python busqueda_parametros.py)
+RUTA_PARAMETROS_SECTOR = "data_config/parametros_sector.json"
+
+# Versión del contenido de cada ajuste guardado en el registro de modelos
+FORMATO_AJUSTE = 4
+
+# Años a pronosticar por defecto
+HORIZONTE = 2
+
+# recursivo: un modelo a 1 año que se aplica paso a paso (cada predicción
+#            alimenta el lag de net_sin_index del paso siguiente).
+# directo:   un modelo multi-salida (una columna por año del horizonte);
+#            todos los años salen de un solo predict.
+MODOS = ("recursivo", "directo")
+
+_IDX_NET = LAG1_COLS.index('net_sin_index_lag1')
+
+# Bandas de incertidumbre (ver prediccion_con_intervalos)
+METODOS_INTERVALO = ("cuantiles", "bootstrap")
+CUANTILES = (0.1, 0.5, 0.9)
+MIEMBROS_BOOTSTRAP = 20
+
+
+def features_segmento(lags):
+    """
+    Features de un segmento: lags + one-hot de (categoría, entidad). Dentro
+    de un segmento el one-hot es constante (dos columnas en 1); se conserva
+    para no alterar el muestreo de columnas (colsample_bytree) del modelo.
+    """
+    return np.hstack([lags, np.ones((len(lags), 2), np.float32)])
+
+
+# ruta -> (firma del archivo, {sector: parámetros}); lo leen a la vez la app,
+# los hilos del servicio y el motor
+_parametros_sector = {}
+_lock_parametros_sector = threading.Lock()
+
+
+def parametros_sector(sector, ruta=RUTA_PARAMETROS_SECTOR):
+    """
+    Hiperparámetros ajustados para el sector (dict vacío si no hay). Cada
+    archivo se relee solo si cambia su mtime o tamaño.
+    """
+    ruta = os.path.abspath(ruta)
+    try:
+        estado = os.stat(ruta)
+    except OSError:
+        return {}
+    firma = (estado.st_mtime_ns, estado.st_size)
+    with _lock_parametros_sector:
+        entrada = _parametros_sector.get(ruta)
+        if entrada is None or entrada[0] != firma:
+            with open(ruta, encoding="utf-8") as f:
+                contenido = json.load(f)
+            entrada = (firma, {s: r["parametros"] for s, r in contenido.get("sectores", {}).items()})
+            _parametros_sector[ruta] = entrada
+    return entrada[1].get(sector, {})
+
+
+def parametros_segmento(n_filas, ajustados=None):
+    """
+    XGB_PARAMS + ajustados (p. ej. los del sector), con max_depth y
+    n_estimators topados según el número de filas de entrenamiento.
+    """
+    params = dict(XGB_PARAMS, **(ajustados or {}))
+    for hasta, profundidad, arboles in CAPACIDAD_POR_TAMANO:
+        if n_filas <= hasta:
+            params["max_depth"] = min(params["max_depth"], profundidad)
+            params["n_estimators"] = min(params["n_estimators"], arboles)
+            break
+    return params
+
+
+def huella_modelos(ruta=RUTA_PARAMETROS_SECTOR):
+    """
+    Huella de la configuración con la que se ajustan los modelos
+    segmentados (formato, parámetros base, capacidad por tamaño, parada
+    temprana y parametros_sector.json). Lo que se guarda a partir de sus
+    predicciones (p. ej. la tabla precalculada) solo vale con la misma huella.
+    """
+    return huella_parametros({
+        "formato": FORMATO_AJUSTE,
+        "xgb": XGB_PARAMS,
+        "capacidad": CAPACIDAD_POR_TAMANO,
+        "parada": [RONDAS_PARADA, MIN_FILAS_PARADA, MIN_FILAS_VALIDACION,
+                   FRACCION_VALIDACION, MIN_ARBOLES_PARADA],
+        "parametros_sector": huella_archivo(ruta) if os.path.exists(ruta) else None,
+    })
+
+
+def años_validacion(años):
+    """
+    Máscara de las filas de validación: los últimos años completos hasta
+    juntar MIN_FILAS_VALIDACION filas y FRACCION_VALIDACION del total.
+    """
+    minimo = max(MIN_FILAS_VALIDACION, int(np.ceil(FRACCION_VALIDACION * len(años))))
+    unicos, conteos = np.unique(años, return_counts=True)
+    acumulado = np.cumsum(conteos[::-1])
+    corte = unicos[::-1][min(np.searchsorted(acumulado, minimo), len(unicos) - 1)]
+    return años >= corte
+
+
+def parametros_de_segmento(segmento, sector, ruta_parametros=RUTA_PARAMETROS_SECTOR):
+    """
+    Parámetros con los que se ajusta un segmento (filas válidas + sector
+    del giro). ruta_parametros=None ignora los ajustados por sector.
+    """
+    ajustados = parametros_sector(sector, ruta_parametros) if ruta_parametros else {}
+    return parametros_segmento(int(segmento.valido.sum()), ajustados)
+
+
+def clave_modelo(nivel, categoria, entidad, huella_datos, params, modo="recursivo",
+                 horizonte=None, **extra):
+    """
+    ClaveModelo de un ajuste en el registro: la misma al buscarlo en una
+    predicción y al registrarlo desde actualizacion.py. El modelo recursivo
+    sirve para cualquier horizonte; el directo depende del número de salidas.
+    """
+    return ClaveModelo(
+        nivel=nivel,
+        categoria=categoria,
+        entidad=entidad,
+        huella_datos=huella_datos,
+        hiperparametros=huella_parametros(dict(
+            params, formato=FORMATO_AJUSTE, modo=modo,
+            **({"horizonte": horizonte} if modo == "directo" else {}), **extra
+        )),
+    )
+
+
+def base_pronostico(segmento, modo="recursivo", horizonte=None):
+    """Base para predicción: lags y año de la última observación con target."""
+    idx_base = np.flatnonzero(~np.isnan(segmento.target))[-1]
+    return {
+        "base_lags": segmento.lags[idx_base].copy(),
+        "last_year": int(segmento.años[idx_base]),
+        "modo": modo,
+        "horizonte": horizonte if modo == "directo" else None,
+    }
+
+
+def ajustar_modelo(X, y, años, params, n_jobs=None):
+    """
+    Ajusta un XGBRegressor eligiendo n_estimators con parada temprana en
+    orden temporal: se entrena con los años anteriores, se valida con los
+    últimos (años_validacion) y se reajusta con todas las filas usando los
+    árboles que resultaron útiles (al menos MIN_ARBOLES_PARADA). Si no hay
+    filas suficientes para validar se usa n_estimators de params tal cual.
+    """
+    from xgboost import XGBRegressor
+
+    validacion = años_validacion(años)
+    if validacion.sum() >= MIN_FILAS_VALIDACION and (~validacion).sum() >= MIN_FILAS_PARADA:
+        sondeo = XGBRegressor(**params, n_jobs=n_jobs, early_stopping_rounds=RONDAS_PARADA)
+        sondeo.fit(
+            X[~validacion], y[~validacion],
+            eval_set=[(X[validacion], y[validacion])], verbose=False
+        )
+        arboles = max(sondeo.best_iteration + 1, MIN_ARBOLES_PARADA)
+        params = dict(params, n_estimators=min(arboles, params["n_estimators"]))
+    return XGBRegressor(**params, n_jobs=n_jobs).fit(X, y)
+
+
+def objetivos_directos(target, horizonte):
+    """
+    Matriz (n, horizonte) con el target de la fila y los de las
+    horizonte-1 filas siguientes de la misma serie (NaN al final).
+    """
+    n = len(target)
+    Y = np.full((n, horizonte), np.nan, dtype=np.float32)
+    for h in range(horizonte):
+        Y[:n - h, h] = target[h:]
+    return Y
+
+
+def pronosticar(ajuste, horizonte=HORIZONTE):
+    """
+    Pronóstico a partir de un ajuste del registro, sin DataFrames: la matriz
+    de features se arma una vez en NumPy.
+    ajuste["base_lags"] puede ser una fila (un segmento) o una matriz con
+    una fila por serie (varias series con el mismo modelo); en el segundo
+    caso ajuste["last_year"] es un arreglo.
+    Devuelve dict{año: predicción} (o lista de dicts si son varias series).
+    """
+    model = ajuste["model"]
+    base = np.atleast_2d(ajuste["base_lags"])
+    años_base = np.atleast_1d(ajuste["last_year"])
+
+    # Lags + las dos columnas one-hot constantes del segmento
+    X = np.ones((len(base), base.shape[1] + 2), dtype=np.float32)
+    X[:, :base.shape[1]] = base
+
+    if ajuste.get("modo", "recursivo") == "directo":
+        if horizonte > ajuste["horizonte"]:
+            raise ValueError(
+                f"El modelo directo se ajustó a {ajuste['horizonte']} años; "
+                f"no puede pronosticar {horizonte}"
+            )
+        P = model.predict(X).reshape(len(X), -1)[:, :horizonte]
+    else:
+        P = np.empty((len(X), horizonte), dtype=np.float32)
+        for h in range(horizonte):
+            P[:, h] = model.predict(X)
+            # Actualizar lag de net_sin_index para el siguiente paso
+            X[:, _IDX_NET] = P[:, h]
+
+    predicciones = [
+        {int(año) + h + 1: float(fila[h]) for h in range(horizonte)}
+        for año, fila in zip(años_base, P)
+    ]
+    return predicciones[0] if np.ndim(ajuste["base_lags"]) == 1 else predicciones
+
+
+def _ajustar_bandas(X, y, metodo, miembros=MIEMBROS_BOOTSTRAP, n_jobs=None, semilla=0,
+                    params=XGB_PARAMS):
+    """
+    Modelos para las bandas P10/P50/P90.
+    cuantiles: un solo XGBoost con objetivo de cuantiles (una salida por
+               cuantil, a 1 año; se aplica recursivamente con la P50).
+    bootstrap: `miembros` modelos entrenados en paralelo sobre remuestreos
+               de las filas; los hilos disponibles (n_jobs o todos los
+               núcleos) se reparten entre los miembros.
+    """
+    # xgboost se importa al entrenar: la app arranca sin cargarlo
+    from xgboost import XGBRegressor
+
+    if metodo == "cuantiles":
+        model = XGBRegressor(
+            **params, objective="reg:quantileerror",
+            quantile_alpha=np.array(CUANTILES), n_jobs=n_jobs
+        )
+        model.fit(X, y[:, 0] if y.ndim == 2 else y)
+        return [model]
+
+    hilos = n_jobs or os.cpu_count() or 1
+    workers = max(1, min(miembros, hilos))
+    hilos_por_miembro = max(1, hilos // workers)
+
+    def _miembro(i):
+        idx = np.random.default_rng(semilla + i).integers(0, len(X), len(X))
+        model = XGBRegressor(**params, n_jobs=hilos_por_miembro, random_state=semilla + i)
+        return model.fit(X[idx], y[idx])
+
+    # XGBoost libera el GIL al entrenar: los hilos sí corren en paralelo
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_miembro, range(miembros)))
+
+
+def pronosticar_bandas(ajuste, horizonte=HORIZONTE):
+    """
+    Bandas a partir de un ajuste de intervalos del registro.
+    Devuelve dict{año: (p10, p50, p90)}.
+    """
+    if ajuste["metodo"] == "cuantiles":
+        model = ajuste["modelos"][0]
+        X = np.append(ajuste["base_lags"], np.ones(2, np.float32))[None, :]
+        bandas = {}
+        for h in range(horizonte):
+            p10, p50, p90 = np.sort(model.predict(X).reshape(-1))
+            bandas[ajuste["last_year"] + h + 1] = (float(p10), float(p50), float(p90))
+            # Actualizar lag de net_sin_index con la mediana
+            X[0, _IDX_NET] = p50
+        return bandas
+
+    trayectorias = np.array([
+        list(pronosticar(dict(ajuste, model=model), horizonte).values())
+        for model in ajuste["modelos"]
+    ])
+    percentiles = np.percentile(trayectorias, [q * 100 for q in CUANTILES], axis=0)
+    return {
+        ajuste["last_year"] + h + 1: tuple(float(p) for p in percentiles[:, h])
+        for h in range(horizonte)
+    }
+
+
+def prediccion_siniestralidad(df_proc, giro_usuario, entidad_usuario, min_obs=3,
+                              registro=None, huella_datos=None, n_jobs=None,
+                              almacen=None, datos=None, horizonte=HORIZONTE,
+                              modo="recursivo", ruta_parametros=RUTA_PARAMETROS_SECTOR):
+    """
+    Entrena un modelo XGBoost "al vuelo" para un giro+entidad.
+    Si no hay suficientes datos a ese nivel, hace fallback a sector+entidad.
+    Si se pasa un RegistroModelos (y la huella del parquet), reutiliza el
+    modelo ya ajustado para la misma combinación en lugar de reentrenar.
+    n_jobs limita los hilos de XGBoost (útil al correr en un pool de procesos).
+    almacen es un AlmacenFeatures ya construido sobre df_proc; si no se pasa
+    se construye en la llamada. datos (DatosCNSF) evita recorrer df_proc
+    para encontrar el sector del giro.
+    horizonte: años a pronosticar. modo: "recursivo" o "directo" (ver MODOS).
+    ruta_parametros: hiperparámetros ajustados por sector (None: solo los
+    base, p. ej. en backtesting).
+    Devuelve: (dict{año: predicción}, nivel_usado: "giro" | "sector")
+    """
+    preds, nivel, _ = _prediccion_segmentada(
+        df_proc, giro_usuario, entidad_usuario, min_obs, registro, huella_datos,
+        n_jobs, almacen, datos, horizonte, modo, ruta_parametros=ruta_parametros
+    )
+    return preds, nivel
+
+
+def prediccion_con_intervalos(df_proc, giro_usuario, entidad_usuario, metodo="cuantiles",
+                              miembros=MIEMBROS_BOOTSTRAP, min_obs=3, registro=None,
+                              huella_datos=None, n_jobs=None, almacen=None, datos=None,
+                              horizonte=HORIZONTE, modo="recursivo"):
+    """
+    Igual que prediccion_siniestralidad, más bandas P10/P50/P90 ajustadas
+    sobre el mismo segmento (metodo: "cuantiles" o "bootstrap", ver
+    _ajustar_bandas). Los modelos de las bandas se guardan en el registro
+    junto al modelo puntual, con su propia clave.
+    Devuelve: (dict{año: predicción}, dict{año: (p10, p50, p90)}, nivel_usado)
+    """
+    if metodo not in METODOS_INTERVALO:
+        raise ValueError(f"metodo debe ser uno de {METODOS_INTERVALO}")
+    preds, nivel, bandas = _prediccion_segmentada(
+        df_proc, giro_usuario, entidad_usuario, min_obs, registro, huella_datos,
+        n_jobs, almacen, datos, horizonte, modo, intervalos=(metodo, miembros)
+    )
+    return preds, bandas, nivel
+
+
+@tramo("prediccion")
+def _prediccion_segmentada(df_proc, giro_usuario, entidad_usuario, min_obs, registro,
+                           huella_datos, n_jobs, almacen, datos, horizonte, modo,
+                           intervalos=None, ruta_parametros=RUTA_PARAMETROS_SECTOR):
+    if modo not in MODOS:
+        raise ValueError(f"modo debe ser uno de {MODOS}")
+    if almacen is None:
+        almacen = AlmacenFeatures(df_proc)
+
+    # Sector del giro: nivel de respaldo y llave de los hiperparámetros ajustados
+    if datos is not None:
+        sector_usuario = datos.sector_de_giro(giro_usuario)
+    else:
+        sectores_giro = df_proc.loc[df_proc['giro'] == giro_usuario, 'sector'].dropna()
+        sector_usuario = sectores_giro.mode().iloc[0] if not sectores_giro.empty else None
+
+    def _entrenamiento(segmento, cat_col, valor_cat, nivel_desc):
+        # Filas con target y lags completos (máscara precalculada en el almacén)
+        valido = segmento.valido
+        if modo == "directo":
+            Y = objetivos_directos(segmento.target, horizonte)
+            valido = valido & ~np.isnan(Y).any(axis=1)
+
+        if valido.sum() < min_obs:
+            raise ValueError(
+                f"No hay suficientes datos limpios a nivel {nivel_desc} "
+                f"para {cat_col}={valor_cat}, entidad={entidad_usuario}"
+            )
+
+        X = features_segmento(segmento.lags[valido])
+        y = Y[valido] if modo == "directo" else segmento.target[valido]
+        contar("ajustes_total", nivel=nivel_desc)
+        contar("filas_entrenamiento_total", len(y), nivel=nivel_desc)
+        años = segmento.años[valido]
+        return X, y, años, base_pronostico(segmento, modo, horizonte)
+
+    def _ajustar(segmento, cat_col, valor_cat, nivel_desc, params):
+        with tramo("preparacion", nivel=nivel_desc):
+            X, y, años, base = _entrenamiento(segmento, cat_col, valor_cat, nivel_desc)
+        with tramo("ajuste", nivel=nivel_desc):
+            model = ajustar_modelo(X, y, años, params, n_jobs=n_jobs)
+        contar("arboles_total", model.n_estimators, nivel=nivel_desc)
+        return dict(base, model=model, parametros=dict(params, n_estimators=model.n_estimators))
+
+    def _ajustar_intervalos(segmento, cat_col, valor_cat, nivel_desc, params):
+        with tramo("preparacion", nivel=nivel_desc):
+            X, y, _, base = _entrenamiento(segmento, cat_col, valor_cat, nivel_desc)
+        metodo, miembros = intervalos
+        with tramo("ajuste_bandas", nivel=nivel_desc, metodo=metodo):
+            modelos = _ajustar_bandas(X, y, metodo, miembros, n_jobs=n_jobs, params=params)
+        return dict(base, metodo=metodo, modelos=modelos, parametros=params)
+
+    def _desde_registro(segmento, cat_col, valor_cat, nivel_desc, ajustar, **extra):
+        params = parametros_de_segmento(segmento, sector_usuario, ruta_parametros)
+        if registro is None or huella_datos is None:
+            return ajustar(segmento, cat_col, valor_cat, nivel_desc, params)
+        clave = clave_modelo(
+            nivel_desc, valor_cat, entidad_usuario, huella_datos, params, modo, horizonte, **extra
+        )
+        ajustado = []
+
+        def _ajustar_fallo():
+            ajustado.append(True)
+            return ajustar(segmento, cat_col, valor_cat, nivel_desc, params)
+
+        ajuste = registro.obtener_o_ajustar(clave, _ajustar_fallo)
+        contar("registro_modelos_total", resultado="fallo" if ajustado else "acierto")
+        return ajuste
+
+    def _ajustar_y_predecir(segmento, cat_col, valor_cat, nivel_desc):
+        ajuste = _desde_registro(segmento, cat_col, valor_cat, nivel_desc, _ajustar)
+        with tramo("pronostico", nivel=nivel_desc):
+            return pronosticar(ajuste, horizonte)
+
+    def _bandas(segmento, cat_col, valor_cat, nivel_desc):
+        if intervalos is None:
+            return None
+        metodo, miembros = intervalos
+        ajuste = _desde_registro(
+            segmento, cat_col, valor_cat, nivel_desc, _ajustar_intervalos,
+            intervalos=metodo, **({"miembros": miembros} if metodo == "bootstrap" else {})
+        )
+        with tramo("pronostico_bandas", nivel=nivel_desc):
+            return pronosticar_bandas(ajuste, horizonte)
+
+    # =========================
+    # NIVEL 1: GIRO + ENTIDAD
+    # =========================
+    # Filtrado del segmento + lags (lectura del disco con dataset particionado)
+    with tramo("segmento", nivel="giro"):
+        seg_ge = almacen.segmento('giro', giro_usuario, entidad_usuario)
+
+    if seg_ge is not None and len(seg_ge.target) >= min_obs:
+        try:
+            preds_giro = _ajustar_y_predecir(
+                seg_ge, cat_col='giro',
+                valor_cat=giro_usuario,
+                nivel_desc='giro'
+            )
+            if not all(abs(v) < 1e-9 for v in preds_giro.values()):
+                contar("prediccion_nivel_total", nivel="giro", modo=modo)
+                return preds_giro, "giro", _bandas(seg_ge, 'giro', giro_usuario, 'giro')
+            contar("fallback_sector_total", motivo="prediccion_nula")
+        except ValueError:
+            contar("fallback_sector_total", motivo="datos_insuficientes")  # Intentaremos sector
+    else:
+        contar("fallback_sector_total", motivo="sin_segmento_giro")
+
+    # =========================
+    # NIVEL 2: SECTOR + ENTIDAD
+    # =========================
+    if sector_usuario is None:
+        raise ValueError(f"No se encontró sector asociado al giro={giro_usuario}")
+
+    with tramo("segmento", nivel="sector"):
+        seg_se = almacen.segmento('sector', sector_usuario, entidad_usuario)
+
+    if seg_se is None or len(seg_se.target) < min_obs:
+        raise ValueError(
+            "No hay suficientes datos ni a nivel giro ni a nivel sector para "
+            f"giro={giro_usuario}, entidad={entidad_usuario}, sector={sector_usuario}"
+        )
+
+    preds_sector = _ajustar_y_predecir(
+        seg_se, cat_col='sector',
+        valor_cat=sector_usuario,
+        nivel_desc='sector'
+    )
+
+    contar("prediccion_nivel_total", nivel="sector", modo=modo)
+    return preds_sector, "sector", _bandas(seg_se, 'sector', sector_usuario, 'sector')
+
+
+# ==========================
+# HISTÓRICO + PREDICCIÓN
+# ==========================
+
+def _filas_prediccion(preds_dict, bandas=None):
+    filas = [{"Año": año, "Índice siniestralidad neta": val} for año, val in preds_dict.items()]
+    if bandas is not None:
+        for fila in filas:
+            fila["P10"], fila["P50"], fila["P90"] = bandas.get(fila["Año"], (np.nan,) * 3)
+    return pd.DataFrame(filas)
+
+
+@tramo("tabla_hist_y_pred")
+def construir_tabla_hist_y_pred(df_proc, giro, entidad, preds_dict, datos=None, bandas=None):
+    """
+    Histórico de net_sin_index del par + predicciones. Con bandas
+    (dict{año: (p10, p50, p90)}) agrega las columnas P10/P50/P90 a las
+    filas de predicción.
+    """
+    if datos is not None:
+        df_hist_base = datos.filas("giro", giro, entidad)
+    else:
+        df_hist_base = df_proc[
+            (df_proc["giro"] == giro) &
+            (df_proc["entidad"] == entidad)
+        ]
+
+    if df_hist_base.empty:
+        df_pred = (
+            _filas_prediccion(preds_dict, bandas)
+            .assign(Fuente="Predicción")
+            .sort_values("Año")
+        )
+        return df_pred
+
+    df_hist = (
+        df_hist_base
+        .groupby("año", as_index=False)["net_sin_index"]
+        .mean()
+        .rename(columns={
+            "año": "Año",
+            "net_sin_index": "Índice siniestralidad neta"
+        })
+        .assign(Fuente="Histórico")
+    )
+
+    df_pred = (
+        _filas_prediccion(preds_dict, bandas)
+        .assign(Fuente="Predicción")
+    )
+
+    df_resultado = (
+        pd.concat([df_hist, df_pred], ignore_index=True)
+        .sort_values(["Año", "Fuente"])
+    )
+
+    return df_resultado
@@ -0,0 +1,163 @@
+# ============================================
+# Modelo global (pooled) de siniestralidad
+# Un solo XGBoost entrenado una vez sobre todo df_proc, con lags y
+# giro/sector/entidad como variables categóricas. Se guarda como artefacto
+# y la predicción de cualquier par (giro, entidad) es un predict vectorizado.
+#
+# Uso (entrenar y guardar el artefacto):
+#   python modelo_global.py
+# ============================================
+import os
+import pickle
+
+import pandas as pd
+from xgboost import XGBRegressor
+
+from almacen_features import LAG_FEATURES, LAG1_COLS, construir_lags
+from datos import cargar_df_proc, ruta_fuente
+from modelo import HORIZONTE, XGB_PARAMS
+from registro_modelos import huella_archivo, huella_parametros
+
+RUTA_MODELO_GLOBAL = "model_cache/modelo_global.pkl"
+CATEGORICAS = ["giro", "sector", "entidad"]
+FEATURE_COLS = LAG1_COLS + CATEGORICAS
+PARAMS_GLOBAL = dict(XGB_PARAMS, tree_method="hist", enable_categorical=True)
+
+
+# ==========================
+# FEATURES
+# ==========================
+
+def _categorizar(df, categorias):
+    for col in CATEGORICAS:
+        df[col] = pd.Categorical(df[col], categories=categorias[col])
+    return df
+
+
+def construir_features_global(df_proc):
+    """
+    Ordena por (giro, entidad, año) y agrega las columnas *_lag1 calculadas
+    por serie giro+entidad (mismo cálculo que el almacén de features).
+    """
+    return construir_lags(df_proc, "giro")
+
+
+# ==========================
+# ENTRENAMIENTO
+# ==========================
+
+def entrenar_modelo_global(df_proc, huella_datos=None, n_jobs=None):
+    """
+    Entrena el modelo global y devuelve el ajuste (dict) listo para guardar.
+    Las filas sin lags (primer año de cada serie) se conservan: XGBoost
+    trata los NaN como faltantes.
+    """
+    df = construir_features_global(df_proc)
+    df = df[df["net_sin_index"].notna()]
+
+    categorias = {
+        col: sorted(df_proc[col].dropna().unique().tolist()) for col in CATEGORICAS
+    }
+    X = _categorizar(df[FEATURE_COLS].copy(), categorias)
+    y = df["net_sin_index"]
+
+    model = XGBRegressor(**PARAMS_GLOBAL, n_jobs=n_jobs)
+    model.fit(X, y)
+
+    # Último estado de cada serie: sus valores del último año son los lags
+    # del año siguiente
+    ultimo = df.groupby(["giro", "entidad"], observed=True, sort=False).tail(1)
+    ultimo_estado = ultimo.set_index(["giro", "entidad"])[LAG_FEATURES + ["año"]]
+    ultimo_estado.columns = LAG1_COLS + ["año"]
+
+    sector_por_giro = (
+        df_proc.dropna(subset=["giro", "sector"])
+        .groupby("giro", observed=True)["sector"]
+        .agg(lambda s: s.mode().iloc[0])
+        .to_dict()
+    )
+
+    return {
+        "model": model,
+        "categorias": categorias,
+        "ultimo_estado": ultimo_estado,
+        "sector_por_giro": sector_por_giro,
+        "ultimo_año": int(df_proc["año"].max()),
+        "huella_datos": huella_datos,
+        "hiperparametros": huella_parametros(PARAMS_GLOBAL),
+    }
+
+
+def cargar_o_entrenar_modelo_global(df_proc, huella_datos, ruta=RUTA_MODELO_GLOBAL):
+    """
+    Carga el artefacto si existe y corresponde a la misma versión del
+    parquet y a los mismos hiperparámetros; si no, entrena el modelo y lo
+    guarda.
+    df_proc puede ser un DataFrame o una función sin argumentos que lo
+    devuelva (solo se llama si hay que entrenar).
+    """
+    if os.path.exists(ruta):
+        try:
+            with open(ruta, "rb") as f:
+                ajuste = pickle.load(f)
+            if (ajuste.get("huella_datos") == huella_datos
+                    and ajuste.get("hiperparametros") == huella_parametros(PARAMS_GLOBAL)):
+                return ajuste
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+    if callable(df_proc):
+        df_proc = df_proc()
+    ajuste = entrenar_modelo_global(df_proc, huella_datos=huella_datos)
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(ajuste, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, ruta)
+    return ajuste
+
+
+# ==========================
+# PREDICCIÓN
+# ==========================
+
+def predecir_global(ajuste, pares, horizonte=HORIZONTE):
+    """
+    Predice para muchos pares (giro, entidad) a la vez: un predict por año
+    del horizonte para todos los pares.
+    Devuelve: lista de dict{año: predicción}, en el mismo orden que pares.
+    """
+    indice = pd.MultiIndex.from_tuples(pares, names=["giro", "entidad"])
+    X = ajuste["ultimo_estado"].reindex(indice)
+
+    # Pares sin historia: lags faltantes, se proyecta desde el último año global
+    ultimo_año = X.pop("año").fillna(ajuste["ultimo_año"]).astype(int).to_numpy()
+
+    X = X.reset_index()
+    X["sector"] = X["giro"].map(ajuste["sector_por_giro"])
+    X = _categorizar(X[FEATURE_COLS], ajuste["categorias"])
+
+    predicciones = [dict() for _ in pares]
+    for step in range(1, horizonte + 1):
+        preds = ajuste["model"].predict(X)
+        for i, pred in enumerate(preds):
+            predicciones[i][int(ultimo_año[i]) + step] = float(pred)
+
+        # Actualizar lag de net_sin_index para el siguiente paso
+        X["net_sin_index_lag1"] = preds
+
+    return predicciones
+
+
+def prediccion_global(ajuste, giro_usuario, entidad_usuario, horizonte=HORIZONTE):
+    """
+    Misma interfaz que prediccion_siniestralidad, usando el modelo global.
+    Devuelve: (dict{año: predicción}, "global")
+    """
+    return predecir_global(ajuste, [(giro_usuario, entidad_usuario)], horizonte)[0], "global"
+
+
+if __name__ == "__main__":
+    ruta = ruta_fuente()
+    ajuste = cargar_o_entrenar_modelo_global(lambda: cargar_df_proc(ruta), huella_archivo(ruta))
+    print(f"Modelo global listo en {RUTA_MODELO_GLOBAL} ({len(ajuste['ultimo_estado'])} series)")
@@ -0,0 +1,152 @@
+# ============================================
+# Motor de predicción
+# Reúne en un objeto de solo lectura todo lo que necesita una predicción:
+# datos indexados, almacén de features, registro de modelos, tabla
+# precalculada y modelo global. Lo usan la app de Streamlit y el servicio
+# HTTP (servicio.py).
+# ============================================
+import os
+import threading
+
+from almacen_features import AlmacenFeatures, AlmacenParticionado
+from datos import (
+    COLUMNAS_CATALOGO, DatosCNSF, abrir_dataset, cargar_df_proc, leer_dataset, ruta_fuente
+)
+from modelo import (
+    HORIZONTE, construir_tabla_hist_y_pred, prediccion_con_intervalos, prediccion_siniestralidad
+)
+from metricas import contar, tramo
+from modelo_global import cargar_o_entrenar_modelo_global, predecir_global
+from precomputo import RUTA_PRONOSTICOS, TablaPronosticos
+from registro_modelos import RegistroModelos, huella_archivo
+
+# segmentado: modelo por giro/sector + entidad, recursivo año a año
+# directo:    modelo por giro/sector + entidad multi-salida (un predict)
+# global:     un solo modelo para todos los pares
+MOTORES = ("segmentado", "directo", "global")
+
+
+class MotorPrediccion:
+    """
+    ruta: parquet único o dataset particionado (por defecto el que exista).
+    Con dataset particionado solo se cargan en memoria las columnas de
+    catálogo; los lags se leen por segmento bajo demanda.
+    """
+
+    def __init__(self, ruta=None, registro=None, ruta_pronosticos=RUTA_PRONOSTICOS):
+        self.ruta = ruta or ruta_fuente()
+        self.particionado = os.path.isdir(self.ruta)
+        self.huella_datos = huella_archivo(self.ruta)
+
+        if self.particionado:
+            dataset = abrir_dataset(self.ruta)
+            self.datos = DatosCNSF(leer_dataset(dataset, COLUMNAS_CATALOGO))
+            self.almacen = AlmacenParticionado(dataset, self.datos.sector_por_giro)
+        else:
+            self.datos = DatosCNSF(cargar_df_proc(self.ruta))
+            self.almacen = AlmacenFeatures(self.datos.df)
+
+        self.registro = registro or RegistroModelos(max_memoria=128)
+        self.registro.purgar_obsoletos(self.huella_datos)
+
+        # None si no se ha corrido precomputo.py o si la tabla es de otros datos
+        self.tabla_pronosticos = TablaPronosticos.cargar(ruta_pronosticos, self.huella_datos)
+
+        self._modelo_global = None
+        self._lock_global = threading.Lock()
+
+    # --------------------------
+    # Modelo global (carga perezosa)
+    # --------------------------
+    def modelo_global(self):
+        """Carga (o entrena una vez) el modelo global."""
+        with self._lock_global:
+            if self._modelo_global is None:
+                # Con dataset particionado, datos.df solo trae columnas de
+                # catálogo: el entrenamiento (si hace falta) lee todo
+                self._modelo_global = cargar_o_entrenar_modelo_global(
+                    (lambda: cargar_df_proc(self.ruta)) if self.particionado else self.datos.df,
+                    self.huella_datos
+                )
+            return self._modelo_global
+
+    # --------------------------
+    # Predicción
+    # --------------------------
+    def predecir(self, giro, entidad, motor="segmentado", horizonte=HORIZONTE):
+        """
+        Devuelve (dict{año: predicción}, nivel) para un par.
+        Lanza ValueError si no hay datos suficientes.
+        """
+        if motor == "global":
+            with tramo("prediccion_global"):
+                return predecir_global(self.modelo_global(), [(giro, entidad)], horizonte)[0], "global"
+
+        # Primero la tabla precalculada (motor y horizonte por defecto);
+        # solo se entrena si falta el par
+        resultado = None
+        if self.tabla_pronosticos is not None and motor == "segmentado" and horizonte == HORIZONTE:
+            resultado = self.tabla_pronosticos.buscar(giro, entidad)
+            contar("tabla_pronosticos_total", resultado="fallo" if resultado is None else "acierto")
+        if resultado is None:
+            resultado = prediccion_siniestralidad(
+                self.datos.df, giro, entidad,
+                registro=self.registro, huella_datos=self.huella_datos,
+                almacen=self.almacen, datos=self.datos, horizonte=horizonte,
+                modo="directo" if motor == "directo" else "recursivo"
+            )
+        return resultado
+
+    def predecir_intervalos(self, giro, entidad, motor="segmentado", horizonte=HORIZONTE,
+                            metodo="cuantiles"):
+        """
+        Predicción puntual + bandas P10/P50/P90 (solo motores segmentados).
+        Devuelve (dict{año: predicción}, dict{año: (p10, p50, p90)}, nivel).
+        """
+        if motor == "global":
+            raise ValueError("Los intervalos solo están disponibles para los motores segmentados")
+        return prediccion_con_intervalos(
+            self.datos.df, giro, entidad, metodo=metodo,
+            registro=self.registro, huella_datos=self.huella_datos,
+            almacen=self.almacen, datos=self.datos, horizonte=horizonte,
+            modo="directo" if motor == "directo" else "recursivo"
+        )
+
+    def predecir_lote(self, pares, motor="segmentado", horizonte=HORIZONTE):
+        """
+        Predice muchos pares (giro, entidad). Los pares repetidos se calculan
+        una vez; con el motor global todo el lote es un solo predict por año.
+        Devuelve una lista (mismo orden que pares) de dicts con
+        giro, entidad, predicciones, nivel y error.
+        """
+        unicos = list(dict.fromkeys(pares))
+        resultados = {}
+
+        if motor == "global":
+            with tramo("prediccion_global"):
+                preds = predecir_global(self.modelo_global(), unicos, horizonte)
+            for par, p in zip(unicos, preds):
+                resultados[par] = (p, "global", None)
+        else:
+            for par in unicos:
+                try:
+                    p, nivel = self.predecir(*par, motor=motor, horizonte=horizonte)
+                    resultados[par] = (p, nivel, None)
+                except ValueError as e:
+                    resultados[par] = (None, None, str(e))
+
+        return [
+            {
+                "giro": giro, "entidad": entidad,
+                "predicciones": resultados[(giro, entidad)][0],
+                "nivel": resultados[(giro, entidad)][1],
+                "error": resultados[(giro, entidad)][2],
+            }
+            for giro, entidad in pares
+        ]
+
+    def tabla_hist_y_pred(self, giro, entidad, preds_dict, bandas=None):
+        """Histórico de net_sin_index del par + predicciones (y bandas)."""
+        return construir_tabla_hist_y_pred(
+            self.datos.df, giro, entidad, preds_dict, datos=self.datos, bandas=bandas
+        )
@@ -0,0 +1,252 @@
+# ============================================
+# Precálculo por lotes de pronósticos
+# Recorre todos los pares (giro, entidad) que ofrecen los dropdowns de la app
+# y guarda predicciones, nivel usado y motivo de fallo en una tabla parquet.
+#
+# Uso:
+#   python precomputo.py [--workers N] [--salida data_config/pronosticos.parquet]
+#
+# El proceso es reanudable: cada lote se guarda como un parquet parcial y,
+# si se interrumpe, al relanzarlo solo se calculan los lotes que faltan.
+# ============================================
+import argparse
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from almacen_features import AlmacenFeatures
+from datos import DatosCNSF, cargar_df_proc, ruta_fuente
+from modelo import huella_modelos, prediccion_siniestralidad
+from registro_modelos import RUTA_CACHE_MODELOS, RegistroModelos, huella_archivo
+
+RUTA_PRONOSTICOS = "data_config/pronosticos.parquet"
+TAMANO_LOTE = 100
+COLUMNAS = ["giro", "entidad", "nivel", "año", "prediccion", "error"]
+
+# Datos y almacén de features cargados una sola vez por proceso del pool
+_datos_worker = None
+_almacen_worker = None
+_registro_worker = None
+_huella_worker = None
+
+
+# ==========================
+# TRABAJO POR LOTE
+# ==========================
+
+def _inicializar_worker(ruta_datos, huella_datos=None, ruta_modelos=RUTA_CACHE_MODELOS):
+    global _datos_worker, _almacen_worker, _registro_worker, _huella_worker
+    _datos_worker = DatosCNSF(cargar_df_proc(ruta_datos))
+    _almacen_worker = AlmacenFeatures(_datos_worker.df)
+    # Con huella, los modelos se leen/guardan en el registro en disco
+    # (el mismo que usa la app)
+    if huella_datos is not None:
+        _registro_worker = RegistroModelos(max_memoria=16, ruta_disco=ruta_modelos)
+        _huella_worker = huella_datos
+
+
+def _procesar_lote(pares):
+    return filas_pronostico(
+        pares, _datos_worker, _almacen_worker,
+        registro=_registro_worker, huella_datos=_huella_worker
+    )
+
+
+def filas_pronostico(pares, datos, almacen, registro=None, huella_datos=None, n_jobs=1):
+    """
+    Filas de la tabla (una por año, o una con el motivo si el par no tiene
+    datos suficientes) para cada par. Cualquier otro error se propaga: la
+    tabla lo serviría en cada consulta hasta que cambien los datos.
+    """
+    filas = []
+    for giro, entidad in pares:
+        try:
+            preds, nivel = prediccion_siniestralidad(
+                datos.df, giro, entidad, n_jobs=n_jobs,
+                registro=registro, huella_datos=huella_datos,
+                almacen=almacen, datos=datos
+            )
+            for año, val in preds.items():
+                filas.append({
+                    "giro": giro, "entidad": entidad, "nivel": nivel,
+                    "año": año, "prediccion": val, "error": None
+                })
+        except ValueError as e:
+            filas.append({
+                "giro": giro, "entidad": entidad, "nivel": None,
+                "año": None, "prediccion": None, "error": str(e)
+            })
+    return filas
+
+
+def a_frame(filas):
+    df = pd.DataFrame(filas, columns=COLUMNAS)
+    df["año"] = df["año"].astype("Int64")
+    df["prediccion"] = df["prediccion"].astype("float64")
+    for col in ["giro", "entidad", "nivel", "error"]:
+        df[col] = df[col].astype("object")
+    return df
+
+
+def pares_validos(df_proc):
+    """Producto cartesiano entidad x giro tal como lo ofrecen los dropdowns."""
+    entidades = sorted(df_proc["entidad"].dropna().unique())
+    giros = sorted(df_proc.loc[df_proc["sector"].notna(), "giro"].dropna().unique())
+    return [(g, e) for g in giros for e in entidades]
+
+
+def guardar_tabla(df, ruta_salida, huella_datos, huella_config=None):
+    """
+    Escribe la tabla de pronósticos (zstd) con la huella de los datos y la
+    de la configuración de los modelos (por defecto la actual) en la metadata.
+    """
+    df = df.copy()
+    for col in ["giro", "entidad", "nivel"]:
+        df[col] = df[col].astype("category")
+
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(tabla.schema.metadata or {})
+    metadata[b"huella_datos"] = huella_datos.encode("utf-8")
+    metadata[b"huella_modelos"] = (huella_config or huella_modelos()).encode("utf-8")
+    tmp = f"{ruta_salida}.tmp"
+    pq.write_table(tabla.replace_schema_metadata(metadata), tmp, compression="zstd")
+    os.replace(tmp, ruta_salida)
+
+
+# ==========================
+# PRECÁLCULO COMPLETO
+# ==========================
+
+def precalcular_pronosticos(ruta_datos=None, ruta_salida=RUTA_PRONOSTICOS,
+                            workers=None, tamano_lote=TAMANO_LOTE, pares=None,
+                            ruta_modelos=RUTA_CACHE_MODELOS):
+    """
+    Calcula la tabla de pronósticos para todos los pares (giro, entidad).
+    Los workers leen y guardan los modelos en el registro en disco
+    (ruta_modelos, el mismo que usa la app).
+    Los parciales se guardan en <salida>_partes/<huella_datos>_<huella_modelos>/
+    para poder reanudar; al terminar se consolidan en ruta_salida y se borran.
+    """
+    ruta_datos = ruta_datos or ruta_fuente()
+    huella_datos = huella_archivo(ruta_datos)
+    huella_config = huella_modelos()
+    if pares is None:
+        pares = pares_validos(cargar_df_proc(ruta_datos, columnas=["giro", "sector", "entidad"]))
+
+    dir_partes = os.path.join(
+        f"{os.path.splitext(ruta_salida)[0]}_partes", f"{huella_datos}_{huella_config}"
+    )
+    os.makedirs(dir_partes, exist_ok=True)
+
+    lotes = [pares[i:i + tamano_lote] for i in range(0, len(pares), tamano_lote)]
+    ruta_parte = lambda n: os.path.join(dir_partes, f"parte_{n:05d}.parquet")
+    pendientes = [n for n in range(len(lotes)) if not os.path.exists(ruta_parte(n))]
+
+    print(f"{len(pares)} pares en {len(lotes)} lotes; pendientes: {len(pendientes)}")
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_inicializar_worker,
+        initargs=(ruta_datos, huella_datos, ruta_modelos)
+    ) as pool:
+        futuros = {pool.submit(_procesar_lote, lotes[n]): n for n in pendientes}
+        for i, futuro in enumerate(as_completed(futuros), start=1):
+            n = futuros[futuro]
+            tmp = f"{ruta_parte(n)}.tmp"
+            a_frame(futuro.result()).to_parquet(tmp, index=False)
+            os.replace(tmp, ruta_parte(n))
+            print(f"  lote {n} listo ({i}/{len(pendientes)})")
+
+    df = pd.concat(
+        [pd.read_parquet(ruta_parte(n)) for n in range(len(lotes))],
+        ignore_index=True
+    )
+    guardar_tabla(df, ruta_salida, huella_datos, huella_config)
+
+    shutil.rmtree(os.path.dirname(dir_partes), ignore_errors=True)
+    print(f"Tabla de pronósticos guardada en {ruta_salida} ({len(df)} filas)")
+    return df
+
+
+# ==========================
+# CONSULTA DESDE LA APP
+# ==========================
+
+class TablaPronosticos:
+    """
+    Índice en memoria {(giro, entidad): (predicciones, nivel, error)}
+    construido a partir de la tabla precalculada.
+    """
+
+    def __init__(self, df):
+        self._indice = {}
+        for (giro, entidad), grupo in df.groupby(["giro", "entidad"], observed=True, sort=False):
+            errores = grupo["error"].dropna()
+            if not errores.empty:
+                self._indice[(giro, entidad)] = (None, None, errores.iloc[0])
+                continue
+            preds = {int(a): float(p) for a, p in zip(grupo["año"], grupo["prediccion"])}
+            self._indice[(giro, entidad)] = (preds, str(grupo["nivel"].iloc[0]), None)
+
+    def __len__(self):
+        return len(self._indice)
+
+    @staticmethod
+    def vigente(ruta, huella_datos, huella_config=None):
+        """
+        True si la tabla en ruta se calculó con esa versión de los datos y
+        con la configuración de modelos (por defecto la actual).
+        """
+        metadata = pq.read_schema(ruta).metadata or {}
+        return (
+            metadata.get(b"huella_datos", b"").decode("utf-8") == huella_datos
+            and metadata.get(b"huella_modelos", b"").decode("utf-8") == (huella_config or huella_modelos())
+        )
+
+    @classmethod
+    def cargar(cls, ruta=RUTA_PRONOSTICOS, huella_datos=None):
+        """
+        Carga la tabla si existe y fue calculada con la misma versión del
+        parquet de datos y la configuración de modelos actual (ver vigente);
+        si no, devuelve None.
+        """
+        if not os.path.exists(ruta):
+            return None
+        if huella_datos is not None and not cls.vigente(ruta, huella_datos):
+            return None
+        return cls(pd.read_parquet(ruta))
+
+    def buscar(self, giro, entidad):
+        """
+        Devuelve (dict{año: predicción}, nivel) si el par está precalculado,
+        None si no está en la tabla. Si el par falló al precalcular, lanza
+        ValueError con el motivo registrado.
+        """
+        registro = self._indice.get((giro, entidad))
+        if registro is None:
+            return None
+        preds, nivel, error = registro
+        if error is not None:
+            raise ValueError(error)
+        return preds, nivel
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precalcula pronósticos por (giro, entidad).")
+    parser.add_argument("--datos", default=None,
+                        help="parquet o dataset particionado (por defecto el que usa la app)")
+    parser.add_argument("--salida", default=RUTA_PRONOSTICOS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--tamano-lote", type=int, default=TAMANO_LOTE)
+    args = parser.parse_args()
+
+    precalcular_pronosticos(
+        ruta_datos=args.datos,
+        ruta_salida=args.salida,
+        workers=args.workers,
+        tamano_lote=args.tamano_lote
+    )
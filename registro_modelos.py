@@ -0,0 +1,184 @@
+# ============================================
+# Registro de modelos ajustados
+# Caché LRU en memoria + almacén en disco para no reentrenar XGBoost
+# cada vez que se repite la misma combinación giro/sector + entidad.
+# ============================================
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import threading
+from collections import OrderedDict, namedtuple
+
+RUTA_CACHE_MODELOS = "model_cache"
+
+# nivel: "giro" | "sector"; categoria: valor del giro o sector;
+# huella_datos: hash del parquet; hiperparametros: hash de los parámetros del modelo
+ClaveModelo = namedtuple(
+    "ClaveModelo",
+    ["nivel", "categoria", "entidad", "huella_datos", "hiperparametros"]
+)
+
+
+def huella_archivo(ruta, tamano_bloque=1 << 20):
+    """
+    Devuelve un hash corto (sha256) del contenido de un archivo, o de todos
+    los archivos de un directorio (p. ej. un dataset parquet particionado).
+    Sirve para invalidar modelos cuando cambian los datos de origen.
+    """
+    if os.path.isdir(ruta):
+        rutas = sorted(
+            os.path.join(raiz, f) for raiz, _, archivos in os.walk(ruta) for f in archivos
+        )
+    else:
+        rutas = [ruta]
+
+    h = hashlib.sha256()
+    for r in rutas:
+        if r != ruta:
+            h.update(os.path.relpath(r, ruta).encode("utf-8"))
+        with open(r, "rb") as f:
+            for bloque in iter(lambda: f.read(tamano_bloque), b""):
+                h.update(bloque)
+    return h.hexdigest()[:16]
+
+
+def huella_parametros(params):
+    """Hash estable de un dict de hiperparámetros."""
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class RegistroModelos:
+    """
+    Guarda ajustes (modelo + base de lags para pronosticar) indexados por ClaveModelo.
+    - Memoria: OrderedDict con desalojo LRU (max_memoria entradas).
+    - Disco: un pickle (clave, ajuste) por clave en <ruta_disco>/<huella_datos>/.
+    """
+
+    def __init__(self, max_memoria=64, ruta_disco=RUTA_CACHE_MODELOS):
+        self.max_memoria = max_memoria
+        self.ruta_disco = ruta_disco
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    # --------------------------
+    # Rutas en disco
+    # --------------------------
+    def _ruta(self, clave):
+        nombre = hashlib.sha256(
+            json.dumps(list(clave), ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        return os.path.join(self.ruta_disco, clave.huella_datos, f"{nombre}.pkl")
+
+    # --------------------------
+    # Memoria (LRU)
+    # --------------------------
+    def _poner_en_memoria(self, clave, ajuste):
+        with self._lock:
+            self._memoria[clave] = ajuste
+            self._memoria.move_to_end(clave)
+            while len(self._memoria) > self.max_memoria:
+                self._memoria.popitem(last=False)
+
+    def obtener(self, clave):
+        """Devuelve el ajuste guardado para la clave o None si no existe."""
+        with self._lock:
+            if clave in self._memoria:
+                self._memoria.move_to_end(clave)
+                self.aciertos += 1
+                return self._memoria[clave]
+
+        ruta = self._ruta(clave) if self.ruta_disco else None
+        if ruta and os.path.exists(ruta):
+            _, ajuste = self._leer(ruta)
+            if ajuste is not None:
+                self._poner_en_memoria(clave, ajuste)
+                with self._lock:
+                    self.aciertos += 1
+                return ajuste
+
+        with self._lock:
+            self.fallos += 1
+        return None
+
+    def guardar(self, clave, ajuste):
+        """Guarda el ajuste en memoria y en disco (escritura atómica)."""
+        self._poner_en_memoria(clave, ajuste)
+
+        if not self.ruta_disco:
+            return
+        ruta = self._ruta(clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        tmp = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump((tuple(clave), ajuste), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, ruta)
+
+    @staticmethod
+    def _leer(ruta):
+        """(ClaveModelo | None, ajuste | None) de un pickle del disco."""
+        try:
+            with open(ruta, "rb") as f:
+                dato = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None, None
+        # Formato anterior: solo el ajuste (dict), sin la clave
+        if isinstance(dato, tuple):
+            return ClaveModelo(*dato[0]), dato[1]
+        return None, dato
+
+    def entradas(self, huella_datos):
+        """
+        Recorre los ajustes guardados en disco para una versión de los datos.
+        Genera (ClaveModelo, ajuste).
+        """
+        directorio = os.path.join(self.ruta_disco or "", huella_datos)
+        if not self.ruta_disco or not os.path.isdir(directorio):
+            return
+        for nombre in sorted(os.listdir(directorio)):
+            if not nombre.endswith(".pkl"):
+                continue
+            clave, ajuste = self._leer(os.path.join(directorio, nombre))
+            if clave is not None and ajuste is not None:
+                yield clave, ajuste
+
+    def versiones(self):
+        """Huellas de datos con ajustes en disco, de la más reciente a la más antigua."""
+        if not self.ruta_disco or not os.path.isdir(self.ruta_disco):
+            return []
+        rutas = [
+            os.path.join(self.ruta_disco, n) for n in os.listdir(self.ruta_disco)
+            if os.path.isdir(os.path.join(self.ruta_disco, n))
+        ]
+        return [os.path.basename(r) for r in sorted(rutas, key=os.path.getmtime, reverse=True)]
+
+    def obtener_o_ajustar(self, clave, ajustar):
+        """
+        Devuelve el ajuste en caché; si no existe, llama a ajustar(),
+        guarda el resultado y lo devuelve.
+        """
+        ajuste = self.obtener(clave)
+        if ajuste is None:
+            ajuste = ajustar()
+            self.guardar(clave, ajuste)
+        return ajuste
+
+    def purgar_obsoletos(self, huella_vigente):
+        """
+        Elimina de disco los modelos entrenados con otra versión del parquet
+        y los saca de memoria.
+        """
+        with self._lock:
+            for clave in [c for c in self._memoria if c.huella_datos != huella_vigente]:
+                del self._memoria[clave]
+
+        if not self.ruta_disco or not os.path.isdir(self.ruta_disco):
+            return
+        for nombre in os.listdir(self.ruta_disco):
+            ruta = os.path.join(self.ruta_disco, nombre)
+            if nombre != huella_vigente and os.path.isdir(ruta):
+                shutil.rmtree(ruta, ignore_errors=True)
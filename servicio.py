@@ -0,0 +1,311 @@
+# ============================================
+# Servicio HTTP de pronósticos (sin interfaz)
+# Expone el MotorPrediccion para otros sistemas (p. ej. emisión de pólizas).
+#
+# Uso:
+#   python servicio.py [--host 127.0.0.1] [--puerto 8000] [--workers 4] [--ventana-ms 10]
+#
+# Endpoints:
+#   GET  /salud
+#   GET  /metricas          texto de Prometheus (?formato=json para JSON)
+#   POST /prediccion        {"giro": ..., "entidad": ..., "motor": "segmentado"|"directo"|"global",
+#                            "horizonte": 2, "historico": true, "perfilar": false}
+#   POST /prediccion/lote   {"pares": [{"giro": ..., "entidad": ...}, ...], "motor": ..., "horizonte": ...}
+#
+# Con el motor global, las peticiones individuales que llegan casi juntas se
+# agrupan en una sola llamada a predecir_lote (un solo predict vectorizado).
+# Los motores segmentados ajustan un modelo por segmento: agruparlos en un
+# solo hilo pondría en fila a todas las peticiones detrás del ajuste más
+# lento, así que se resuelven en el hilo de cada petición.
+# Con --workers > 1 el proceso padre carga los datos una vez y luego hace
+# fork: los workers comparten esa copia (copy-on-write) y el mismo socket.
+# El modelo global (--precargar-global) se entrena antes en un proceso
+# aparte y cada worker lo carga después del fork.
+# Las métricas son por proceso: con varios workers cada uno expone las suyas.
+# "perfilar": true corre esa petición fuera del agrupador, bajo el perfilador
+# por muestreo, y agrega el resumen en "perfil".
+# ============================================
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from metricas import METRICAS, PerfiladorMuestreo, configurar_log_json, contar, tramo
+from modelo import HORIZONTE
+from motor import MOTORES, MotorPrediccion
+
+VENTANA_MS = 10
+MOTORES_AGRUPADOS = ("global",)   # motores donde un lote es un solo predict
+MAX_LOTE = 256
+MAX_HORIZONTE = 10
+
+
+# ==========================
+# AGRUPADOR DE PETICIONES
+# ==========================
+
+class AgrupadorPeticiones:
+    """
+    Junta las peticiones individuales que llegan dentro de una ventana de
+    tiempo (o hasta max_lote) y las resuelve con un solo predecir_lote
+    por (motor, horizonte). Solo conviene para MOTORES_AGRUPADOS: el lote
+    se resuelve en un solo hilo.
+    """
+
+    def __init__(self, motor, ventana=VENTANA_MS / 1000, max_lote=MAX_LOTE):
+        self.motor = motor
+        self.ventana = ventana
+        self.max_lote = max_lote
+        self._cola = queue.Queue()
+        threading.Thread(target=self._bucle, name="agrupador", daemon=True).start()
+
+    def predecir(self, giro, entidad, motor="segmentado", horizonte=HORIZONTE, timeout=None):
+        """Encola el par y espera su resultado (dict de predecir_lote)."""
+        futuro = Future()
+        self._cola.put(((motor, horizonte), (giro, entidad), futuro))
+        return futuro.result(timeout)
+
+    def _bucle(self):
+        while True:
+            lote = [self._cola.get()]
+            limite = time.monotonic() + self.ventana
+            while len(lote) < self.max_lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self._cola.get(timeout=restante))
+                except queue.Empty:
+                    break
+
+            for motor, horizonte in {grupo for grupo, _, _ in lote}:
+                pendientes = [
+                    (par, futuro) for grupo, par, futuro in lote if grupo == (motor, horizonte)
+                ]
+                try:
+                    resultados = self.motor.predecir_lote(
+                        [par for par, _ in pendientes], motor=motor, horizonte=horizonte
+                    )
+                    for (_, futuro), resultado in zip(pendientes, resultados):
+                        futuro.set_result(resultado)
+                except Exception as e:
+                    for _, futuro in pendientes:
+                        futuro.set_exception(e)
+
+
+# ==========================
+# HTTP
+# ==========================
+
+def _registros(df):
+    """DataFrame -> lista de dicts serializable (NaN -> null)."""
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, codigo, cuerpo, tipo="application/json; charset=utf-8"):
+        if isinstance(cuerpo, str):
+            payload = cuerpo.encode("utf-8")
+        else:
+            payload = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        contar("http_respuestas_total", codigo=codigo)
+        self.send_response(codigo)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _leer_json(self):
+        largo = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(largo) or b"{}")
+
+    def do_GET(self):
+        ruta, _, consulta = self.path.partition("?")
+        if ruta.rstrip("/") == "/salud":
+            self._responder(200, {
+                "estado": "ok",
+                "pid": os.getpid(),
+                "huella_datos": self.server.motor.huella_datos,
+            })
+        elif ruta.rstrip("/") == "/metricas":
+            if "formato=json" in consulta:
+                self._responder(200, dict(METRICAS.a_dict(), pid=os.getpid()))
+            else:
+                self._responder(200, METRICAS.a_prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._responder(404, {"error": "ruta no encontrada"})
+
+    def do_POST(self):
+        try:
+            cuerpo = self._leer_json()
+        except (ValueError, UnicodeDecodeError):
+            self._responder(400, {"error": "JSON inválido"})
+            return
+
+        motor = cuerpo.get("motor", "segmentado")
+        if motor not in MOTORES:
+            self._responder(400, {"error": f"motor debe ser uno de {list(MOTORES)}"})
+            return
+        horizonte = cuerpo.get("horizonte", HORIZONTE)
+        # bool es subclase de int: {"horizonte": true} no es un horizonte
+        if (isinstance(horizonte, bool) or not isinstance(horizonte, int)
+                or not 1 <= horizonte <= MAX_HORIZONTE):
+            self._responder(400, {"error": f"horizonte debe ser un entero entre 1 y {MAX_HORIZONTE}"})
+            return
+
+        ruta = self.path.rstrip("/")
+        try:
+            if ruta == "/prediccion":
+                with tramo("http", endpoint=ruta):
+                    self._prediccion(cuerpo, motor, horizonte)
+            elif ruta == "/prediccion/lote":
+                with tramo("http", endpoint=ruta):
+                    self._prediccion_lote(cuerpo, motor, horizonte)
+            else:
+                self._responder(404, {"error": "ruta no encontrada"})
+        except (KeyError, TypeError) as e:
+            self._responder(400, {"error": f"petición incompleta: {e}"})
+        except Exception as e:
+            self._responder(500, {"error": str(e)})
+
+    def _prediccion(self, cuerpo, motor, horizonte):
+        if cuerpo.get("perfilar"):
+            # En este hilo (no en el del agrupador) para que el perfilador lo vea
+            with PerfiladorMuestreo() as perfil:
+                codigo, resultado = self._resolver_prediccion(cuerpo, motor, horizonte, agrupar=False)
+            resultado = dict(resultado, perfil={
+                "segundos": perfil.segundos, "muestras": perfil.muestras,
+                "funciones": perfil.resumen(), "colapsado": perfil.colapsado(),
+            })
+        else:
+            codigo, resultado = self._resolver_prediccion(cuerpo, motor, horizonte)
+        self._responder(codigo, resultado)
+
+    def _resolver_prediccion(self, cuerpo, motor, horizonte, agrupar=True):
+        giro, entidad = cuerpo["giro"], cuerpo["entidad"]
+        if agrupar and motor in MOTORES_AGRUPADOS:
+            resultado = self.server.agrupador.predecir(giro, entidad, motor=motor, horizonte=horizonte)
+        else:
+            resultado = self.server.motor.predecir_lote([(giro, entidad)], motor=motor, horizonte=horizonte)[0]
+        if resultado["error"] is not None:
+            return 422, resultado
+
+        if cuerpo.get("historico", True):
+            tabla = self.server.motor.tabla_hist_y_pred(giro, entidad, resultado["predicciones"])
+            resultado = dict(resultado, tabla=_registros(tabla))
+        return 200, resultado
+
+    def _prediccion_lote(self, cuerpo, motor, horizonte):
+        pares = [
+            (p["giro"], p["entidad"]) if isinstance(p, dict) else tuple(p)
+            for p in cuerpo["pares"]
+        ]
+        resultados = self.server.motor.predecir_lote(pares, motor=motor, horizonte=horizonte)
+        self._responder(200, {"resultados": resultados})
+
+
+class _Servidor(ThreadingHTTPServer):
+    # El backlog por defecto (5) resetea conexiones en ráfagas concurrentes
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def crear_servidor(motor, host="127.0.0.1", puerto=8000):
+    """Servidor HTTP (aún sin agrupador ni hilo de servicio)."""
+    servidor = _Servidor((host, puerto), _Handler)
+    servidor.motor = motor
+    return servidor
+
+
+def _servir(servidor, ventana, precargar_global=False):
+    # El agrupador (y su hilo) y el modelo global se crean en cada worker,
+    # después del fork: hacer fork con el pool de OpenMP de XGBoost ya
+    # iniciado puede dejar al hijo bloqueado
+    if precargar_global:
+        servidor.motor.modelo_global()
+    servidor.agrupador = AgrupadorPeticiones(servidor.motor, ventana=ventana)
+    servidor.serve_forever()
+
+
+def _entrenar_global(ruta):
+    MotorPrediccion(ruta).modelo_global()
+
+
+def _asegurar_modelo_global(ruta):
+    """
+    Deja el modelo global entrenado en disco desde un proceso aparte
+    (spawn), para que los workers solo lo carguen y no lo entrenen todos.
+    """
+    proceso = multiprocessing.get_context("spawn").Process(target=_entrenar_global, args=(ruta,))
+    proceso.start()
+    proceso.join()
+    if proceso.exitcode != 0:
+        raise RuntimeError(f"No se pudo entrenar el modelo global (código {proceso.exitcode})")
+
+
+def servir(host="127.0.0.1", puerto=8000, workers=1, ventana_ms=VENTANA_MS,
+           ruta=None, precargar_global=False, log_metricas=False):
+    if log_metricas:
+        configurar_log_json()
+    if precargar_global and workers > 1:
+        _asegurar_modelo_global(ruta)
+    motor = MotorPrediccion(ruta)
+    servidor = crear_servidor(motor, host, puerto)
+    print(f"Servicio de pronósticos en http://{host}:{servidor.server_address[1]} ({workers} workers)")
+
+    if workers <= 1:
+        _servir(servidor, ventana_ms / 1000, precargar_global)
+        return
+
+    hijos = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            _servir(servidor, ventana_ms / 1000, precargar_global)
+            os._exit(0)
+        hijos.append(pid)
+
+    def _terminar(*_):
+        for pid in hijos:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _terminar)
+    try:
+        for pid in hijos:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        _terminar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servicio HTTP de pronósticos de siniestralidad.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--ventana-ms", type=float, default=VENTANA_MS,
+                        help="espera máxima para agrupar peticiones individuales")
+    parser.add_argument("--datos", default=None,
+                        help="parquet o dataset particionado (por defecto el que usa la app)")
+    parser.add_argument("--precargar-global", action="store_true",
+                        help="carga el modelo global antes de atender peticiones")
+    parser.add_argument("--log-metricas", action="store_true",
+                        help="escribe cada tramo medido como una línea JSON en stderr")
+    args = parser.parse_args()
+
+    servir(args.host, args.puerto, args.workers, args.ventana_ms, args.datos,
+           args.precargar_global, args.log_metricas)
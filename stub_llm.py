@@ -0,0 +1,136 @@
+# ============================================
+# Servidor stub compatible con la API de chat de OpenAI
+# Responde /v1/chat/completions (normal y streaming SSE) con un texto fijo,
+# sin red ni costo. Sirve para pruebas y benchmarks del asistente. Si el
+# prompt trae hechos del caso (hechos.py), la respuesta repite el primer
+# encabezado de segmento para comprobar que las cifras llegan al LLM.
+#
+# Uso:
+#   python stub_llm.py [--puerto 8765] [--retardo 0.02]
+# y en .streamlit/secrets.toml:
+#   openai_base_url = "http://127.0.0.1:8765/v1"
+# ============================================
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPUESTA_STUB = (
+    "**Resumen:** respuesta de prueba del asistente de suscripción. "
+    "Pregunta recibida: {pregunta}"
+)
+_ENCABEZADO_SEGMENTO = re.compile(r"^\[.+\]$", re.MULTILINE)
+
+
+def _crear_handler(retardo):
+    class _Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _respuesta(self, mensajes):
+            pregunta = next(
+                (m["content"] for m in reversed(mensajes) if m.get("role") == "user"), ""
+            )
+            texto = RESPUESTA_STUB.format(pregunta=pregunta)
+            for m in mensajes:
+                encabezado = _ENCABEZADO_SEGMENTO.search(m.get("content", "")) if m.get("role") == "system" else None
+                if encabezado:
+                    return f"{texto} Datos del caso: {encabezado.group(0)}"
+            return texto
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+
+            cuerpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            texto = self._respuesta(cuerpo.get("messages", []))
+            base = {
+                "id": "stub", "created": int(time.time()),
+                "model": cuerpo.get("model", "stub"),
+            }
+
+            if not cuerpo.get("stream"):
+                payload = json.dumps(dict(
+                    base, object="chat.completion",
+                    choices=[{
+                        "index": 0, "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": texto}
+                    }],
+                    usage={"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+                )).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+
+            try:
+                palabras = texto.split(" ")
+                for i, palabra in enumerate(palabras):
+                    delta = {"content": palabra + (" " if i < len(palabras) - 1 else "")}
+                    if i == 0:
+                        delta["role"] = "assistant"
+                    chunk = dict(
+                        base, object="chat.completion.chunk",
+                        choices=[{"index": 0, "delta": delta, "finish_reason": None}]
+                    )
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    if retardo:
+                        time.sleep(retardo)
+
+                fin = dict(
+                    base, object="chat.completion.chunk",
+                    choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]
+                )
+                self.wfile.write(f"data: {json.dumps(fin)}\n\n".encode("utf-8"))
+                if (cuerpo.get("stream_options") or {}).get("include_usage"):
+                    prompt = sum(len(str(m.get("content", "")).split()) for m in cuerpo.get("messages", []))
+                    uso = dict(
+                        base, object="chat.completion.chunk", choices=[],
+                        usage={"prompt_tokens": prompt, "completion_tokens": len(palabras),
+                               "total_tokens": prompt + len(palabras)}
+                    )
+                    self.wfile.write(f"data: {json.dumps(uso)}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # el cliente cortó la respuesta
+            self.close_connection = True
+
+    return _Handler
+
+
+def iniciar_stub(puerto=0, retardo=0.0):
+    """
+    Levanta el stub en un hilo de fondo.
+    Devuelve (servidor, base_url); detener con servidor.shutdown().
+    """
+    servidor = ThreadingHTTPServer(("127.0.0.1", puerto), _crear_handler(retardo))
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub local de la API de chat de OpenAI.")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--retardo", type=float, default=0.02,
+                        help="segundos entre tokens en modo streaming")
+    args = parser.parse_args()
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", args.puerto), _crear_handler(args.retardo))
+    print(f"Stub LLM escuchando en http://127.0.0.1:{args.puerto}/v1")
+    servidor.serve_forever()
@@ -0,0 +1,77 @@
+# ============================================
+# Genera los libros sintéticos de tests/fixtures/cnsf (mismo formato que
+# los de Incendio de la CNSF: título en la primera fila, encabezados en la
+# segunda, una fila de totales y variantes de nombres entre hojas y años).
+#
+# Uso:
+#   python tests/fixtures/generar_libros_cnsf.py
+# ============================================
+import os
+
+import pandas as pd
+
+CARPETA = os.path.join(os.path.dirname(__file__), "cnsf")
+AÑOS = (2021, 2022, 2023)
+
+# (institución, entidad, giro): variantes que la ingesta debe unificar
+FILAS = [
+    ("Aseguradora A", "Jalisco", "Fabricación de muebles"),
+    ("Aseguradora B", "Jalisco", "Fabricación de muebles"),
+    ("Aseguradora C", "JALISCO", "FABRICACION DE MUEBLES"),
+    ("Aseguradora A", "MEXICO", "Casa habitación"),
+    ("Aseguradora B", "DISTRITO FEDERAL", "Comercio al por menor de ropa"),
+]
+TOTAL = ("Total general", "Jalisco", "Fabricación de muebles")
+
+
+def hojas_del_año(año):
+    """Emisión, Suma Asegurada y Siniestros; los montos escalan con k = año - 2020."""
+    k = año - 2020
+    filas = FILAS + [TOTAL]
+    n = len(FILAS)
+    institucion = [f[0] for f in filas]
+    entidad = [f[1] for f in filas]
+    giro = [f[2] for f in filas]
+    # El encabezado del giro cambia entre años, como en los libros reales
+    col_giro = "Giro la Ubicación" if año == 2022 else "Giro de la Ubicación"
+
+    emision = pd.DataFrame({
+        "Institucion": institucion, "Entidad": entidad, col_giro: giro,
+        "Prima Emitida": [1200.0 * k] * n + [9e9],
+        "Prima Retenida": [1100.0 * k] * n + [9e9],
+        "Prima Devengada": [1000.0 * k] * n + [9e9],
+    })
+    suma = pd.DataFrame({
+        "Institucion": institucion, "Entidad": entidad, "Giro": giro,
+        "Suma Asegurada": [1_000_000.0] * n + [9e12],
+    })
+    siniestros = pd.DataFrame({
+        "Institucion": institucion, "Entidad": entidad, col_giro: giro,
+        "Monto de Siniestro": [600.0] * n + [9e9],
+        "Gasto de Ajuste": [0.0] * n + [0.0],
+        "Salvamento": [0.0] * n + [0.0],
+        "Monto Pagado": [600.0] * n + [9e9],
+        "Monto de Deducible": [0.0] * n + [0.0],
+        "Monto Coaseguro": [0.0] * n + [0.0],
+        "Número de Siniestros": [2] * n + [999],
+        "Recuperacion de Terceros": [0.0] * n + [0.0],
+        "Recuperacion de Reaseguro": [0.0] * n + [0.0],
+    })
+    return {"Emisión": emision, "Suma Asegurada": suma, "Siniestros": siniestros}
+
+
+def escribir_libro(año, carpeta=CARPETA):
+    ruta = os.path.join(carpeta, f"Incendio_{año}.xlsx")
+    with pd.ExcelWriter(ruta) as libro:
+        for nombre, df in hojas_del_año(año).items():
+            pd.DataFrame([[f"Ramo Incendio {año}"]]).to_excel(
+                libro, sheet_name=nombre, header=False, index=False
+            )
+            df.to_excel(libro, sheet_name=nombre, startrow=1, index=False)
+    return ruta
+
+
+if __name__ == "__main__":
+    os.makedirs(CARPETA, exist_ok=True)
+    for año in AÑOS:
+        print(escribir_libro(año))
@@ -0,0 +1,66 @@
+# ============================================
+# Backtesting con origen móvil sobre df_proc (data_config/df_proc.parquet)
+#
+# Uso:
+#   python -m pytest tests
+# ============================================
+import os
+
+import pandas as pd
+import pytest
+
+from almacen_features import AlmacenFeatures
+from backtest import (
+    AlmacenHasta, a_reporte, filas_backtest, muestrear_pares, origenes_por_defecto, ultimo_año_observado
+)
+from datos import RUTA_DATOS, DatosCNSF, cargar_df_proc
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Sin datos en 2015 ni 2016: al origen 2016 su serie termina en 2014
+PAR_CON_HUECO = ("Banca múltiple", "Ciudad de México")
+
+
+@pytest.fixture(scope="module")
+def datos():
+    return DatosCNSF(cargar_df_proc(os.path.join(RAIZ, RUTA_DATOS)))
+
+
+@pytest.fixture(scope="module")
+def almacen(datos):
+    return AlmacenFeatures(datos.df)
+
+
+def test_serie_que_termina_antes_del_origen(datos, almacen):
+    giro, entidad = PAR_CON_HUECO
+    fold = AlmacenHasta(almacen, 2016)
+    assert ultimo_año_observado(fold, giro, entidad, datos.sector_de_giro(giro)) == 2014
+
+    filas = filas_backtest(2016, [PAR_CON_HUECO], datos, almacen, horizonte=2)
+    assert [f["error"] for f in filas] == [None, None]
+    assert [f["año"] for f in filas] == [2017, 2018]
+    assert {f["rezago"] for f in filas} == {2}
+
+    reporte = a_reporte(filas, datos.df, "recursivo")
+    assert reporte["horizonte"].tolist() == [1, 2]
+    assert reporte["real"].notna().all()
+
+
+def test_serie_al_dia_no_tiene_rezago(datos, almacen):
+    giro, entidad = PAR_CON_HUECO
+    filas = filas_backtest(2018, [PAR_CON_HUECO], datos, almacen, horizonte=2)
+    assert [(f["año"], f["rezago"]) for f in filas] == [(2019, 0), (2020, 0)]
+
+
+def test_muestra_prefiere_reales_distintos_de_cero():
+    df = pd.DataFrame({
+        "giro": ["a", "b", "c", "d"] * 2,
+        "entidad": ["X"] * 8,
+        "año": [2019] * 4 + [2020] * 4,
+        "net_sin_index": [0.1, 0.1, 0.1, 0.1, 0.0, 0.3, 0.0, 0.5],
+    })
+    pares = {2019: [("a", "X"), ("b", "X"), ("c", "X"), ("d", "X")]}
+    for semilla in range(5):
+        assert muestrear_pares(df, pares, 2, horizonte=1, semilla=semilla) == {2019: [("b", "X"), ("d", "X")]}
+    assert len(muestrear_pares(df, pares, 3, horizonte=1)[2019]) == 3
+    assert origenes_por_defecto(df) == [2019]
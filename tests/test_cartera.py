@@ -0,0 +1,59 @@
+# ============================================
+# Evaluación de cartera (cartera.py)
+#
+# Uso:
+#   python -m pytest tests
+# ============================================
+import os
+
+import pandas as pd
+import pytest
+
+from cartera import errores_cartera, evaluar_cartera
+from datos import RUTA_DATOS
+from motor import MotorPrediccion
+from precomputo import TablaPronosticos
+from registro_modelos import RegistroModelos
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def motor_y_pares(tmp_path_factory):
+    motor = MotorPrediccion(
+        os.path.join(RAIZ, RUTA_DATOS),
+        registro=RegistroModelos(ruta_disco=str(tmp_path_factory.mktemp("model_cache"))),
+    )
+    conteo = motor.datos.df.groupby(["giro", "entidad"], observed=True).size().sort_values(ascending=False)
+    (giro_a, entidad_a), (giro_b, entidad_b) = conteo.index[:2]
+    # Un par con pronóstico y otro que falló al precalcular: no se entrena nada
+    motor.tabla_pronosticos = TablaPronosticos(pd.DataFrame({
+        "giro": [giro_a, giro_a, giro_b],
+        "entidad": [entidad_a, entidad_a, entidad_b],
+        "año": [2025, 2026, None],
+        "prediccion": [0.5, 0.6, None],
+        "nivel": ["giro", "giro", None],
+        "error": [None, None, "Sin datos suficientes"],
+    }))
+    return motor, [(giro_a, entidad_a), (giro_b, entidad_b)]
+
+
+def test_errores_por_par_no_detienen_la_cartera(motor_y_pares):
+    motor, ((giro_a, entidad_a), (giro_b, entidad_b)) = motor_y_pares
+    cartera = pd.DataFrame({
+        "entidad": [entidad_a, entidad_b, "Atlántida", entidad_a],
+        "sector": None,
+        "giro": [giro_a, giro_b, giro_a, giro_a],
+    })
+    resultado = evaluar_cartera(cartera, motor, workers=1)
+
+    ok = resultado[resultado["fila"] == 0]
+    assert ok["error"].isna().all()
+    predicciones = ok[ok["Fuente"] == "Predicción"]
+    assert dict(zip(predicciones["Año"], predicciones["Índice siniestralidad neta"])) == {2025: 0.5, 2026: 0.6}
+    # La fila repetida recibe lo mismo sin recalcular
+    assert resultado[resultado["fila"] == 3]["Año"].tolist() == ok["Año"].tolist()
+
+    errores = errores_cartera(resultado).set_index("entidad")["error"]
+    assert errores[entidad_b] == "Sin datos suficientes"
+    assert errores["Atlántida"].startswith("Entidad no encontrada")
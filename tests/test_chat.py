@@ -0,0 +1,57 @@
+# ============================================
+# Caché de respuestas e historial del chat
+# (cache_respuestas.py, historial_chat.py)
+#
+# Uso:
+#   python -m pytest tests
+# ============================================
+import time
+
+from cache_respuestas import CacheRespuestas
+from historial_chat import MENSAJE_SISTEMA, construir_mensajes, tokens_mensajes
+
+CONTEXTO = ["Banca múltiple", "Jalisco"]
+
+
+def test_cache_por_prompt_y_contexto():
+    cache = CacheRespuestas()
+    cache.guardar("prompt-a", CONTEXTO, "¿Qué riesgo tiene?", "respuesta")
+
+    # Mayúsculas, acentos y espacios no cambian la clave
+    assert cache.obtener("prompt-a", CONTEXTO, "  ¿que RIESGO tiene? ") == "respuesta"
+    assert cache.obtener("prompt-b", CONTEXTO, "¿Qué riesgo tiene?") is None
+    assert cache.obtener("prompt-a", ["Banca múltiple", "Sonora"], "¿Qué riesgo tiene?") is None
+    assert cache.estadisticas()["aciertos_exactos"] == 1
+
+
+def test_cache_ttl_y_lru():
+    cache = CacheRespuestas(max_entradas=2, ttl=0.05)
+    for i in range(3):
+        cache.guardar("prompt", CONTEXTO, f"pregunta {i}", f"respuesta {i}")
+    assert cache.obtener("prompt", CONTEXTO, "pregunta 0") is None
+    assert cache.obtener("prompt", CONTEXTO, "pregunta 2") == "respuesta 2"
+
+    time.sleep(0.1)
+    assert cache.obtener("prompt", CONTEXTO, "pregunta 2") is None
+
+
+def test_historial_dentro_del_presupuesto():
+    historial = []
+    for i in range(40):
+        historial.append({"role": "user", "content": f"pregunta número {i} " + "detalle " * 20})
+        historial.append({"role": "assistant", "content": "respuesta " * 40})
+
+    mensajes = construir_mensajes("contexto del caso", historial, presupuesto=300)
+    assert mensajes[0] is MENSAJE_SISTEMA
+    assert mensajes[1] == {"role": "system", "content": "contexto del caso"}
+    # Los turnos descartados quedan resumidos y el último siempre va
+    assert mensajes[2]["role"] == "system" and mensajes[2]["content"].startswith("RESUMEN")
+    assert mensajes[-1] is historial[-1]
+    recientes = mensajes[3:]
+    assert recientes == historial[-len(recientes):]
+    assert tokens_mensajes(recientes) <= 300
+
+
+def test_historial_corto_va_completo():
+    historial = [{"role": "user", "content": "hola"}, {"role": "assistant", "content": "hola"}]
+    assert construir_mensajes("contexto", historial)[2:] == historial
@@ -0,0 +1,37 @@
+# ============================================
+# Dataset particionado (datos.py)
+#
+# Uso:
+#   python -m pytest tests
+# ============================================
+import os
+
+import pandas as pd
+
+from datos import abrir_dataset, leer_dataset, particionar_dataset
+
+
+def _df_proc(sectores):
+    return pd.DataFrame({
+        "giro": [f"giro {s}" for s in sectores],
+        "sector": sectores,
+        "entidad": "Jalisco",
+        "año": 2020,
+        "net_sin_index": 0.5,
+    })
+
+
+def test_reparticionar_quita_sectores_que_ya_no_existen(tmp_path):
+    origen = tmp_path / "df_proc.parquet"
+    destino = tmp_path / "df_proc_dataset"
+
+    _df_proc(["Banca", "Seguros"]).to_parquet(origen)
+    particionar_dataset(origen, destino)
+    assert sorted(os.listdir(destino)) == ["sector=Banca", "sector=Seguros"]
+
+    _df_proc(["Banca", "Fianzas"]).to_parquet(origen)
+    particionar_dataset(origen, destino)
+    assert sorted(os.listdir(destino)) == ["sector=Banca", "sector=Fianzas"]
+    assert sorted(leer_dataset(abrir_dataset(str(destino)))["sector"].unique()) == ["Banca", "Fianzas"]
+    # Ni el temporal ni el dataset anterior quedan junto al destino
+    assert sorted(os.listdir(tmp_path)) == ["df_proc.parquet", "df_proc_dataset"]
@@ -0,0 +1,87 @@
+# ============================================
+# Ingesta sin red sobre los libros sintéticos de tests/fixtures/cnsf
+# (ver generar_libros_cnsf.py para los montos de cada año).
+#
+# Uso:
+#   python -m pytest tests
+# ============================================
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from ingesta import actualizar_df_proc
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "cnsf")
+
+
+def _copiar_libros(carpeta, años):
+    for año in años:
+        shutil.copy(os.path.join(FIXTURES, f"Incendio_{año}.xlsx"), carpeta)
+
+
+@pytest.fixture
+def carpeta(tmp_path):
+    libros = tmp_path / "libros"
+    libros.mkdir()
+    return libros
+
+
+def test_ingesta_desde_libros(carpeta, tmp_path):
+    _copiar_libros(carpeta, [2021, 2022])
+    (carpeta / "notas.xlsx").write_bytes(b"")  # sin año en el nombre: se omite
+    salida = tmp_path / "df_proc.parquet"
+
+    assert actualizar_df_proc(str(carpeta), str(salida), workers=1) == [2021, 2022]
+    df = pd.read_parquet(salida)
+
+    # Variantes de giro/entidad unificadas, mapeo manual de entidades y sector por reglas
+    assert set(zip(df["giro"], df["sector"], df["entidad"])) == {
+        ("Fabricación de muebles", "Manufactura", "Jalisco"),
+        ("Casa habitación", "Vivienda", "Estado de México"),
+        ("Comercio al por menor de ropa", "Comercio al por menor", "Ciudad de México"),
+    }
+    assert sorted(df["año"].unique()) == [2021, 2022]
+    assert len(df) == 6
+
+    # Tres filas de muebles en Jalisco por año (sin la fila de totales); montos × (año - 2020)
+    muebles = df[df["giro"] == "Fabricación de muebles"].set_index("año")
+    assert muebles.loc[2021, "prima_devengada"] == pytest.approx(3000.0)
+    assert muebles.loc[2022, "prima_devengada"] == pytest.approx(6000.0)
+    assert muebles.loc[2022, "n_mero_de_siniestros"] == 6  # encabezado "Giro la Ubicación" en 2022
+    assert muebles.loc[2021, "net_sin_index"] == pytest.approx(0.6)
+    assert muebles.loc[2022, "net_sin_index"] == pytest.approx(0.3)
+    assert muebles.loc[2021, "cuota_millar"] == pytest.approx(3600.0 * 1000 / 3_000_000)
+
+
+def test_reejecucion_sin_cambios_no_reescribe(carpeta, tmp_path, capsys):
+    _copiar_libros(carpeta, [2021, 2022])
+    salida = tmp_path / "df_proc.parquet"
+    actualizar_df_proc(str(carpeta), str(salida), workers=1)
+    antes = os.stat(salida).st_mtime_ns
+    capsys.readouterr()
+
+    assert actualizar_df_proc(str(carpeta), str(salida), workers=1) == []
+    assert "ya está al día" in capsys.readouterr().out
+    assert os.stat(salida).st_mtime_ns == antes
+
+
+def test_año_nuevo_se_agrega_sin_tocar_los_cargados(carpeta, tmp_path):
+    _copiar_libros(carpeta, [2021, 2022])
+    salida = tmp_path / "df_proc.parquet"
+    actualizar_df_proc(str(carpeta), str(salida), workers=1)
+    anterior = pd.read_parquet(salida)
+
+    _copiar_libros(carpeta, [2023])
+    assert actualizar_df_proc(str(carpeta), str(salida), workers=1) == [2023]
+    df = pd.read_parquet(salida)
+
+    assert sorted(df["año"].unique()) == [2021, 2022, 2023]
+    assert set(df["giro"]) == set(anterior["giro"])
+    pd.testing.assert_frame_equal(
+        df[df["año"] < 2023].sort_values(["giro", "año"], ignore_index=True),
+        anterior.sort_values(["giro", "año"], ignore_index=True),
+    )
+    muebles = df[(df["giro"] == "Fabricación de muebles") & (df["año"] == 2023)]
+    assert muebles["net_sin_index"].iloc[0] == pytest.approx(0.2)
@@ -0,0 +1,22 @@
+# ============================================
+# Servidor de /metrics (metricas.py)
+#
+# Uso:
+#   python -m pytest tests
+# ============================================
+import urllib.request
+
+from metricas import Metricas, servir_metricas
+
+
+def test_metricas_solo_en_localhost_por_defecto():
+    metricas = Metricas()
+    metricas.contar("prueba_total")
+    servidor = servir_metricas(0, metricas=metricas)
+    try:
+        host, puerto = servidor.server_address
+        assert host == "127.0.0.1"
+        with urllib.request.urlopen(f"http://127.0.0.1:{puerto}/metrics") as respuesta:
+            assert b"prueba_total" in respuesta.read()
+    finally:
+        servidor.shutdown()
@@ -0,0 +1,83 @@
+# ============================================
+# Modelo por segmento (modelo.py)
+#
+# Uso:
+#   python -m pytest tests
+# ============================================
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import pandas as pd
+from xgboost import XGBRegressor
+
+from almacen_features import LAG1_COLS
+from modelo import XGB_PARAMS, features_segmento, parametros_sector, pronosticar
+
+COLUMNAS = LAG1_COLS + ["ohe_categoria", "ohe_entidad"]
+
+
+def _escribir_parametros(ruta, max_depth):
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump({"sectores": {"Banca": {"parametros": {"max_depth": max_depth}}}}, f)
+
+
+def test_parametros_sector_por_archivo(tmp_path):
+    ruta_a, ruta_b = tmp_path / "a.json", tmp_path / "b.json"
+    _escribir_parametros(ruta_a, 3)
+    _escribir_parametros(ruta_b, 5)
+
+    assert parametros_sector("Banca", ruta_a) == {"max_depth": 3}
+    # Otro archivo no recibe lo que quedó en caché del primero
+    assert parametros_sector("Banca", ruta_b) == {"max_depth": 5}
+    assert parametros_sector("Banca", ruta_a) == {"max_depth": 3}
+    assert parametros_sector("Otro", ruta_a) == {}
+    assert parametros_sector("Banca", tmp_path / "no_existe.json") == {}
+
+    _escribir_parametros(ruta_a, 4)
+    os.utime(ruta_a, ns=(0, os.stat(ruta_a).st_mtime_ns + 10**9))
+    assert parametros_sector("Banca", ruta_a) == {"max_depth": 4}
+
+
+def test_parametros_sector_concurrente(tmp_path):
+    rutas = []
+    for i in range(4):
+        rutas.append(tmp_path / f"{i}.json")
+        _escribir_parametros(rutas[-1], i)
+    with ThreadPoolExecutor(8) as pool:
+        leidos = list(pool.map(lambda k: parametros_sector("Banca", rutas[k % 4]), range(200)))
+    assert leidos == [{"max_depth": k % 4} for k in range(200)]
+
+
+def _pronostico_con_dataframes(model, base_lags, last_year, horizonte):
+    # Bucle anterior: una fila de DataFrame por paso y un predict por año
+    actual = pd.Series(base_lags, index=LAG1_COLS)
+    predicciones = {}
+    for paso in range(1, horizonte + 1):
+        fila = pd.concat([actual, pd.Series({"ohe_categoria": 1.0, "ohe_entidad": 1.0})])
+        pred = float(model.predict(fila.to_frame().T[COLUMNAS].astype(np.float32).to_numpy())[0])
+        predicciones[last_year + paso] = pred
+        actual["net_sin_index_lag1"] = pred
+    return predicciones
+
+
+def test_pronosticar_igual_al_bucle_con_dataframes():
+    rng = np.random.default_rng(0)
+    lags = rng.normal(size=(200, len(LAG1_COLS))).astype(np.float32)
+    y = lags[:, LAG1_COLS.index("net_sin_index_lag1")] * 0.8 + rng.normal(0, 0.1, 200)
+    model = XGBRegressor(**dict(XGB_PARAMS, n_estimators=20)).fit(features_segmento(lags), y)
+
+    bases = lags[:3]
+    años = np.array([2020, 2022, 2024])
+    esperado = [_pronostico_con_dataframes(model, b, int(a), 5) for b, a in zip(bases, años)]
+
+    # Una serie
+    una = pronosticar({"model": model, "base_lags": bases[0], "last_year": 2020}, horizonte=5)
+    assert una == pytest.approx(esperado[0])
+    # Varias series con el mismo modelo, en un solo predict por año
+    varias = pronosticar({"model": model, "base_lags": bases, "last_year": años}, horizonte=5)
+    assert [p.keys() for p in varias] == [e.keys() for e in esperado]
+    for p, e in zip(varias, esperado):
+        assert p == pytest.approx(e)
@@ -0,0 +1,93 @@
+# ============================================
+# Precálculo de pronósticos sobre df_proc (data_config/df_proc.parquet)
+#
+# Uso:
+#   python -m pytest tests
+# ============================================
+import os
+
+import pandas as pd
+import pytest
+
+from almacen_features import AlmacenFeatures
+from datos import RUTA_DATOS, DatosCNSF, cargar_df_proc
+from metricas import METRICAS
+from modelo import prediccion_siniestralidad
+from precomputo import TablaPronosticos, guardar_tabla, precalcular_pronosticos
+from registro_modelos import RegistroModelos, huella_archivo
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATOS = os.path.join(RAIZ, RUTA_DATOS)
+
+
+@pytest.fixture(scope="module")
+def datos():
+    return DatosCNSF(cargar_df_proc(DATOS))
+
+
+def _pares(datos, n=2):
+    conteo = datos.df.groupby(["giro", "entidad"], observed=True).size().sort_values(ascending=False)
+    return [tuple(par) for par in conteo.index[:n]]
+
+
+def _aciertos_registro():
+    return sum(
+        c["valor"] for c in METRICAS.a_dict()["contadores"]
+        if c["nombre"] == "registro_modelos_total" and c["etiquetas"]["resultado"] == "acierto"
+    )
+
+
+def test_workers_guardan_en_el_registro_de_la_app(datos, tmp_path):
+    pares = _pares(datos)
+    salida = tmp_path / "pronosticos.parquet"
+    ruta_modelos = tmp_path / "model_cache"
+    huella = huella_archivo(DATOS)
+
+    precalcular_pronosticos(
+        DATOS, str(salida), workers=1, tamano_lote=1, pares=pares, ruta_modelos=str(ruta_modelos)
+    )
+    registro = RegistroModelos(ruta_disco=str(ruta_modelos))
+    assert len(list(registro.entradas(huella))) >= len(pares)
+
+    # La app encuentra esos modelos con la misma clave: no reentrena
+    tabla = TablaPronosticos.cargar(str(salida), huella)
+    METRICAS.reiniciar()
+    almacen = AlmacenFeatures(datos.df)
+    for giro, entidad in pares:
+        preds, nivel = prediccion_siniestralidad(
+            datos.df, giro, entidad, registro=registro, huella_datos=huella, almacen=almacen, datos=datos
+        )
+        assert tabla.buscar(giro, entidad) == (pytest.approx(preds), nivel)
+    assert _aciertos_registro() == len(pares)
+
+
+def _tabla_sintetica():
+    return pd.DataFrame({
+        "giro": ["Banca múltiple", "Banca múltiple", "Hoteles"],
+        "entidad": ["Jalisco", "Jalisco", "Sonora"],
+        "año": [2025, 2026, None],
+        "prediccion": [0.5, 0.6, None],
+        "nivel": ["giro", "giro", None],
+        "error": [None, None, "Sin datos suficientes"],
+    })
+
+
+def test_tabla_vigente_por_datos_y_modelos(tmp_path):
+    ruta = str(tmp_path / "pronosticos.parquet")
+    guardar_tabla(_tabla_sintetica(), ruta, "datos-a", "modelos-a")
+
+    assert TablaPronosticos.vigente(ruta, "datos-a", "modelos-a")
+    assert not TablaPronosticos.vigente(ruta, "datos-b", "modelos-a")
+    # Cambió la configuración de los modelos (p. ej. parametros_sector.json)
+    assert not TablaPronosticos.vigente(ruta, "datos-a", "modelos-b")
+    assert not TablaPronosticos.vigente(ruta, "datos-a")
+    assert TablaPronosticos.cargar(ruta, "datos-a") is None
+
+
+def test_tabla_buscar():
+    tabla = TablaPronosticos(_tabla_sintetica())
+
+    assert tabla.buscar("Banca múltiple", "Jalisco") == ({2025: 0.5, 2026: 0.6}, "giro")
+    assert tabla.buscar("Banca múltiple", "Sonora") is None
+    with pytest.raises(ValueError, match="Sin datos suficientes"):
+        tabla.buscar("Hoteles", "Sonora")
@@ -0,0 +1,60 @@
+# ============================================
+# Registro de modelos (registro_modelos.py)
+#
+# Uso:
+#   python -m pytest tests
+# ============================================
+import os
+
+from registro_modelos import ClaveModelo, RegistroModelos
+
+
+def _clave(huella_datos="datos-a", hiperparametros="params-a", entidad="Jalisco"):
+    return ClaveModelo(
+        nivel="giro", categoria="Banca múltiple", entidad=entidad,
+        huella_datos=huella_datos, hiperparametros=hiperparametros,
+    )
+
+
+def test_ida_y_vuelta_por_disco(tmp_path):
+    clave = _clave()
+    RegistroModelos(ruta_disco=tmp_path).guardar(clave, {"last_year": 2024})
+
+    # Otro proceso (otro registro, memoria vacía) lo lee del disco
+    registro = RegistroModelos(ruta_disco=tmp_path)
+    assert registro.obtener(clave) == {"last_year": 2024}
+    assert (registro.aciertos, registro.fallos) == (1, 0)
+    assert list(registro.entradas("datos-a")) == [(clave, {"last_year": 2024})]
+
+
+def test_otra_huella_no_reutiliza_el_ajuste(tmp_path):
+    registro = RegistroModelos(ruta_disco=tmp_path)
+    registro.guardar(_clave(), {"last_year": 2024})
+
+    assert registro.obtener(_clave(hiperparametros="params-b")) is None
+    assert registro.obtener(_clave(huella_datos="datos-b")) is None
+    assert registro.fallos == 2
+
+
+def test_purgar_obsoletos(tmp_path):
+    registro = RegistroModelos(ruta_disco=tmp_path)
+    registro.guardar(_clave(huella_datos="datos-a"), {"last_year": 2023})
+    registro.guardar(_clave(huella_datos="datos-b"), {"last_year": 2024})
+
+    registro.purgar_obsoletos("datos-b")
+    assert os.listdir(tmp_path) == ["datos-b"]
+    assert registro.obtener(_clave(huella_datos="datos-a")) is None
+    assert registro.obtener(_clave(huella_datos="datos-b")) == {"last_year": 2024}
+
+
+def test_desalojo_lru_cae_al_disco(tmp_path):
+    registro = RegistroModelos(max_memoria=1, ruta_disco=tmp_path)
+    registro.guardar(_clave(entidad="Jalisco"), {"last_year": 2023})
+    registro.guardar(_clave(entidad="Sonora"), {"last_year": 2024})
+
+    assert registro.obtener(_clave(entidad="Jalisco")) == {"last_year": 2023}
+
+    sin_disco = RegistroModelos(max_memoria=1, ruta_disco=None)
+    sin_disco.guardar(_clave(entidad="Jalisco"), {"last_year": 2023})
+    sin_disco.guardar(_clave(entidad="Sonora"), {"last_year": 2024})
+    assert sin_disco.obtener(_clave(entidad="Jalisco")) is None
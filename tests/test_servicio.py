@@ -0,0 +1,65 @@
+# ============================================
+# Validación de entrada del servicio HTTP (servicio.py)
+#
+# Uso:
+#   python -m pytest tests
+# ============================================
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from datos import RUTA_DATOS
+from motor import MotorPrediccion
+from servicio import AgrupadorPeticiones, crear_servidor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def url():
+    motor = MotorPrediccion(os.path.join(RAIZ, RUTA_DATOS))
+    motor.tabla_pronosticos = None
+    servidor = crear_servidor(motor, puerto=0)
+    servidor.agrupador = AgrupadorPeticiones(motor)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{servidor.server_address[1]}"
+    servidor.shutdown()
+
+
+def _post(url, cuerpo):
+    peticion = urllib.request.Request(
+        f"{url}/prediccion", json.dumps(cuerpo).encode("utf-8"), {"Content-Type": "application/json"}
+    )
+    try:
+        with urllib.request.urlopen(peticion) as respuesta:
+            return respuesta.status, json.loads(respuesta.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.mark.parametrize("horizonte", [True, False, 0, 11, "2", 1.5, None])
+def test_horizonte_invalido(url, horizonte):
+    codigo, cuerpo = _post(url, {"giro": "x", "entidad": "y", "horizonte": horizonte})
+    assert codigo == 400
+    assert "horizonte" in cuerpo["error"]
+
+
+def test_motor_invalido(url):
+    codigo, _ = _post(url, {"giro": "x", "entidad": "y", "motor": "otro"})
+    assert codigo == 400
+
+
+def test_peticion_incompleta(url):
+    codigo, cuerpo = _post(url, {"entidad": "Jalisco"})
+    assert codigo == 400
+    assert "giro" in cuerpo["error"]
+
+
+def test_par_sin_datos(url):
+    codigo, cuerpo = _post(url, {"giro": "no existe", "entidad": "Jalisco", "historico": False})
+    assert codigo == 422
+    assert cuerpo["error"]